@@ -0,0 +1,110 @@
+import threading
+from collections import Counter
+
+import pandas as pd
+
+from rastreio import engolida
+
+# --- AGREGADOS DAS OCORRÊNCIAS ---
+# Contagens por aluno, turma, professor, status e gravidade mantidas pelos eventos da réplica:
+# inserções e atualizações ajustam só as linhas tocadas; exclusões e recargas marcam para
+# reconstruir (vetorizado) na próxima leitura. As partições do arquivo (particoes() -> abas)
+# entram nas contagens: cada uma é contada uma vez por versão da réplica (só mudam quando o
+# arquivamento grava nelas).
+
+DIMENSOES = {"aluno": "Aluno", "turma": "Turma", "professor": "Professor", "status": "Status_Gestao", "gravidade": "Gravidade"}
+
+def _contar(df):
+    # Contagens de uma partição do arquivo, vetorizadas (partições não recebem eventos incrementais)
+    if df.empty: return {d: Counter() for d in DIMENSOES}
+    cols = {d: (df[c].astype(str) if c in df.columns else pd.Series("", index=df.index)) for d, c in DIMENSOES.items()}
+    return {d: Counter(v.value_counts().to_dict()) for d, v in cols.items()}
+
+class AgregadosOcorrencias:
+    def __init__(self, replica, aba="sheet1", particoes=None):
+        self.replica = replica
+        self.aba = aba
+        self.particoes = particoes
+        self._frias = {}  # partição -> (versão, {dimensão: Counter})
+        self._trava = threading.Lock()
+        self._sujo = True
+        self._cab = None
+        self._linhas = {}  # _linha -> {dimensão: valor}
+        self._contagens = {d: Counter() for d in DIMENSOES}
+        self.reconstrucoes = 0
+        self.incrementos = 0
+        replica.assinar(self._evento)
+
+    # --- leitura (sheet1 + partições do arquivo) ---
+    def contagem(self, dimensao, *valores):
+        c = self.contagens(dimensao)
+        return sum(c.get(str(v), 0) for v in valores)
+
+    def contagens(self, dimensao):
+        self._garantir()
+        frias = self._partes_frias()
+        with self._trava: c = Counter(self._contagens[dimensao])
+        for f in frias: c.update(f[dimensao])
+        return dict(c)
+
+    def turmas(self):
+        return sorted(t for t, n in self.contagens("turma").items() if n)
+
+    # --- manutenção ---
+    def _partes_frias(self):
+        if not self.particoes: return []
+        try: abas = self.particoes()
+        except Exception as e: engolida("agregados.particoes", e); return []
+        out = []
+        for aba in abas:
+            versao = self.replica.versao(aba)
+            f = self._frias.get(aba)
+            if f is None or f[0] != versao:
+                f = (versao, _contar(self.replica.ler(aba)))
+                with self._trava: self._frias[aba] = f
+            out.append(f[1])
+        return out
+
+    def _garantir(self):
+        if not self._sujo: return
+        versao = self.replica.versao(self.aba)
+        df = self.replica.ler(self.aba)
+        linhas = {}
+        if not df.empty:
+            cols = {d: (df[c].astype(str) if c in df.columns else pd.Series("", index=df.index)) for d, c in DIMENSOES.items()}
+            linhas = dict(zip(df.index, pd.DataFrame(cols).to_dict("records")))
+        with self._trava:
+            self._cab = self.replica.cabecalho(self.aba)
+            self._linhas = {}
+            self._contagens = {d: Counter() for d in DIMENSOES}
+            for i in sorted(linhas): self._somar(i, linhas[i])
+            # Se algo chegou durante a montagem, a próxima leitura reconstrói de novo
+            self._sujo = versao != self.replica.versao(self.aba)
+            self.reconstrucoes += 1
+
+    def _somar(self, i, r):
+        self._linhas[i] = r
+        for d in DIMENSOES: self._contagens[d][r[d]] += 1
+
+    def _subtrair(self, i):
+        r = self._linhas.pop(i)
+        for d in DIMENSOES: self._contagens[d][r[d]] -= 1
+        return r
+
+    def _registro(self, valores): return {d: str(valores.get(c, "")) for d, c in DIMENSOES.items()}
+
+    def _evento(self, aba, evento, dados):
+        if aba != self.aba: return
+        with self._trava:
+            if self._sujo: return
+            if evento == "insercao" and self._cab:
+                for n, l in enumerate(dados["linhas"]):
+                    i = dados["primeira"] + n
+                    if i in self._linhas: self._subtrair(i)
+                    self._somar(i, self._registro(dict(zip(self._cab, l))))
+                self.incrementos += 1
+            elif evento == "atualizacao" and dados["linha"] in self._linhas:
+                i = dados["linha"]; antes = self._subtrair(i)
+                self._somar(i, self._registro({c: antes[d] for d, c in DIMENSOES.items()} | dados["valores"]))
+                self.incrementos += 1
+            else: self._sujo = True
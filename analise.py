@@ -0,0 +1,151 @@
+import threading
+
+import pandas as pd
+
+from esquema import concatenar, converter_datas
+from indice_alunos import normalizar_turma
+
+# --- ANÁLISES ---
+# Séries do painel de análises guardadas como rollups (contagens já agrupadas). Os eventos da
+# réplica só enfileiram as linhas tocadas; na leitura, as pendentes entram de uma vez: a
+# contribuição antiga das linhas atualizadas sai, a nova entra (um groupby sobre poucas
+# linhas). Exclusões e recargas reconstroem tudo com um groupby sobre a aba inteira.
+# As contagens levam o mês no índice: um período soma só os meses (e as partições do
+# arquivo) que o cobrem. Alertas só têm hora, então o gráfico por hora não filtra período.
+
+SEM_CLASSIFICACAO = "Sem classificação"
+
+def tipar_para_rollups(df):
+    # Colunas tipadas só com o que as análises usam, indexadas pelo número da linha (não confundir
+    # com esquema.tipar_ocorrencias, que tipa o DataFrame inteiro das ocorrências)
+    g = df.get("Gravidade", pd.Series("", index=df.index)).astype(str).str.strip()
+    datas = converter_datas(df["Data"])
+    return pd.DataFrame({
+        "mes": datas.dt.to_period("M").dt.start_time,
+        "semana": datas.dt.to_period("W").dt.start_time,
+        "turma": df["Turma"].map(normalizar_turma).astype("category"),
+        "aluno": df["Aluno"].astype(str).str.strip(),
+        "gravidade": g.where(g != "", SEM_CLASSIFICACAO).astype("category"),
+        "encaminhado": df["Encaminhado"].astype(str) == "Sim",
+    }, index=df.index)
+
+def tipar_alertas(df):
+    return pd.DataFrame({"hora": converter_datas(df["Data"], "%H:%M").dt.hour}, index=df.index)
+
+def rollups_ocorrencias(t):
+    return {"turma_semana": t.dropna(subset=["semana"]).groupby(["semana", "turma"], observed=True).size(),
+            "gravidade": t.groupby(["mes", "gravidade"], observed=True).size(),
+            "encaminhado": t.groupby(["mes", "turma"], observed=True)["encaminhado"].agg(["size", "sum"]),
+            "aluno": t.groupby(["mes", "aluno", "turma"], observed=True).size()}
+
+def rollups_alertas(t):
+    return {"hora": t.dropna(subset=["hora"]).groupby("hora").size()}
+
+def _somar(a, b, sinal=1):
+    out = {}
+    for k in a:
+        v = a[k].add(b[k] * sinal, fill_value=0).astype("int64")
+        out[k] = v[(v != 0).any(axis=1)] if isinstance(v, pd.DataFrame) else v[v != 0]
+    return out
+
+class _Rollup:
+    # Rollups de uma aba: colunas brutas usadas + base tipada + contagens
+    def __init__(self, colunas, tipar, agrupar):
+        self.colunas, self.tipar, self.agrupar = colunas, tipar, agrupar
+        self.bruto = pd.DataFrame(columns=colunas)
+        self.base = self.tipar(self.bruto)
+        self.valores = self.agrupar(self.base)
+        self.sujo = True
+        self.pendentes = {}  # _linha -> colunas alteradas/inseridas
+
+    def reconstruir(self, df):
+        self.bruto = df.reindex(columns=self.colunas).fillna("").astype(str)
+        self.base = self.tipar(self.bruto)
+        self.valores = self.agrupar(self.base)
+        self.pendentes = {}
+
+    def estender(self):
+        if not self.pendentes: return False
+        linhas = {i: ({**self.bruto.loc[i].to_dict(), **v} if i in self.bruto.index else v) for i, v in self.pendentes.items()}
+        self.pendentes = {}
+        brutas = pd.DataFrame.from_dict(linhas, orient="index").reindex(columns=self.colunas).fillna("").astype(str)
+        novas = self.tipar(brutas)
+        antigas = self.base.loc[self.base.index.intersection(novas.index)]
+        if len(antigas):
+            self.valores = _somar(self.valores, self.agrupar(antigas), -1)
+            self.bruto, self.base = self.bruto.drop(index=antigas.index), self.base.drop(index=antigas.index)
+        self.valores = _somar(self.valores, self.agrupar(novas))
+        self.bruto = pd.concat([self.bruto, brutas])
+        self.base = concatenar(self.base, novas)
+        return True
+
+class AnaliseOcorrencias:
+    def __init__(self, replica, aba_ocorrencias="sheet1", aba_alertas="Alertas", particoes=None):
+        # particoes(inicio, fim) -> abas do arquivo (já sincronizadas) que cobrem o período
+        self.replica = replica
+        self.aba = aba_ocorrencias
+        self.particoes = particoes
+        self._trava = threading.Lock()
+        self._abas = {aba_ocorrencias: self._novo_rollup(), aba_alertas: _Rollup(["Data"], tipar_alertas, rollups_alertas)}
+        self._cab = {}
+        self.reconstrucoes = 0
+        self.extensoes = 0
+        replica.assinar(self._evento)
+
+    @staticmethod
+    def _novo_rollup(): return _Rollup(["Data", "Turma", "Aluno", "Gravidade", "Encaminhado"], tipar_para_rollups, rollups_ocorrencias)
+
+    def rollups(self, aba):
+        with self._trava: r = self._abas.setdefault(aba, self._novo_rollup()) if aba != "Alertas" else self._abas[aba]
+        if r.sujo:
+            versao = self.replica.versao(aba)
+            df = self.replica.ler(aba); cab = self.replica.cabecalho(aba)
+            with self._trava:
+                r.reconstruir(df); self._cab[aba] = cab
+                r.sujo = versao != self.replica.versao(aba)
+                self.reconstrucoes += 1
+        with self._trava:
+            if r.estender(): self.extensoes += 1
+            return r.valores
+
+    def _evento(self, aba, evento, dados):
+        r = self._abas.get(aba)
+        if r is None: return
+        with self._trava:
+            if r.sujo: return
+            cab = self._cab.get(aba)
+            if evento == "insercao" and cab:
+                for n, l in enumerate(dados["linhas"]): r.pendentes[dados["primeira"] + n] = dict(zip(cab, l))
+            elif evento == "atualizacao":
+                valores = {c: v for c, v in dados["valores"].items() if c in r.colunas}
+                if valores and (dados["linha"] in r.pendentes or dados["linha"] in r.bruto.index):
+                    r.pendentes.setdefault(dados["linha"], {}).update(valores)
+            else: r.sujo = True
+
+    # --- séries para o painel (inicio/fim: datas ou None) ---
+    def _periodo(self, chave, inicio, fim, nivel="mes"):
+        abas = [self.aba] + (self.particoes(inicio, fim) if self.particoes else [])
+        s = pd.concat([self.rollups(a)[chave] for a in abas])
+        datas = s.index.get_level_values(nivel)
+        ok = pd.Series(True, index=s.index).to_numpy(copy=True)
+        if inicio is not None: ok &= datas >= pd.Timestamp(inicio).to_period("M" if nivel == "mes" else "W").start_time
+        if fim is not None: ok &= datas <= pd.Timestamp(fim)
+        resto = [n for n in s.index.names if n != "mes"]
+        return s[ok].groupby(level=resto, observed=True).sum()
+
+    def por_turma_semana(self, inicio=None, fim=None):
+        return self._periodo("turma_semana", inicio, fim, "semana").rename("ocorrencias").reset_index()
+
+    def gravidade(self, inicio=None, fim=None):
+        return self._periodo("gravidade", inicio, fim).rename("ocorrencias").reset_index()
+
+    def taxa_encaminhamento(self, inicio=None, fim=None):
+        e = self._periodo("encaminhado", inicio, fim).rename(columns={"size": "ocorrencias", "sum": "encaminhados"})
+        return e.assign(taxa=e["encaminhados"] / e["ocorrencias"]).reset_index()
+
+    def alertas_por_hora(self):
+        return self.rollups("Alertas")["hora"].reindex(range(24), fill_value=0).rename("alertas").rename_axis("hora").reset_index()
+
+    def alunos_reincidentes(self, inicio=None, fim=None, n=10):
+        a = self._periodo("aluno", inicio, fim)
+        return a[a > 1].nlargest(n).rename("ocorrencias").reset_index()
@@ -2,14 +2,35 @@ import streamlit as st
 import pandas as pd
 import gspread
 from oauth2client.service_account import ServiceAccountCredentials
-from datetime import datetime
+from datetime import datetime, date, timedelta
 import json
+import os
 import time
-from streamlit_autorefresh import st_autorefresh
 import google.generativeai as genai
-from fpdf import FPDF
 import hashlib
 import urllib.parse
+import functools
+import threading
+import plotly.express as px
+from fila_escrita import FilaEscrita
+from monitor import MonitorPlanilha, Instantaneo
+from cache_tabelas import CacheTabelas
+from classificador import ClassificadorIA, ClienteGemini, ClienteIALocal, ACAO_CLASSIFICANDO
+from replica import ReplicaPlanilha, COLUNA_ID, novo_id
+from voz import PipelineVoz, casar_turma
+from indice_alunos import IndiceAlunos
+from agregados import AgregadosOcorrencias
+from analise import AnaliseOcorrencias
+from esquema import tipar_ocorrencias, formatar_data
+from arquivo import ArquivoOcorrencias
+from importacao import CADASTROS, TAMANHO_LOTE, validar
+from busca import IndiceBusca
+from relatorios import MotorRelatorios, gerar_pdf_continuo
+import planilha_falsa
+import rastreio
+from rastreio import span, engolida, PlanilhaRastreada, ClienteIARastreado
+from cota import PlanilhaProtegida, BaldeFichas
+import inquilinos
 
 # --- CONFIGURAÇÕES GERAIS ---
 st.set_page_config(page_title="EduGestor Pro", layout="wide", page_icon="🎓")
@@ -89,12 +110,64 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # --- CONEXÃO ---
-@st.cache_resource
-def conectar():
+def segredo(chave, padrao=None):
+    try: return st.secrets.get(chave, padrao)
+    except Exception as e: engolida("segredo", e); return padrao  # sem secrets.toml (ex: rodando com a planilha falsa)
+
+def usar_planilha_falsa():
+    # EDUGESTOR_PLANILHA=falsa (ou planilha_backend = "falsa" nos secrets) troca o Google Sheets por
+    # uma planilha em memória com latência e cota simuladas; EDUGESTOR_LINHAS semeia ocorrências
+    return os.environ.get("EDUGESTOR_PLANILHA", segredo("planilha_backend")) == "falsa"
+
+def proteger(planilha, baldes=None):
+    # Cota por minuto da API (leitura/escrita), leituras iguais coalescidas, 429 com espera; cada chamada real é rastreada
+    return PlanilhaProtegida(PlanilhaRastreada(planilha), cota_leitura=int(segredo("cota_leitura_minuto", 60)), cota_escrita=int(segredo("cota_escrita_minuto", 60)), baldes=baldes)
+
+# --- ESCOLAS ---
+# Uma planilha por escola ([escolas.<id>] nos secrets ou EDUGESTOR_ESCOLAS em JSON, com nome,
+# planilha e opcionalmente turmas/credencial); sem configuração fica só "Dados_Escolares". Os
+# recursos marcados com @por_escola são cache_resource indexados pelo id da escola: réplica,
+# fila, caches, monitor e índices de uma escola nunca veem os dados de outra.
+def ler_config_escolas():
+    bruto = os.environ.get("EDUGESTOR_ESCOLAS")
+    return json.loads(bruto) if bruto else segredo("escolas")
+
+ESCOLAS = inquilinos.ler_escolas(ler_config_escolas())
+
+def escola_atual():
+    return st.session_state.get("escola") or next(iter(ESCOLAS))
+
+def por_escola(f):
+    # Sem id explícito usa a escola da sessão; threads de fundo sempre passam o id. O recurso nasce
+    # no escopo de rastreio da escola (as threads dele herdam o escopo)
+    em_cache = st.cache_resource(f)
+    @functools.wraps(f)
+    def obter(escola=None):
+        escola = escola or escola_atual()
+        with rastreio.escopo(escola): return em_cache(escola)
+    return obter
+
+def autorizar_cliente(credencial):
+    # Chamado pelo pool (em qualquer thread) ao abrir, renovar ou reabrir o cliente de uma conta de serviço
+    if usar_planilha_falsa(): return planilha_falsa.ClienteFalso(linhas=int(os.environ.get("EDUGESTOR_LINHAS", 0)))
     scope = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
-    creds = ServiceAccountCredentials.from_json_keyfile_dict(json.loads(st.secrets["service_account_info"]), scope)
-    client = gspread.authorize(creds)
-    return client.open("Dados_Escolares")
+    creds = ServiceAccountCredentials.from_json_keyfile_dict(json.loads(st.secrets[credencial]), scope)
+    return gspread.authorize(creds)
+
+@st.cache_resource
+def obter_pool():
+    # Um pool por processo; um cliente por credencial (escolas da mesma conta de serviço dividem o cliente)
+    return inquilinos.PoolClientes(autorizar_cliente, maximo=int(segredo("pool_clientes", 8)), ocioso=int(segredo("pool_ocioso_segundos", 1800)))
+
+@st.cache_resource
+def obter_baldes(credencial):
+    # A cota do Google é por conta de serviço: escolas com a mesma credencial dividem os baldes
+    return {"leitura": BaldeFichas(int(segredo("cota_leitura_minuto", 60))), "escrita": BaldeFichas(int(segredo("cota_escrita_minuto", 60)))}
+
+@por_escola
+def conectar(escola):
+    e = ESCOLAS[escola]
+    return proteger(inquilinos.PlanilhaDoPool(obter_pool(), e.credencial, e.planilha), obter_baldes(e.credencial))
 
 # --- IA ---
 @st.cache_resource
@@ -106,99 +179,249 @@ def configurar_ia_automatica():
         if not escolhido: escolhido = next((m for m in todos if "flash" in m), None)
         if not escolhido: escolhido = next((m for m in todos if "gemini" in m), todos[0] if todos else None)
         return escolhido
-    except: return None
+    except Exception as e: engolida("ia.configurar", e); return None
 
 nome_modelo_ativo = configurar_ia_automatica()
 
+def usar_ia_local():
+    # EDUGESTOR_IA=local (ou ia_backend = "local" nos secrets) troca o Gemini por regras locais, sem rede
+    return os.environ.get("EDUGESTOR_IA", segredo("ia_backend")) == "local"
+
+@st.cache_resource
+def obter_cliente_ia():
+    if usar_ia_local(): return ClienteIARastreado(ClienteIALocal(float(os.environ.get("EDUGESTOR_IA_LATENCIA", 0))))
+    return ClienteIARastreado(ClienteGemini(nome_modelo_ativo)) if nome_modelo_ativo else None
+
 # --- DADOS ---
+# Leituras vêm da réplica SQLite local (só as linhas novas são baixadas) através de um cache
+# com uma entrada por aba; as escritas do app são remendadas no cache em vez de limpar tudo.
+ABAS_COM_ID = ("sheet1", "Alertas")
+
+@por_escola
+def obter_replica(escola):
+    r = ReplicaPlanilha(conectar(escola), caminho=inquilinos.caminho_banco(escola), abas_com_id=ABAS_COM_ID)
+    try: r.garantir_colunas("sheet1", COLUNAS_OCORRENCIAS)  # planilhas antigas ganham ID/Gravidade no fim
+    except Exception as e: engolida("replica.garantir_colunas", e)
+    return r
+
+@por_escola
+def obter_cache(escola):
+    c = CacheTabelas(obter_replica(escola))
+    c.registrar("ocorrencias", ttl=60, aba="sheet1", tipar=tipar_ocorrencias)
+    c.registrar("alertas", ttl=10, aba="Alertas")
+    c.registrar("professores", ttl=3600, aba="Professores")
+    c.registrar("gestores", ttl=3600, aba="Gestores")
+    c.registrar("alunos", ttl=3600, aba="Alunos")
+    c.registrar("indice_alunos", ttl=3600, carregar=lambda: IndiceAlunos(com_colunas(c.obter("alunos"), ["Nome", "Turma"])), tags=("Alunos",))
+    return c
+
+COLUNAS_OCORRENCIAS = ["Data", "Aluno", "Turma", "Professor", "Descricao", "Acao_Sugerida", "Intervencao", "Status_Gestao", "Encaminhado", COLUNA_ID, "Gravidade"]
+COLUNAS_ALERTAS = ["Data", "Turma", "Professor", "Status", COLUNA_ID]
+
+def com_colunas(d, colunas): return d if not d.empty or colunas is None else pd.DataFrame(columns=colunas)
+
+def ler_cache(nome, colunas=None, escola=None):
+    try: return com_colunas(obter_cache(escola).obter(nome), colunas)
+    except Exception as e: engolida(f"ler_cache.{nome}", e); return pd.DataFrame(columns=colunas) if colunas else pd.DataFrame()
+
 def carregar_alertas(): 
-    try:
-        d = conectar().worksheet("Alertas").get_all_records()
-        return pd.DataFrame(d) if d else pd.DataFrame(columns=["Data", "Turma", "Professor", "Status"])
-    except: return pd.DataFrame(columns=["Data", "Turma", "Professor", "Status"])
+    return ler_cache("alertas", colunas=COLUNAS_ALERTAS)
 
-@st.cache_data(ttl=60) 
 def carregar_ocorrencias_cache(): 
-    try:
-        d = conectar().sheet1.get_all_records()
-        return pd.DataFrame(d) if d else pd.DataFrame(columns=["Data", "Aluno", "Turma", "Professor", "Descricao", "Acao_Sugerida", "Intervencao", "Status_Gestao", "Encaminhado"])
-    except: return pd.DataFrame()
+    return ler_cache("ocorrencias", colunas=COLUNAS_OCORRENCIAS)  # tipada (esquema.py)
 
-@st.cache_data(ttl=3600)
 def carregar_professores(): 
-    try:
-        d = conectar().worksheet("Professores").get_all_records()
-        return pd.DataFrame(d)
-    except: return pd.DataFrame()
+    return ler_cache("professores")
 
-@st.cache_data(ttl=3600)
 def carregar_gestores(): 
-    try:
-        d = conectar().worksheet("Gestores").get_all_records()
-        return pd.DataFrame(d)
-    except: return pd.DataFrame()
+    return ler_cache("gestores")
 
-@st.cache_data(ttl=3600)
 def carregar_alunos_contatos(): 
+    return ler_cache("alunos", colunas=["Nome", "Turma", "Responsavel", "Telefone"])
+
+@por_escola
+def obter_agregados(escola):
+    return AgregadosOcorrencias(obter_replica(escola), particoes=lambda: obter_arquivo(escola).particoes())
+
+@por_escola
+def obter_analise(escola):
+    return AnaliseOcorrencias(obter_replica(escola), particoes=lambda inicio, fim: obter_arquivo(escola).particoes(inicio, fim))
+
+@por_escola
+def obter_busca(escola):
+    return IndiceBusca(obter_replica(escola), tipar=tipar_ocorrencias, particoes=lambda inicio, fim: obter_arquivo(escola).particoes(inicio, fim))
+
+# --- ARQUIVO ---
+# Partições mensais (abas Arquivo_AAAA_MM) com as ocorrências arquivadas antigas; só são lidas
+# quando um período pede. Cada partição vira uma entrada tipada no mesmo cache.
+IDADE_ARQUIVO_PADRAO = 180
+
+def ler_particao(nome, escola=None):
+    c = obter_cache(escola)
+    if nome not in c.contadores: c.registrar(nome, ttl=3600, aba=nome, tipar=tipar_ocorrencias)
+    return c.obter(nome)
+
+@por_escola
+def obter_arquivo(escola):
+    return ArquivoOcorrencias(conectar(escola), obter_replica(escola), ler_particao=lambda nome: ler_particao(nome, escola))
+
+def ler_ocorrencias_periodo(inicio, fim):
     try:
-        d = conectar().worksheet("Alunos").get_all_records()
-        return pd.DataFrame(d)
-    except: return pd.DataFrame(columns=["Nome", "Turma", "Responsavel", "Telefone"])
+        with span("arquivo.ler_periodo"): return obter_arquivo().ler_periodo(carregar_ocorrencias_cache(), inicio, fim)
+    except Exception as e: engolida("arquivo.ler_periodo", e); return carregar_ocorrencias_cache()
+
+def escolher_periodo(rotulo, key, dias=365):
+    p = st.date_input(rotulo, (date.today() - timedelta(days=dias), date.today()), key=key)
+    return (p[0], p[-1]) if isinstance(p, (tuple, list)) and p else (None, None)
+
+def carregar_agregados():
+    try: obter_cache().obter("ocorrencias")  # o TTL do cache mantém a réplica (e os contadores) em dia
+    except Exception as e: engolida("carregar_agregados", e)
+    return obter_agregados()
+
+def carregar_indice_alunos():
+    try: return obter_cache().obter("indice_alunos")
+    except Exception as e: engolida("carregar_indice_alunos", e); return IndiceAlunos(pd.DataFrame())
+
+def turmas_da_escola():
+    # As configuradas para a escola; sem configuração, as do cadastro de alunos e do histórico
+    e = ESCOLAS[escola_atual()]
+    if e.turmas: return list(e.turmas)
+    return sorted(set(carregar_indice_alunos().turmas()) | set(carregar_agregados().turmas()))
+
+@por_escola
+def obter_monitor(escola):
+    # Um poller por escola para todos os painéis de gestão abertos dela
+    c = obter_cache(escola)
+    return MonitorPlanilha(obter_replica(escola), ler=lambda: {"ocorrencias": com_colunas(c.obter("ocorrencias"), COLUNAS_OCORRENCIAS),
+                                                         "alertas": com_colunas(c.obter("alertas"), COLUNAS_ALERTAS)})
+
+def aviso_atraso(*abas):
+    # Sem cota/rede a réplica continua servindo o último dado bom; a página avisa em vez de parecer vazia
+    try: a = obter_replica().atraso(*abas)
+    except Exception as e: engolida("replica.atraso", e); return None
+    if a:
+        quando = datetime.fromtimestamp(a["ultima_sincronizacao"]).strftime("%H:%M") if a["ultima_sincronizacao"] else "nunca"
+        st.warning(f"⚠️ Planilha indisponível no momento (limite de uso do Google). Mostrando os dados de {quando}; tentando de novo...")
+    return a
+
+def ler_instantaneo():
+    try: return obter_monitor().atual()
+    except Exception as e: engolida("monitor.atual", e); return Instantaneo(0, time.time(), None, carregar_ocorrencias_cache(), carregar_alertas())
 
 # --- ESCRITA ---
-def limpar_cache(): st.cache_data.clear()
-
-def salvar_ocorrencia(alunos_lista, turma, prof, desc, acao, encaminhado="Não", intervencao=""):
+@por_escola
+def obter_fila_escrita(escola):
+    # Uma fila por escola: agrupa as linhas de todas as sessões e sobrevive a reinícios (diário no SQLite da escola)
+    replica = obter_replica(escola)  # o append e o remendo na réplica passam por replica.anexar (trava da aba)
+    def filtrar_reenvio(aba, linhas):
+        if aba not in ABAS_COM_ID: return linhas
+        replica.sincronizar(aba)
+        pos = COLUNAS_OCORRENCIAS.index(COLUNA_ID) if aba == "sheet1" else COLUNAS_ALERTAS.index(COLUNA_ID)
+        ja = replica.ids_existentes(aba, [l[pos] for l in linhas if len(l) > pos])
+        return [l for l in linhas if len(l) <= pos or l[pos] not in ja]
+    return FilaEscrita(conectar(escola), caminho=inquilinos.caminho_banco(escola), anexar=replica.anexar, filtrar_reenvio=filtrar_reenvio)
+
+def atualizar_por_id(aba, id_, valores):
+    # Linha resolvida pelo índice ID -> linha da réplica; todos os campos num único batch_update
+    return bool(obter_replica().atualizar_por_ids(aba, {id_: valores}))
+
+@rastreio.rastreado()
+def salvar_ocorrencia(alunos_lista, turma, prof, desc, acao, encaminhado="Não", intervencao="", gravidade=""):
+    # Devolve os IDs gravados no diário ([] em caso de erro)
     try:
-        sheet = conectar().sheet1
         data = datetime.now().strftime("%Y-%m-%d %H:%M")
-        for aluno in alunos_lista:
-            aluno_limpo = aluno.strip()
-            if aluno_limpo:
-                sheet.append_row([data, aluno_limpo, turma, prof, desc, acao, intervencao, "Pendente", encaminhado])
-        limpar_cache()
-        return True
-    except: return False
+        linhas = [[data, a.strip(), turma, prof, desc, acao, intervencao, "Pendente", encaminhado, novo_id(), gravidade] for a in alunos_lista if a.strip()]
+        obter_fila_escrita().enfileirar("sheet1", linhas)
+        return [l[9] for l in linhas]
+    except Exception as e: engolida("salvar_ocorrencia", e); return []
+
+@por_escola
+def obter_classificador(escola):
+    fila, replica = obter_fila_escrita(escola), obter_replica(escola)
+    pos = {c: i for i, c in enumerate(COLUNAS_OCORRENCIAS)}
+    def ao_concluir(ids, gravidade, acao):
+        valores = {"Acao_Sugerida": acao, "Gravidade": gravidade}
+        # Ainda no diário: altera lá mesmo (sem chamada extra). Já na planilha: batch_update por ID.
+        restantes = fila.atualizar_pendentes("sheet1", pos[COLUNA_ID], {i: {pos[c]: v for c, v in valores.items()} for i in ids})
+        if restantes: replica.atualizar_por_ids("sheet1", {i: valores for i in restantes})
+    c = ClassificadorIA(obter_cliente_ia(), ao_concluir, caminho=inquilinos.caminho_banco(escola))
+    # Retoma o que ficou "classificando" antes de um reinício
+    pendentes = [dict(zip(COLUNAS_OCORRENCIAS, l)) for l in fila.linhas_pendentes("sheet1")]
+    df = ler_cache("ocorrencias", COLUNAS_OCORRENCIAS, escola)
+    if not df.empty: pendentes += df[df['Acao_Sugerida'] == ACAO_CLASSIFICANDO].to_dict("records")
+    grupos = {}
+    for r in pendentes:
+        if r.get('Acao_Sugerida') == ACAO_CLASSIFICANDO: grupos.setdefault((r['Descricao'], r['Turma']), []).append(r[COLUNA_ID])
+    for (desc, turma), ids in grupos.items(): c.classificar(ids, desc, turma)
+    return c
+
+def retomar_pendencias():
+    # Fila (diário) e classificador de cada escola sobem já na primeira execução do processo: o que
+    # ficou no diário ou "classificando" antes de um reinício volta sem esperar um envio ou o Admin
+    for escola in ESCOLAS:
+        try: obter_classificador(escola)  # cria a fila da escola junto
+        except Exception as e: engolida("retomar_pendencias", e)
 
-def atualizar_status_gestao(aluno, data_ocorrencia, novo_status, intervencao_texto=None):
+@st.cache_resource
+def iniciar_retomada():
+    # Uma vez por processo, numa thread: abrir a réplica e a fila de cada escola não segura a primeira página
+    t = threading.Thread(target=retomar_pendencias, name="retomar-pendencias", daemon=True)
+    t.start()
+    return t
+
+@rastreio.rastreado()
+def atualizar_status_gestao(id_ocorrencia, novo_status, intervencao_texto=None):
     try:
-        wb = conectar(); sheet = wb.sheet1; cell = sheet.find(data_ocorrencia)
-        if cell:
-            nome_na_planilha = sheet.cell(cell.row, 2).value
-            if nome_na_planilha == aluno:
-                sheet.update_cell(cell.row, 8, novo_status)
-                if intervencao_texto: sheet.update_cell(cell.row, 7, intervencao_texto)
-                limpar_cache(); return True
-    except: pass
+        valores = {"Status_Gestao": novo_status} | ({"Intervencao": intervencao_texto} if intervencao_texto else {})
+        if atualizar_por_id("sheet1", id_ocorrencia, valores): return True
+    except Exception as e: engolida("atualizar_status_gestao", e)
     return False
 
-def excluir_ocorrencia(aluno, desc_trecho):
+@rastreio.rastreado()
+def arquivar_ocorrencias(ids, intervencao):
+    # Arquivamento em lote: todas as linhas num único batch_update; devolve os IDs gravados
+    try: return obter_replica().atualizar_por_ids("sheet1", {i: {"Status_Gestao": "Arquivado", "Intervencao": intervencao} for i in ids})
+    except Exception as e: engolida("arquivar_ocorrencias", e); return set()
+
+@rastreio.rastreado()
+def excluir_ocorrencia(id_ocorrencia):
     try:
-        wb = conectar(); sheet = wb.sheet1; dados = sheet.get_all_records()
-        for i, row in enumerate(dados):
-            if row['Aluno'] == aluno and desc_trecho in row['Descricao']:
-                sheet.delete_rows(i + 2); break
-        limpar_cache()
-    except: pass
+        obter_replica().excluir_por_ids("sheet1", [id_ocorrencia])  # busca, exclusão e renumeração sob a trava da aba
+    except Exception as e: engolida("excluir_ocorrencia", e)
 
+@rastreio.rastreado()
 def salvar_alerta(turma, prof):
-    conectar().worksheet("Alertas").append_row([datetime.now().strftime("%H:%M"), turma, prof, "Pendente"])
+    linha = [datetime.now().strftime("%H:%M"), turma, prof, "Pendente", novo_id()]
+    obter_replica().anexar("Alertas", [linha])
 
-def atualizar_alerta_status(turma, novo_status):
+@rastreio.rastreado()
+def atualizar_alerta_status(id_alerta, novo_status):
     try:
-        wb = conectar(); sheet = wb.worksheet("Alertas"); dados = sheet.get_all_records()
-        for i, row in enumerate(dados):
-            if row['Turma'] == turma and row['Status'] != "Resolvido":
-                sheet.update_cell(i + 2, 4, novo_status); break
-        limpar_cache()
-    except: pass
+        atualizar_por_id("Alertas", id_alerta, {"Status": novo_status})
+    except Exception as e: engolida("atualizar_alerta_status", e)
 
+@rastreio.rastreado()
 def cadastrar_usuario(tipo, nome, codigo):
     try:
         aba = "Professores" if tipo == "Professor" else "Gestores"
-        conectar().worksheet(aba).append_row([nome, codigo])
-        limpar_cache(); return True
-    except: return False
+        obter_replica().anexar(aba, [[nome, codigo]])
+        return True
+    except Exception as e: engolida("cadastrar_usuario", e); return False
+
+@rastreio.rastreado()
+def importar_cadastros(aba, linhas, progresso=None):
+    # append_rows em lotes; cada lote confirmado já entra na réplica. Devolve (gravadas, erro)
+    feitas = 0
+    try:
+        r = obter_replica()
+        for i in range(0, len(linhas), TAMANHO_LOTE):
+            lote = linhas[i:i + TAMANHO_LOTE]
+            r.anexar(aba, lote)
+            feitas += len(lote)
+            if progresso: progresso(feitas)
+        return feitas, None
+    except Exception as e: engolida("importar_cadastros", e); return feitas, str(e)
 
 # --- SOM & NOTIFICAÇÃO ---
 def disparar_alerta(tipo="normal", titulo="EduGestor", corpo="Nova atualização"):
@@ -209,103 +432,154 @@ def disparar_alerta(tipo="normal", titulo="EduGestor", corpo="Nova atualização
     st.markdown(f"""<audio autoplay><source src="{sound_url}" type="audio/mp3"></audio>""", unsafe_allow_html=True)
     st.markdown(f"""<script>sendNotification("{titulo}", "{corpo}");</script>""", unsafe_allow_html=True)
 
-def gerenciar_notificacoes_gestao(df_oc, df_alertas):
-    if 'historico_notificacoes' not in st.session_state: st.session_state.historico_notificacoes = set()
-    
-    if not df_alertas.empty:
-        pendentes = df_alertas[df_alertas['Status'] == "Pendente"]
-        for _, row in pendentes.iterrows():
-            chave = f"panico_{row['Data']}_{row['Turma']}"
-            if chave not in st.session_state.historico_notificacoes:
-                disparar_alerta("grave", "🚨 PÂNICO", f"Ajuda na sala {row['Turma']}")
-                st.session_state.historico_notificacoes.add(chave)
-    
-    if not df_oc.empty and 'Status_Gestao' in df_oc.columns:
-        pendentes = df_oc[df_oc['Status_Gestao'].isin(["Pendente", ""])]
-        for _, row in pendentes.iterrows():
-            chave = f"oc_{row['Data']}_{row['Aluno']}"
-            if chave not in st.session_state.historico_notificacoes:
-                enc = str(row.get('Encaminhado', 'Não'))
-                if enc == "Sim": disparar_alerta("encaminhado", "🚶 Aluno a Caminho", f"{row['Aluno']} enviado.")
-                elif "Alta" in str(row.get('Acao_Sugerida')): disparar_alerta("grave", "🔴 Grave", f"{row['Aluno']}")
-                else: disparar_alerta("normal", "📝 Nova Ocorrência", f"{row['Aluno']}")
-                st.session_state.historico_notificacoes.add(chave)
+def avisar_gravidade(df):
+    # Gravidade pode faltar se garantir_colunas falhou ao abrir a réplica: fica só o texto da ação
+    gravidade = df['Gravidade'] if 'Gravidade' in df.columns else pd.Series("", index=df.index)
+    grave = df['Acao_Sugerida'].astype(str).str.contains("Alta") | (gravidade == "Alta")
+    for aluno in df.loc[grave, 'Aluno']: disparar_alerta("grave", "🔴 Grave", f"{aluno}")
+    for aluno in df.loc[~grave, 'Aluno']: disparar_alerta("normal", "📝 Nova Ocorrência", f"{aluno}")
+
+def notificar_classificadas(df_oc, aguardando):
+    # Ocorrências que entraram "classificando" avisam quando a IA preenche a gravidade; as que
+    # sumiram (excluídas ou arquivadas) saem da espera sem aviso
+    if COLUNA_ID not in df_oc.columns: return
+    linhas = df_oc[df_oc[COLUNA_ID].isin(aguardando)]
+    prontas = linhas[linhas['Acao_Sugerida'] != ACAO_CLASSIFICANDO]
+    avisar_gravidade(prontas[prontas['Status_Gestao'] == "Pendente"])
+    aguardando.intersection_update(set(linhas[COLUNA_ID]) - set(prontas[COLUNA_ID]))
+
+def gerenciar_notificacoes_gestao(df_oc, df_alertas, seq_topo=None):
+    # Marca d'água única por sessão (_seq da réplica): só linhas acima dela notificam. A marca vai
+    # para a URL, então recarregar a página não dispara de novo o que já foi avisado.
+    seqs = [d['_seq'] for d in (df_alertas, df_oc) if '_seq' in d.columns and not d.empty]
+    if seq_topo is None: seq_topo = max((int(s.max()) for s in seqs), default=0)
+    if 'marca_notificacoes' not in st.session_state:
+        qp = st.query_params.get("marca", "")
+        st.session_state.marca_notificacoes = int(qp) if qp.isdigit() else seq_topo
+    marca = st.session_state.marca_notificacoes
+    aguardando = st.session_state.setdefault('aguardando_classificacao', set())
+    if aguardando: notificar_classificadas(df_oc, aguardando)
+    if seq_topo <= marca: return  # caso comum: nada novo, O(1)
+
+    if '_seq' in df_alertas.columns:
+        novos = df_alertas[(df_alertas['_seq'].to_numpy() > marca) & (df_alertas['Status'] == "Pendente").to_numpy()]
+        for turma in novos['Turma']: disparar_alerta("grave", "🚨 PÂNICO", f"Ajuda na sala {turma}")
+        if not novos.empty: seq_topo = max(seq_topo, int(novos['_seq'].max()))
+
+    if '_seq' in df_oc.columns and 'Status_Gestao' in df_oc.columns:
+        novas = df_oc[(df_oc['_seq'].to_numpy() > marca) & (df_oc['Status_Gestao'] == "Pendente").to_numpy()]
+        if not novas.empty:
+            enc = novas['Encaminhado']
+            # Ainda sem gravidade: o aviso sai quando a IA concluir (a atualização não muda o _seq)
+            espera = ~enc & (novas['Acao_Sugerida'] == ACAO_CLASSIFICANDO)
+            aguardando.update(novas.loc[espera, COLUNA_ID])
+            for aluno in novas.loc[enc, 'Aluno']: disparar_alerta("encaminhado", "🚶 Aluno a Caminho", f"{aluno} enviado.")
+            avisar_gravidade(novas[~enc & ~espera])
+            seq_topo = max(seq_topo, int(novas['_seq'].max()))
+
+    st.session_state.marca_notificacoes = seq_topo
+    st.query_params["marca"] = str(seq_topo)
 
 # --- IA E VOZ ---
-def transcrever_audio(audio_bytes):
-    if not nome_modelo_ativo: return ""
-    try:
-        modelo = genai.GenerativeModel(nome_modelo_ativo)
-        resp = modelo.generate_content(["Transcreva fielmente.", {"mime_type": "audio/mp3", "data": audio_bytes}])
-        return resp.text
-    except: return ""
-
-def analisar_comando_voz(audio_bytes):
-    if not nome_modelo_ativo: return None
-    try:
-        modelo = genai.GenerativeModel(nome_modelo_ativo)
-        prompt = """Analise o áudio. JSON: {"texto_completo": "txt", "turma_detectada": "ex: 6A", "alunos_detectados": ["nome"]}"""
-        resp = modelo.generate_content([prompt, {"mime_type": "audio/mp3", "data": audio_bytes}])
-        return json.loads(resp.text.replace("```json", "").replace("```", ""))
-    except: return None
-
-def consultar_ia(descricao, turma):
-    if not nome_modelo_ativo: return "Erro Config", "IA Indisponível"
-    prompt = f"""Especialista CONVIVA SP (Protocolo 179). Dados: Turma {turma} | Fato: "{descricao}". Classifique GRAVIDADE: ALTA, MÉDIA, BAIXA. Sugira AÇÃO mediação e acolhimento. Responda: GRAVIDADE: [G] AÇÃO: [A]"""
-    try:
-        safety = [{"category": c, "threshold": "BLOCK_NONE"} for c in ["HARM_CATEGORY_HARASSMENT", "HARM_CATEGORY_HATE_SPEECH", "HARM_CATEGORY_SEXUALLY_EXPLICIT", "HARM_CATEGORY_DANGEROUS_CONTENT"]]
-        modelo = genai.GenerativeModel(nome_modelo_ativo)
-        resp = modelo.generate_content(prompt, safety_settings=safety)
-        texto = resp.text
-        g, a = "Média", texto
-        if "GRAVIDADE:" in texto:
-            parts = texto.split("AÇÃO:")
-            g = parts[0].replace("GRAVIDADE:", "").strip()
-            a = parts[1].strip() if len(parts) > 1 else texto
-        return g, a
-    except: return "Média", "Erro IA"
+@por_escola
+def obter_pipeline_voz(escola):
+    return PipelineVoz(obter_cliente_ia(), caminho=inquilinos.caminho_banco(escola))
+
+@rastreio.rastreado()
+def analisar_comando_voz(audio_bytes, turmas):
+    # Reruns com a mesma gravação não reenviam o áudio: cache da sessão, depois cache global (SQLite).
+    # Falhas não ficam guardadas: o próximo rerun tenta de novo.
+    h = hashlib.sha256(audio_bytes).hexdigest()
+    vistos = st.session_state.setdefault("voz_resultados", {})
+    chave = (h, tuple(turmas))
+    if chave not in vistos:
+        try: r = obter_pipeline_voz().analisar(audio_bytes, h, turmas)
+        except Exception as e: engolida("voz.analisar", e); return h, None
+        if r is None: return h, None
+        vistos[chave] = r
+        while len(vistos) > 5: vistos.pop(next(iter(vistos)))
+    return h, vistos[chave]
 
 # --- PDF ---
-class PDF(FPDF):
-    def header(self):
-        self.set_font('Arial', 'B', 16); self.cell(0, 10, 'RELATÓRIO ESCOLAR - CONVIVA', 0, 1, 'C'); self.ln(5); self.line(10, 25, 200, 25); self.ln(10)
-    def footer(self):
-        self.set_y(-15); self.set_font('Arial', 'I', 8); self.cell(0, 10, f'Página {self.page_no()}', 0, 0, 'C')
-
-def imprimir_bloco(pdf, dados):
-    def limpa(t): return str(t).encode('latin-1', 'replace').decode('latin-1')
-    if pdf.get_y() > 230: pdf.add_page()
-    pdf.set_fill_color(245, 245, 245); pdf.set_font("Arial", 'B', 11)
-    pdf.cell(0, 8, limpa(f"DATA: {dados['Data']} | PROF: {dados['Professor']}"), 0, 1, 'L', True)
-    pdf.set_font("Arial", '', 10); pdf.multi_cell(0, 6, limpa(f"FATO: {dados['Descricao']}"))
-    pdf.set_font("Arial", 'I', 10); pdf.multi_cell(0, 6, limpa(f"INTERVENÇÃO: {dados.get('Intervencao', 'S/ Registro')}"))
-    pdf.ln(2); pdf.line(10, pdf.get_y(), 200, pdf.get_y()); pdf.ln(5)
-
-def imprimir_assinaturas(pdf):
-    if pdf.get_y() > 240: pdf.add_page()
-    pdf.ln(10); y = pdf.get_y(); pdf.set_font("Arial", '', 9)
-    pdf.line(20, y, 80, y); pdf.text(35, y+5, "Aluno")
-    pdf.line(120, y, 180, y); pdf.text(135, y+5, "Responsável")
-    pdf.ln(20); pdf.line(70, pdf.get_y(), 140, pdf.get_y()); pdf.text(90, pdf.get_y()+5, "Gestão")
-
-def gerar_pdf_continuo(df_dados, titulo=""):
-    pdf = PDF(); pdf.add_page(); 
-    pdf.set_font("Arial", 'B', 12); pdf.cell(0, 10, titulo.encode('latin-1', 'replace').decode('latin-1'), 0, 1); pdf.ln(5)
-    for _, row in df_dados.iterrows(): imprimir_bloco(pdf, row.to_dict())
-    imprimir_assinaturas(pdf)
-    return pdf.output(dest='S').encode('latin-1')
-
-def gerar_pdf_turma_completa(df_turma):
-    pdf = PDF(); alunos_unicos = sorted(df_turma['Aluno'].unique())
-    def limpa(t): return str(t).encode('latin-1', 'replace').decode('latin-1')
-    for aluno in alunos_unicos:
-        pdf.add_page(); pdf.set_font("Arial", 'B', 14); pdf.cell(0, 10, limpa(f"ALUNO: {aluno}"), 0, 1, 'L'); pdf.line(10, pdf.get_y(), 200, pdf.get_y()); pdf.ln(5)
-        ocorrencias_aluno = df_turma[df_turma['Aluno'] == aluno]
-        for _, row in ocorrencias_aluno.iterrows(): imprimir_bloco(pdf, row.to_dict())
-        imprimir_assinaturas(pdf)
-    return pdf.output(dest='S').encode('latin-1')
+@por_escola
+def obter_motor_relatorios(escola):
+    return MotorRelatorios(caminho=inquilinos.caminho_banco(escola))
+
+def acompanhar_relatorio():
+    # Relatórios grandes rodam numa thread do motor; a página só consulta o progresso a cada 1s
+    t = obter_motor_relatorios().trabalho(st.session_state.get("relatorio_trabalho"))
+    if t is None: return
+    pendente = not (t.pronto or t.erro)
+    st.fragment(mostrar_relatorio, run_every=1 if pendente else None)(t.id, pendente)
+
+def mostrar_relatorio(id_, estava_pendente):
+    t = obter_motor_relatorios().trabalho(id_)
+    if t is None: return
+    if estava_pendente and (t.pronto or t.erro): st.rerun()  # terminou: redesenha sem o temporizador
+    if t.erro: st.error(f"Falha ao gerar: {t.erro}")
+    elif not t.pronto: st.progress(t.feitos / max(t.total, 1), f"Gerando... {t.feitos}/{t.total} aluno(s)")
+    else:
+        with open(t.caminho, "rb") as f:
+            st.download_button("📥 Baixar", f.read(), os.path.basename(t.caminho), "application/zip" if t.caminho.endswith(".zip") else "application/pdf", key=f"rel_{t.id}")
+        st.caption(f"{t.total} aluno(s), {t.renderizados} renderizado(s), {t.total - t.renderizados} do cache")
+
+# --- ATUALIZAÇÃO DO PAINEL ---
+TAMANHO_PAGINA_FEED = 20
+
+@st.fragment(run_every=3)
+def vigiar_atualizacoes(versao_vista):
+    # Verificação barata a cada 3s; a página só é refeita quando o monitor publica um instantâneo novo
+    try:
+        if obter_monitor().versao != versao_vista: st.rerun()
+    except Exception as e: engolida("vigiar_atualizacoes", e)
+
+# --- DIAGNÓSTICO ---
+# Spans por execução (rastreio.py); EDUGESTOR_RASTREIO=arquivo.jsonl (ou rastreio_jsonl nos secrets) já liga a exportação
+ARQUIVO_RASTREIO = "rastreio.jsonl"
+
+@por_escola
+def obter_rastreador(escola):
+    # Cada escola vê só os próprios spans e exceções; o JSONL é um só (cada linha leva a escola)
+    rs = rastreio.rastreador(escola)
+    rs.arquivo = os.environ.get("EDUGESTOR_RASTREIO", segredo("rastreio_jsonl"))
+    return rs
+
+def painel_diagnostico():
+    rs = obter_rastreador()
+    exportar = st.toggle("Exportar spans (JSONL)", value=bool(rs.arquivo), key="rastreio_exportar")
+    rs.arquivo = (rs.arquivo or ARQUIVO_RASTREIO) if exportar else None
+    if rs.arquivo: st.caption(f"Gravando em {os.path.abspath(rs.arquivo)}")
+    st.caption("Chamadas remotas: " + (" | ".join(f"{t}: {n}" for t, n in rs.remotas.items()) or "nenhuma"))
+    resumo = rs.resumo()
+    if resumo.empty: st.info("Nenhum span registrado ainda."); return
+    st.dataframe(resumo.round(1), hide_index=True)
+    nomes = list(resumo["span"])
+    sel = st.selectbox("Histograma do span:", nomes, index=nomes.index(rastreio.RAIZ) if rastreio.RAIZ in nomes else 0, key="rastreio_span")
+    st.plotly_chart(px.histogram(x=rs.duracoes(sel), nbins=30, labels={"x": "ms"}, title=f"{sel} (últimas {rs.janela})"))
+    st.markdown("#### Execuções recentes"); st.dataframe(rs.execucoes(), hide_index=True)
+    st.markdown("#### Exceções engolidas")
+    ex = rs.excecoes()
+    if ex.empty: st.caption("Nenhuma.")
+    else: st.dataframe(ex, hide_index=True)
 
 # --- SESSÃO ---
+def escolher_escola():
+    # ?escola=<id> na URL (link por escola) ou seletor na barra lateral; trocar de escola encerra os logins
+    if st.session_state.get("escola") not in ESCOLAS:
+        qp = st.query_params.get("escola")
+        st.session_state.escola = qp if qp in ESCOLAS else next(iter(ESCOLAS))
+    if len(ESCOLAS) < 2: return st.session_state.escola
+    ids = list(ESCOLAS)
+    e = st.sidebar.selectbox("Escola", ids, index=ids.index(st.session_state.escola), format_func=lambda i: ESCOLAS[i].nome)
+    if e != st.session_state.escola:
+        for k in ("prof_logado", "gestao_logada", "prof_turmas_permitidas", "marca_notificacoes", "aguardando_classificacao", "dados_panico", "pagina_feed", "pagina_hist_prof", "id_intervencao_ativa"): st.session_state.pop(k, None)
+        st.query_params.clear(); st.session_state.escola = e
+    st.query_params["escola"] = e
+    return e
+
+escolher_escola()
+rastreio.definir_escola(escola_atual())  # spans e exceções desta execução vão para a escola da sessão
+iniciar_retomada()
 if 'panico_mode' not in st.session_state: st.session_state.panico_mode = False
 if 'id_intervencao_ativa' not in st.session_state: st.session_state.id_intervencao_ativa = None
 if 'pdf_buffer' not in st.session_state: st.session_state.pdf_buffer = None
@@ -322,6 +596,7 @@ if 'gestao_logada' not in st.session_state: st.session_state.gestao_logada = Fal
 # --- INTERFACE ---
 st.title("🏫 EduGestor Pro")
 menu = st.sidebar.radio("Menu", ["Acesso Professor", "Painel Gestão"])
+obter_rastreador(); rastreio.iniciar_execucao(menu)
 
 # ================= PROFESSOR =================
 if menu == "Acesso Professor":
@@ -331,16 +606,15 @@ if menu == "Acesso Professor":
             if st.form_submit_button("Entrar", type="primary"):
                 df = carregar_professores()
                 if not df.empty:
-                    df['Codigo'] = df['Codigo'].astype(str)
-                    user = df[(df['Nome'] == ln) & (df['Codigo'] == lc)]
+                    user = df[(df['Nome'] == ln) & (df['Codigo'].astype(str) == lc)]
                     if not user.empty:
                         st.session_state.prof_logado = True; st.session_state.prof_nome = ln
                         tr = str(user.iloc[0].get('Turmas', '')).strip()
-                        st.session_state.prof_turmas_permitidas = [t.strip() for t in tr.split(",")] if tr else ["6A","6B","7A","7B","8A","8B","9A","9B"]
+                        st.session_state.prof_turmas_permitidas = [t.strip() for t in tr.split(",") if t.strip()] if tr else turmas_da_escola()
                         st.query_params["prof_logado"] = "true"; st.query_params["prof_nome"] = ln; st.rerun()
                     else: st.error("Dados inválidos.")
     else:
-        if not st.session_state.prof_turmas_permitidas: st.session_state.prof_turmas_permitidas = ["6A","6B","7A","7B","8A","8B","9A","9B"]
+        if not st.session_state.prof_turmas_permitidas: st.session_state.prof_turmas_permitidas = turmas_da_escola()
         c1, c2 = st.columns([5,1]); c1.markdown(f"## Olá, **{st.session_state.prof_nome}**"); 
         if c2.button("Sair"): st.session_state.prof_logado = False; st.query_params.clear(); st.rerun()
 
@@ -357,24 +631,26 @@ if menu == "Acesso Professor":
             dados_voz = {}
             if audio_val:
                 with st.spinner("Processando..."):
-                    dados_voz = analisar_comando_voz(audio_val.read())
-                    if dados_voz: st.success("Entendido!"); st.session_state.form_rascunho_desc = dados_voz.get('texto_completo', '')
+                    hash_voz, dados_voz = analisar_comando_voz(audio_val.getvalue(), st.session_state.prof_turmas_permitidas)
+                    dados_voz = dados_voz or {}
+                if dados_voz:
+                    st.success("Entendido!")
+                    # O rascunho só é sobrescrito quando chega uma gravação nova
+                    if st.session_state.get("voz_aplicada") != hash_voz:
+                        st.session_state.voz_aplicada = hash_voz; st.session_state.form_rascunho_desc = dados_voz.get('texto_completo', '')
+                else: st.warning("Não foi possível analisar o áudio agora; a próxima interação tenta de novo.")
 
             # TURMA (FORA DO FORM PARA ATUALIZAR ALUNOS)
-            turma_pre = dados_voz.get('turma_detectada') if dados_voz else None
+            turma_pre = casar_turma(dados_voz.get('turma_detectada', ''), st.session_state.prof_turmas_permitidas) if dados_voz else None
             idx_t = st.session_state.prof_turmas_permitidas.index(turma_pre) if turma_pre in st.session_state.prof_turmas_permitidas else 0
-            turma_sel = st.selectbox("Turma:", st.session_state.prof_turmas_permitidas, index=idx_t)
+            turma_sel = st.selectbox("Turma:", st.session_state.prof_turmas_permitidas, index=idx_t) if st.session_state.prof_turmas_permitidas else st.text_input("Turma:").strip().upper()
             
             # LISTA ALUNOS (CORRIGIDA)
-            df_a = carregar_alunos_contatos()
-            lista_alunos = []
-            if not df_a.empty and 'Turma' in df_a.columns:
-                df_a['Turma_Limpa'] = df_a['Turma'].astype(str).str.strip().str.upper()
-                turma_filtro = str(turma_sel).strip().upper()
-                lista_alunos = sorted(df_a[df_a['Turma_Limpa'] == turma_filtro]['Nome'].unique().tolist())
+            indice_alunos = carregar_indice_alunos()
+            lista_alunos = list(indice_alunos.alunos(turma_sel))
             
             lista_com_outros = ["OUTROS (Digitar)"] + lista_alunos
-            default_alunos = [a for a in dados_voz.get('alunos_detectados', []) if a in lista_alunos]
+            default_alunos = indice_alunos.resolver(dados_voz.get('alunos_detectados', []), turma_sel)
 
             with st.form("form_oc", clear_on_submit=True):
                 st.markdown("#### Detalhes")
@@ -384,10 +660,9 @@ if menu == "Acesso Professor":
                     alunos_manual = st.text_input("Digite os nomes (vírgula):")
                 
                 if alunos_sel:
-                    df_hist = carregar_ocorrencias_cache()
-                    if not df_hist.empty:
-                        total_prev = len(df_hist[df_hist['Aluno'].isin([n for n in alunos_sel if n != "OUTROS (Digitar)"])])
-                        if total_prev > 0: st.info(f"⚠️ Histórico: {total_prev} ocorrências anteriores.")
+                    try: total_prev = carregar_agregados().contagem("aluno", *[n for n in alunos_sel if n != "OUTROS (Digitar)"])
+                    except Exception as e: engolida("agregados.contagem", e); total_prev = 0
+                    if total_prev > 0: st.info(f"⚠️ Histórico: {total_prev} ocorrências anteriores.")
 
                 encaminhar = st.checkbox("🚶 Encaminhar à Direção?")
                 desc = st.text_area("Descrição:", value=st.session_state.form_rascunho_desc, height=150)
@@ -397,19 +672,36 @@ if menu == "Acesso Professor":
                     if alunos_manual: final.extend([x.strip() for x in alunos_manual.split(',') if x.strip()])
                     
                     if final and desc:
-                        g, a = consultar_ia(desc, turma_sel)
                         enc_str = "Sim" if encaminhar else "Não"
-                        salvar_ocorrencia(final, turma_sel, st.session_state.prof_nome, desc, a, enc_str)
-                        st.toast("Salvo!"); st.session_state.form_rascunho_desc = ""; time.sleep(1); st.rerun()
+                        # Salva já como "classificando"; a IA completa Acao_Sugerida/Gravidade em segundo plano
+                        ids = salvar_ocorrencia(final, turma_sel, st.session_state.prof_nome, desc, ACAO_CLASSIFICANDO, enc_str)
+                        if ids:
+                            try: obter_classificador().classificar(ids, desc, turma_sel)
+                            except Exception as e: engolida("classificador.classificar", e)
+                            st.toast("Salvo!"); st.session_state.form_rascunho_desc = ""; time.sleep(1); st.rerun()
+                        else: st.error("Não foi possível salvar. Tente novamente.")
                     else: st.warning("Preencha tudo.")
             st.markdown('</div>', unsafe_allow_html=True)
 
         with tab_hist:
-            df = carregar_ocorrencias_cache()
+            aviso_atraso("sheet1")
+            # sheet1 + partições do arquivo, uma página por vez: a aba é desenhada em toda reexecução do formulário
+            pagina = st.session_state.get('pagina_hist_prof', 1); ini = (pagina - 1) * TAMANHO_PAGINA_FEED
+            try: df, total = obter_busca().buscar(professor=st.session_state.prof_nome, limite=TAMANHO_PAGINA_FEED, pular=ini)
+            except Exception as e:
+                engolida("historico_professor", e); df = carregar_ocorrencias_cache()
+                df = df[df['Professor'] == st.session_state.prof_nome].iloc[::-1] if not df.empty else df
+                total = len(df); df = df.iloc[ini:ini + TAMANHO_PAGINA_FEED]
             if not df.empty:
-                for i, r in df[df['Professor'] == st.session_state.prof_nome].iloc[::-1].iterrows():
+                for i, r in df.iterrows():
                     cor = "green" if r['Status_Gestao'] == "Arquivado" else "orange"
-                    st.markdown(f"""<div class="card" style="border-left:5px solid {cor}"><b>{r['Aluno']}</b> ({r['Data']})<br>{r['Descricao']}<br><small>Gestão: {r.get('Intervencao', '')}</small></div>""", unsafe_allow_html=True)
+                    st.markdown(f"""<div class="card" style="border-left:5px solid {cor}"><b>{r['Aluno']}</b> ({formatar_data(r['Data'])})<br>{r['Descricao']}<br><small>Gestão: {r.get('Intervencao', '')}</small></div>""", unsafe_allow_html=True)
+            total_paginas = max(1, -(-total // TAMANHO_PAGINA_FEED))
+            if total_paginas > 1:
+                c1, c2, c3 = st.columns([1, 2, 1])
+                if c1.button("⬅️ Anterior", key="hist_prof_ant", disabled=pagina <= 1): st.session_state.pagina_hist_prof = pagina - 1; st.rerun()
+                c2.caption(f"Página {pagina} de {total_paginas} ({total} ocorrências)")
+                if c3.button("Próxima ➡️", key="hist_prof_prox", disabled=pagina >= total_paginas): st.session_state.pagina_hist_prof = pagina + 1; st.rerun()
 
 # ================= GESTÃO =================
 elif menu == "Painel Gestão":
@@ -427,8 +719,7 @@ elif menu == "Painel Gestão":
                     df_g = carregar_gestores()
                     login_ok = False
                     if not df_g.empty:
-                        df_g['Codigo'] = df_g['Codigo'].astype(str)
-                        if not df_g[(df_g['Nome'] == gn) & (df_g['Codigo'] == gc)].empty: login_ok = True
+                        if not df_g[(df_g['Nome'] == gn) & (df_g['Codigo'].astype(str) == gc)].empty: login_ok = True
                     if login_ok:
                         st.session_state.gestao_logada = True; st.session_state.gestao_nome = gn
                         st.query_params["gestao_logada"] = "true"; st.query_params["gestao_nome"] = gn; st.rerun()
@@ -438,102 +729,245 @@ elif menu == "Painel Gestão":
         if c2.button("Sair"): st.session_state.gestao_logada = False; st.query_params.clear(); st.rerun()
 
         # --- NAVEGAÇÃO (SUBSTITUI ABAS) ---
-        nav = st.radio("", ["🔥 Feed", "📝 Registrar", "🏫 Histórico", "🖨️ Relatórios", "⚙️ Admin"], horizontal=True, key="navegacao_gestao")
+        nav = st.radio("", ["🔥 Feed", "📝 Registrar", "🏫 Histórico", "📈 Análises", "🖨️ Relatórios", "⚙️ Admin"], horizontal=True, key="navegacao_gestao")
+        rastreio.anotar(rotulo=nav)
+
+        inst = ler_instantaneo()
+        df_oc, df_alertas = inst.ocorrencias, inst.alertas
+        atraso = aviso_atraso("sheet1", "Alertas")
 
         # --- LOGICA DE REFRESH INTELIGENTE ---
         # Só atualiza automaticamente se estiver na aba "Feed" E não estiver editando nada
         if nav == "🔥 Feed" and st.session_state.id_intervencao_ativa is None:
-            st_autorefresh(interval=15000, key="gestaorefresh")
+            vigiar_atualizacoes(inst.versao)
         else:
             if nav == "🔥 Feed": st.info("⏸️ Atualização pausada (Edição ativa)")
 
-        df_oc = carregar_ocorrencias_cache()
-        df_alertas = carregar_alertas()
-        gerenciar_notificacoes_gestao(df_oc, df_alertas)
+        gerenciar_notificacoes_gestao(df_oc, df_alertas, inst.seq)
 
         # --- CONTEÚDO ---
         if nav == "🔥 Feed":
             # ALERTAS
             if not df_alertas.empty:
-                for i, row in df_alertas[df_alertas['Status'].isin(["Pendente", "Em Atendimento"])].iterrows():
+                for row in df_alertas[df_alertas['Status'].isin(["Pendente", "Em Atendimento"])].to_dict("records"):
+                    i = row[COLUNA_ID]
                     st.error(f"🚨 SALA {row['Turma']} ({row['Professor']})")
                     c_a, c_b = st.columns(2)
                     if row['Status'] == "Pendente":
-                        if c_a.button("Atender", key=f"at{i}"): 
-                            atualizar_alerta_status(row['Turma'], "Em Atendimento")
+                        if c_a.button("Atender", key=f"at_{i}"): 
+                            atualizar_alerta_status(row[COLUNA_ID], "Em Atendimento")
                             # Força a troca para a aba de registro se necessário (opcional)
                             st.rerun()
                     else: 
-                        if c_a.button("✅ Resolvido", key=f"res{i}"): atualizar_alerta_status(row['Turma'], "Resolvido"); st.rerun()
-                        if c_b.button("📝 Ocorrência", key=f"reg{i}"): 
+                        if c_a.button("✅ Resolvido", key=f"res_{i}"): atualizar_alerta_status(row[COLUNA_ID], "Resolvido"); st.rerun()
+                        if c_b.button("📝 Ocorrência", key=f"reg_{i}"): 
                             # Troca a aba programaticamente
                             st.session_state.navegacao_gestao = "📝 Registrar"
-                            st.session_state.dados_panico = {"turma": row['Turma'], "prof": row['Professor']}
+                            st.session_state.dados_panico = {"turma": row['Turma'], "prof": row['Professor'], "id": row[COLUNA_ID]}
                             st.rerun()
 
             if not df_oc.empty:
-                f_st = st.selectbox("Visualizar:", ["Pendentes", "Arquivados", "Todos"])
+                f_st = st.selectbox("Visualizar:", ["Pendentes", "Arquivados", "Todos"], key="filtro_feed")
+                # Filtro vetorizado antes de desenhar; só a página atual vira widgets
                 df_show = df_oc
-                if f_st == "Pendentes": df_show = df_oc[df_oc['Status_Gestao'].fillna("Pendente").isin(["Pendente", ""])]
+                if f_st == "Pendentes": df_show = df_oc[df_oc['Status_Gestao'] == "Pendente"]
                 elif f_st == "Arquivados": df_show = df_oc[df_oc['Status_Gestao'] == "Arquivado"]
-                
-                if df_show.empty: st.success("Tudo limpo!")
-                for idx, row in df_show.iloc[::-1].iterrows():
-                    cor = "#ffe6e6" if "Alta" in str(row.get('Acao_Sugerida')) else "#fff3cd"
-                    enc_tag = '<div class="encaminhamento">🚶 ALUNO ENCAMINHADO</div>' if str(row.get('Encaminhado')) == "Sim" else ""
+
+                if st.session_state.get('filtro_feed_anterior') != f_st: st.session_state.pagina_feed = 1; st.session_state.filtro_feed_anterior = f_st
+                total_paginas = max(1, -(-len(df_show) // TAMANHO_PAGINA_FEED))
+                pagina = min(st.session_state.get('pagina_feed', 1), total_paginas)
+
+                if st.session_state.pdf_buffer:
+                    c1, c2 = st.columns([1, 5])
+                    c1.download_button("📥 PDF", st.session_state.pdf_buffer, "Ficha.pdf", "application/pdf", key="pdf_ficha")
+                    if c2.button("Fechar", key="fechar_pdf"): st.session_state.pdf_buffer = None; st.rerun()
+
+                if df_show.empty and not atraso: st.success("Tudo limpo!")
+                pend = df_show[df_show['Status_Gestao'] == "Pendente"]
+                if not pend.empty and st.session_state.id_intervencao_ativa is None and not st.session_state.pdf_buffer:
+                    with st.expander("📦 Arquivar em lote"):
+                        rotulos = dict(zip(pend[COLUNA_ID], pend['Aluno'].astype(str) + " (" + pend['Turma'].astype(str) + ") - " + pend['Descricao'].astype(str).str[:40]))
+                        with st.form("lote_feed", clear_on_submit=True):
+                            sel = st.multiselect("Ocorrências:", list(reversed(rotulos)), format_func=rotulos.get)
+                            txt_lote = st.text_area("Intervenção (vale para todas):")
+                            if st.form_submit_button("Arquivar selecionadas", type="primary"):
+                                if sel and txt_lote:
+                                    feitos = arquivar_ocorrencias(sel, txt_lote)
+                                    if feitos:
+                                        with span("pdf.fichas"): st.session_state.pdf_buffer = gerar_pdf_continuo(pend[pend[COLUNA_ID].isin(feitos)].assign(Intervencao=txt_lote))
+                                        st.toast(f"{len(feitos)} ocorrência(s) arquivada(s)!"); st.rerun()
+                                    else: st.error("Não foi possível arquivar. Tente novamente.")
+                                else: st.warning("Selecione as ocorrências e escreva a intervenção.")
+                ini = (pagina - 1) * TAMANHO_PAGINA_FEED
+                for row in df_show.iloc[::-1].iloc[ini:ini + TAMANHO_PAGINA_FEED].to_dict("records"):
+                    oid = row[COLUNA_ID]
+                    cor = "#ffe6e6" if row.get('Gravidade') == "Alta" or "Alta" in str(row.get('Acao_Sugerida')) else "#fff3cd"
+                    enc_tag = '<div class="encaminhamento">🚶 ALUNO ENCAMINHADO</div>' if row.get('Encaminhado') else ""
                     
                     with st.container():
                         st.markdown(f"""<div class="card" style="background:{cor}; border-left:5px solid orange">
                         <b>{row['Aluno']}</b> ({row['Turma']})<br><i>"{row['Descricao']}"</i><div class="ai-section">🤖 <b>Conviva:</b> {row.get('Acao_Sugerida')}</div>{enc_tag}</div>""", unsafe_allow_html=True)
                         
-                        if st.session_state.id_intervencao_ativa == idx:
-                            txt = st.text_area("Ação:", key=f"tx{idx}")
+                        if st.session_state.id_intervencao_ativa == oid:
+                            txt = st.text_area("Ação:", key=f"tx_{oid}")
                             c1, c2 = st.columns(2)
-                            if c1.button("Salvar", key=f"sv{idx}"):
-                                atualizar_status_gestao(row['Aluno'], row['Data'], "Arquivado", txt)
-                                st.session_state.pdf_buffer = gerar_pdf_continuo(pd.DataFrame([row.to_dict() | {'Intervencao': txt}]))
+                            if c1.button("Salvar", key=f"sv_{oid}"):
+                                atualizar_status_gestao(oid, "Arquivado", txt)
+                                with span("pdf.ficha"): st.session_state.pdf_buffer = gerar_pdf_continuo(pd.DataFrame([row | {'Intervencao': txt}]))
                                 st.session_state.id_intervencao_ativa = None; st.rerun()
-                            if c2.button("Cancelar", key=f"can{idx}"): st.session_state.id_intervencao_ativa = None; st.rerun()
-                        else:
-                            if 'pdf_buffer' in st.session_state and st.session_state.pdf_buffer:
-                                st.download_button("📥 PDF", st.session_state.pdf_buffer, "Ficha.pdf", "application/pdf")
-                                if st.button("Fechar"): st.session_state.pdf_buffer = None; st.rerun()
-                            elif st.session_state.id_intervencao_ativa is None:
-                                if st.button("Intervir", key=f"b{idx}"): st.session_state.id_intervencao_ativa = idx; st.rerun()
+                            if c2.button("Cancelar", key=f"can_{oid}"): st.session_state.id_intervencao_ativa = None; st.rerun()
+                        elif st.session_state.id_intervencao_ativa is None and not st.session_state.pdf_buffer:
+                            if st.button("Intervir", key=f"b_{oid}"): st.session_state.id_intervencao_ativa = oid; st.rerun()
+
+                if total_paginas > 1:
+                    c1, c2, c3 = st.columns([1, 2, 1])
+                    if c1.button("⬅️ Anterior", key="feed_ant", disabled=pagina <= 1): st.session_state.pagina_feed = pagina - 1; st.rerun()
+                    c2.caption(f"Página {pagina} de {total_paginas} ({len(df_show)} ocorrências)")
+                    if c3.button("Próxima ➡️", key="feed_prox", disabled=pagina >= total_paginas): st.session_state.pagina_feed = pagina + 1; st.rerun()
 
         elif nav == "📝 Registrar":
             dpre = st.session_state.get('dados_panico', {})
             if dpre: st.info(f"Resolvendo chamado da {dpre.get('turma', '')}")
-            tg = st.selectbox("Turma", ["6A","6B","7A","7B","8A","8B","9A","9B"], index=["6A","6B","7A","7B","8A","8B","9A","9B"].index(dpre.get('turma', "6A")) if dpre else 0)
+            turmas_reg = turmas_da_escola()
+            tg = st.selectbox("Turma", turmas_reg, index=turmas_reg.index(dpre['turma']) if dpre.get('turma') in turmas_reg else 0) if turmas_reg else st.text_input("Turma").strip().upper()
             with st.form("new_reg", clear_on_submit=True):
                 ag = st.text_input("Aluno"); dg = st.text_area("Fato"); ig = st.text_area("Intervenção")
                 if st.form_submit_button("Salvar"):
-                    salvar_ocorrencia([ag], tg, "GESTÃO", dg, "Média", "Não", ig)
-                    if dpre: atualizar_alerta_status(dpre['turma'], "Resolvido"); del st.session_state['dados_panico']
+                    salvar_ocorrencia([ag], tg, "GESTÃO", dg, "Média", "Não", ig, gravidade="Média")
+                    if dpre: atualizar_alerta_status(dpre['id'], "Resolvido"); del st.session_state['dados_panico']
                     st.success("Ok")
 
         elif nav == "🏫 Histórico":
-            if not df_oc.empty: st.dataframe(df_oc)
+            ini, fim = escolher_periodo("Período:", "periodo_hist")
+            termo = st.text_input("🔎 Buscar na descrição, intervenção e ação sugerida:", placeholder="ex: celular, briga no intervalo", key="busca_hist")
+            ag = carregar_agregados()
+            c1, c2, c3, c4 = st.columns(4)
+            f_turma = c1.selectbox("Turma", ["Todas"] + ag.turmas(), key="busca_turma")
+            f_prof = c2.selectbox("Professor", ["Todos"] + sorted(p for p, n in ag.contagens("professor").items() if n), key="busca_prof")
+            f_status = c3.selectbox("Status", ["Todos", "Pendente", "Arquivado"], key="busca_status")
+            f_aluno = c4.text_input("Aluno", key="busca_aluno")
+            if termo or f_aluno or f_turma != "Todas" or f_prof != "Todos" or f_status != "Todos":
+                t0 = time.perf_counter()
+                try:
+                    with span("busca"):
+                        df_h, total = obter_busca().buscar(termo, ini, fim, None if f_turma == "Todas" else f_turma, f_aluno,
+                                                           None if f_prof == "Todos" else f_prof, None if f_status == "Todos" else f_status)
+                except Exception as e: engolida("busca", e); df_h, total = pd.DataFrame(), 0
+                st.caption(f"{total} ocorrência(s) em {(time.perf_counter() - t0) * 1000:.0f} ms" + (f" (mostrando as {len(df_h)} mais recentes)" if total > len(df_h) else ""))
+            else: df_h = ler_ocorrencias_periodo(ini, fim)
+            if not df_h.empty: st.dataframe(df_h.drop(columns="_seq", errors="ignore"))
+
+        elif nav == "📈 Análises":
+            an = obter_analise()
+            ini, fim = escolher_periodo("Período:", "periodo_analise")
+            pts = an.por_turma_semana(ini, fim)
+            if pts.empty: st.info("Sem dados.")
+            else:
+                st.plotly_chart(px.line(pts, x="semana", y="ocorrencias", color="turma", markers=True, title="Ocorrências por turma (semana)"))
+                c1, c2 = st.columns(2)
+                c1.plotly_chart(px.pie(an.gravidade(ini, fim), names="gravidade", values="ocorrencias", title="Gravidade"))
+                c2.plotly_chart(px.bar(an.taxa_encaminhamento(ini, fim), x="turma", y="taxa", text_auto=".0%", title="Taxa de encaminhamento"))
+                st.plotly_chart(px.bar(an.alertas_por_hora(), x="hora", y="alertas", title="Alertas de pânico por hora"))
+                st.markdown("#### 🔁 Alunos reincidentes"); st.dataframe(an.alunos_reincidentes(ini, fim), hide_index=True)
 
         elif nav == "🖨️ Relatórios":
             st.header("🖨️ Relatórios (PDF)")
-            if not df_oc.empty:
-                mod = st.radio("Modo:", ["Por Aluno", "Por Turma"])
-                ts = st.selectbox("Turma:", sorted(df_oc['Turma'].astype(str).unique()))
-                dft = df_oc[df_oc['Turma'] == ts]
-                
-                if mod == "Por Aluno":
-                    al = st.selectbox("Aluno:", sorted(dft['Aluno'].unique()))
-                    if st.button("Gerar PDF Aluno"):
-                        pdf = gerar_pdf_continuo(dft[dft['Aluno'] == al], f"HISTÓRICO: {al}")
-                        st.download_button("📥 Baixar", pdf, "Rel_Aluno.pdf", "application/pdf")
+            # Período padrão = histórico inteiro (sheet1 + arquivo)
+            ini, fim = escolher_periodo("Período:", "periodo_rel")  # um ano por padrão; períodos mais antigos carregam só as partições que cobrem
+            df_rel = ler_ocorrencias_periodo(ini, fim)
+            turmas_rel = sorted(df_rel['Turma'].astype(str).unique()) if not df_rel.empty else []
+            def alunos_rel(t): return sorted(df_rel.loc[df_rel['Turma'] == t, 'Aluno'].unique())
+            if not df_rel.empty:
+                mod = st.radio("Modo:", ["Por Aluno", "Por Turma", "Escola Inteira"])
+                if mod == "Escola Inteira":
+                    fmt = st.radio("Formato:", ["ZIP (um PDF por aluno)", "PDF único"])
+                    if st.button("Gerar Relatório da Escola"):
+                        st.session_state.relatorio_trabalho = obter_motor_relatorios().solicitar(df_rel, "zip" if fmt.startswith("ZIP") else "pdf", "Rel_Escola")
                 else:
-                    if st.button("Gerar PDF Turma"):
-                        pdf = gerar_pdf_turma_completa(dft)
-                        st.download_button("📥 Baixar Turma", pdf, "Rel_Turma.pdf", "application/pdf")
+                    ts = st.selectbox("Turma:", turmas_rel)
+
+                    if mod == "Por Aluno":
+                        al = st.selectbox("Aluno:", alunos_rel(ts))
+                        if st.button("Gerar PDF Aluno"):
+                            with span("pdf.aluno"): pdf = gerar_pdf_continuo(df_rel[(df_rel['Turma'] == ts) & (df_rel['Aluno'] == al)], f"HISTÓRICO: {al}")
+                            st.download_button("📥 Baixar", pdf, "Rel_Aluno.pdf", "application/pdf")
+                    elif st.button("Gerar PDF Turma"):
+                        st.session_state.relatorio_trabalho = obter_motor_relatorios().solicitar(df_rel[df_rel['Turma'] == ts], "pdf", f"Rel_Turma_{ts}")
+                if mod != "Por Aluno": acompanhar_relatorio()
 
         elif nav == "⚙️ Admin":
             with st.form("new_usr", clear_on_submit=True):
                 tp = st.selectbox("Tipo", ["Professor", "Gestor"])
                 nm = st.text_input("Nome"); cd = st.text_input("Senha")
                 if st.form_submit_button("Criar"): cadastrar_usuario(tp, nm, cd); st.success("Ok")
+            try:
+                fila = obter_fila_escrita()
+                st.caption(f"Fila de escrita: {fila.pendentes()} linha(s) pendente(s)" + (f" | último erro: {fila.ultimo_erro}" if fila.falhas else ""))
+            except Exception as e: engolida("admin.fila", e)
+            try:
+                ep = obter_pool().estatisticas()
+                st.caption(f"Escola: {ESCOLAS[escola_atual()].nome} ({len(ESCOLAS)} no processo) | Clientes: {ep['ativos']}/{ep['maximo']} ativo(s) | {ep['autorizacoes']} autorização(ões) | {ep['renovacoes']} renovação(ões) de token | {ep['despejos']} despejo(s)")
+            except Exception as e: engolida("admin.pool", e)
+            try:
+                est = conectar().estatisticas()
+                st.caption(f"Planilha: {est['chamadas']} chamada(s) | {est['coalescidas']} leitura(s) coalescida(s) | {est['recusadas']} recusa(s) 429 | {est['desistencias']} sem cota | {est['espera']}s de espera | {est['abas_abertas']} aba(s) abertas")
+            except Exception as e: engolida("admin.planilha", e)
+            try:
+                mon = obter_monitor()
+                st.caption(f"Monitor: instantâneo v{mon.versao}, {mon.ciclos} ciclo(s)" + (f" | último erro: {mon.ultimo_erro}" if mon.ultimo_erro else ""))
+            except Exception as e: engolida("admin.monitor", e)
+            try:
+                cl = obter_classificador()
+                st.caption(f"IA: {cl.pendentes()} aguardando | {cl.chamadas} chamada(s) | {cl.acertos_cache} acerto(s) de cache | {cl.erros} erro(s)")
+            except Exception as e: engolida("admin.classificador", e)
+            try:
+                pv = obter_pipeline_voz()
+                st.caption(f"Voz: {pv.chamadas} chamada(s) | {pv.acertos_cache} acerto(s) de cache | {pv.bytes_enviados // 1024} KB enviados")
+            except Exception as e: engolida("admin.voz", e)
+            try:
+                ag = obter_agregados()
+                st.caption(f"Agregados: {ag.reconstrucoes} reconstrução(ões) | {ag.incrementos} atualização(ões) incremental(is)")
+            except Exception as e: engolida("admin.agregados", e)
+            try:
+                an = obter_analise()
+                st.caption(f"Análises: {an.reconstrucoes} reconstrução(ões) | {an.extensoes} extensão(ões) incremental(is)")
+            except Exception as e: engolida("admin.analise", e)
+            try:
+                bu = obter_busca(); eb = bu.estatisticas()
+                st.caption(f"Busca: {eb['linhas']} linha(s) em {eb['abas']} aba(s), {eb['palavras']} palavra(s) | {bu.reconstrucoes} reconstrução(ões) | {bu.incrementos} atualização(ões) incremental(is)")
+            except Exception as e: engolida("admin.busca", e)
+            try:
+                mr = obter_motor_relatorios()
+                st.caption(f"Relatórios: {mr.renderizados} aluno(s) renderizado(s) | {mr.acertos_cache} do cache")
+            except Exception as e: engolida("admin.relatorios", e)
+            with st.expander("Importar cadastros (CSV)"):
+                aba_imp = st.selectbox("Cadastro:", list(CADASTROS), key="imp_aba")
+                st.caption(f"Colunas: {', '.join(CADASTROS[aba_imp]['colunas'])} (obrigatórias: {', '.join(CADASTROS[aba_imp]['obrigatorias'])})")
+                arq = st.file_uploader("Arquivo CSV", type="csv", key="imp_csv")
+                if arq:
+                    try: linhas_imp, erros_imp = validar(aba_imp, arq.getvalue(), ler_cache(aba_imp.lower()), obter_replica().cabecalho(aba_imp) or None)
+                    except Exception as e: st.error(f"Não foi possível ler o arquivo: {e}"); linhas_imp, erros_imp = [], pd.DataFrame()
+                    if not erros_imp.empty:
+                        st.warning(f"{len(erros_imp)} linha(s) com problema não serão importadas:"); st.dataframe(erros_imp, hide_index=True)
+                    if not linhas_imp: st.info("Nenhuma linha nova para importar.")
+                    elif st.button(f"Importar {len(linhas_imp)} linha(s)", type="primary"):
+                        barra = st.progress(0.0)
+                        feitas, erro = importar_cadastros(aba_imp, linhas_imp, lambda n: barra.progress(n / len(linhas_imp), f"{n}/{len(linhas_imp)}"))
+                        if erro: st.error(f"Importação interrompida após {feitas} linha(s): {erro}")
+                        else: st.success(f"{feitas} linha(s) importada(s).")
+            with st.expander("Arquivo de ocorrências"):
+                idade = st.number_input("Arquivar ocorrências arquivadas há mais de (dias):", min_value=30, value=int(segredo("arquivo_idade_dias", IDADE_ARQUIVO_PADRAO)), step=30)
+                if st.button("Arquivar agora"):
+                    try: st.success(f"{obter_arquivo().arquivar(idade)} ocorrência(s) movida(s) para o arquivo.")
+                    except Exception as e: st.error(f"Falha ao arquivar: {e}")
+                try: st.dataframe(obter_arquivo().manifesto(), hide_index=True)
+                except Exception as e: engolida("admin.arquivo", e)
+            with st.expander("Diagnóstico"): painel_diagnostico()
+            with st.expander("Cache de dados"):
+                st.dataframe(obter_cache().estatisticas(), hide_index=True)
+                if st.button("Recarregar tudo da planilha"):
+                    conectar().esquecer_abas()
+                    for aba in ("sheet1", "Alertas", "Professores", "Gestores", "Alunos"): obter_replica().sincronizar(aba, completo=True)
+                    st.rerun()
+
+rastreio.encerrar_execucao()
@@ -0,0 +1,102 @@
+import time
+from datetime import datetime
+from functools import reduce
+
+import pandas as pd
+from gspread.exceptions import WorksheetNotFound
+
+from esquema import concatenar, converter_datas
+from replica import COLUNA_ID
+
+# --- ARQUIVO POR MÊS ---
+# Ocorrências arquivadas há mais de N dias saem da sheet1 para abas "Arquivo_AAAA_MM" (uma por
+# mês da ocorrência); a aba "Arquivo_Manifesto" lista as partições e quantas linhas têm. O
+# caminho quente (Feed, notificações, formulário) só lê a sheet1; histórico, relatórios e
+# análises pedem um período e carregam apenas as partições que o cobrem.
+# A cópia vem antes da remoção e é deduplicada por ID: repetir após uma falha não duplica.
+
+PREFIXO = "Arquivo_"
+MANIFESTO = "Arquivo_Manifesto"
+COLUNAS_MANIFESTO = [COLUNA_ID, "Mes", "Linhas", "Atualizado"]
+
+def nome_particao(mes): return f"{PREFIXO}{mes:%Y_%m}"
+
+def _mes(d): return pd.Timestamp(d).to_period("M").start_time
+
+class ArquivoOcorrencias:
+    def __init__(self, planilha, replica, ler_particao=None, aba="sheet1", idade_particao=3600):
+        self.planilha = planilha
+        self.replica = replica
+        self.aba = aba
+        self.idade_particao = idade_particao
+        self.ler_particao = ler_particao or (lambda nome: self.replica.ler(nome))
+        self._sem_manifesto = None  # quando se viu que o manifesto não existe (escola que nunca arquivou)
+
+    def _garantir_aba(self, nome, colunas):
+        try: return self.planilha.worksheet(nome)
+        except WorksheetNotFound:
+            ws = self.planilha.add_worksheet(title=nome, rows=1, cols=len(colunas))
+            ws.append_row(colunas)
+            return ws
+
+    def manifesto(self):
+        # Manifesto ausente fica lembrado por idade_particao: sem ele, cada leitura pediria os metadados da aba
+        if self._sem_manifesto is not None and time.time() - self._sem_manifesto < self.idade_particao:
+            return pd.DataFrame(columns=COLUNAS_MANIFESTO)
+        try: self.replica.sincronizar(MANIFESTO, idade_maxima=self.idade_particao)
+        except WorksheetNotFound:
+            self._sem_manifesto = time.time(); return pd.DataFrame(columns=COLUNAS_MANIFESTO)
+        self._sem_manifesto = None
+        df = self.replica.ler(MANIFESTO)
+        return df if not df.empty else pd.DataFrame(columns=COLUNAS_MANIFESTO)
+
+    def particoes(self, inicio=None, fim=None):
+        # Partições cujo mês cruza [inicio, fim] (None = sem limite), já sincronizadas
+        m = self.manifesto()
+        if m.empty: return []
+        meses = pd.to_datetime(m["Mes"], format="%Y-%m", errors="coerce")
+        ok = meses.notna()
+        if inicio is not None: ok &= meses >= _mes(inicio)
+        if fim is not None: ok &= meses <= pd.Timestamp(fim)
+        nomes = sorted(m.loc[ok, COLUNA_ID])
+        for nome in nomes: self.replica.sincronizar(nome, idade_maxima=self.idade_particao)
+        return nomes
+
+    def ler_periodo(self, quente, inicio=None, fim=None):
+        # Sheet1 (já tipada, vinda do cache) + partições do período, filtrado por Data
+        partes = [quente] + [self.ler_particao(n) for n in self.particoes(inicio, fim)]
+        df = reduce(concatenar, [p for p in partes if not p.empty] or [quente])
+        if df.empty or "Data" not in df.columns: return df
+        datas = df["Data"] if df["Data"].dtype.kind == "M" else converter_datas(df["Data"])
+        ok = pd.Series(True, index=df.index)
+        if inicio is not None: ok &= (datas >= pd.Timestamp(inicio)).to_numpy()
+        if fim is not None: ok &= (datas < pd.Timestamp(fim) + pd.Timedelta(days=1)).to_numpy()
+        return df[ok.to_numpy()]
+
+    def arquivar(self, idade_dias, agora=None):
+        # Devolve quantas linhas saíram da sheet1
+        self.replica.sincronizar(self.aba, completo=True)
+        df = self.replica.ler(self.aba); cab = self.replica.cabecalho(self.aba)
+        if df.empty or COLUNA_ID not in cab: return 0
+        datas = converter_datas(df["Data"])
+        limite = pd.Timestamp(agora or datetime.now()) - pd.Timedelta(days=idade_dias)
+        sel = df[(df["Status_Gestao"].astype(str).str.strip() == "Arquivado") & (datas < limite) & (df[COLUNA_ID] != "")]
+        if sel.empty: return 0
+        self._garantir_aba(MANIFESTO, COLUNAS_MANIFESTO); self._sem_manifesto = None; self.manifesto()
+        for mes, grupo in sel.groupby(datas[sel.index].dt.to_period("M")):
+            mes = mes.start_time; nome = nome_particao(mes)
+            self._garantir_aba(nome, cab)
+            self.replica.sincronizar(nome)
+            ja = self.replica.ids_existentes(nome, grupo[COLUNA_ID].tolist())
+            novas = grupo.loc[~grupo[COLUNA_ID].isin(ja), cab].values.tolist()
+            if novas: self.replica.anexar(nome, novas)
+            self._registrar(nome, f"{mes:%Y-%m}")
+        return self.replica.excluir_por_ids(self.aba, sel[COLUNA_ID].tolist())
+
+    def _registrar(self, nome, mes):
+        agora = datetime.now().strftime("%Y-%m-%d %H:%M")
+        self.replica.sincronizar(nome)
+        total = len(self.replica.ler(nome))
+        if self.replica.atualizar_por_ids(MANIFESTO, {nome: {"Linhas": str(total), "Atualizado": agora}}): return
+        linha = [nome, mes, str(total), agora]
+        self.replica.anexar(MANIFESTO, [linha])
@@ -0,0 +1,11 @@
+import os
+import sqlite3
+
+# Banco SQLite local (fila de escrita, réplica e caches). Não é a fonte da verdade: a planilha é.
+CAMINHO_PADRAO = os.environ.get("EDUGESTOR_DB", "edugestor.db")
+
+def abrir(caminho=None):
+    con = sqlite3.connect(caminho or CAMINHO_PADRAO, timeout=30, isolation_level=None, check_same_thread=False)
+    con.execute("PRAGMA journal_mode=WAL")
+    con.execute("PRAGMA synchronous=NORMAL")
+    return con
@@ -0,0 +1,243 @@
+import argparse
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import warnings
+
+# --- BENCHMARK OFFLINE ---
+# Roda o app de verdade (streamlit.testing.AppTest) contra a planilha falsa e a IA local, sem
+# rede nem credenciais. Cada combinação linhas x sessões roda num processo novo (caches,
+# réplica e pollers começam vazios) e mede:
+#   partida      primeira execução do painel de gestão (sincronização completa da planilha)
+#   feed         reexecuções do Feed em N sessões de gestão simultâneas
+#   envio        clique em "Enviar" em N sessões de professor simultâneas
+#   gravado      do clique até a linha aparecer na planilha (fila de escrita)
+#   notificacao  do clique até a próxima execução do painel mostrar o aviso (consulta a cada 0,2s;
+#                no navegador o painel confere a cada 3s)
+#   pdf_aluno    "Gerar PDF Aluno" (síncrono)
+#   pdf_turma    "Gerar PDF Turma" até o botão de download aparecer (motor de relatórios)
+# e as chamadas à API (leituras, escritas, 429) de cada cenário.
+#
+#   python benchmark.py --linhas 1000 10000 100000 --sessoes 1 4 --repeticoes 10
+
+APP = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+TEMPO_LIMITE = 600
+
+def percentis(tempos):
+    v = sorted(t for t in tempos if t is not None)
+    if not v: return {}
+    p = lambda q: v[min(len(v) - 1, int(q * len(v)))]
+    return {"n": len(v), "p50": p(0.5), "p95": p(0.95), "p99": p(0.99), "max": v[-1]}
+
+# --- RODADA (processo filho) ---
+def _preparar_sessoes():
+    # Várias sessões AppTest em threads, como várias abas abertas no mesmo servidor:
+    # - AppTest recompila o app a cada execução; no CPython 3.11 compilar em várias threads ao
+    #   mesmo tempo pode falhar ("AST constructor recursion depth mismatch")
+    # - cada execução instala um Runtime global e o apaga ao terminar; as sessões que ainda estão
+    #   rodando passam a usar o último instalado
+    from streamlit.runtime.runtime import Runtime
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+    compilar, trava, ultimo = ScriptCache.get_bytecode, threading.Lock(), [None]
+    def get_bytecode(self, caminho):
+        with trava: return compilar(self, caminho)
+    def instance(cls):
+        if cls._instance is not None: ultimo[0] = cls._instance
+        if ultimo[0] is None: raise RuntimeError("Runtime hasn't been created!")
+        return ultimo[0]
+    ScriptCache.get_bytecode = get_bytecode
+    Runtime.instance = classmethod(instance)
+    Runtime.exists = classmethod(lambda cls: cls._instance is not None or ultimo[0] is not None)
+
+def _sessao(**params):
+    from streamlit.testing.v1 import AppTest
+    at = AppTest.from_file(APP, default_timeout=TEMPO_LIMITE)
+    for k, v in params.items(): at.query_params[k] = v
+    return at
+
+def _gestor():
+    at = _sessao(gestao_logada="true", gestao_nome="Gestor"); at.run()
+    at.sidebar.radio[0].set_value("Painel Gestão").run()
+    return at
+
+def _professor(nome):
+    at = _sessao(prof_logado="true", prof_nome=nome); at.run()
+    return at
+
+def _botao(at, rotulo): return next(b for b in at.button if b.label == rotulo)
+
+def _erros(at): return [str(e.value) for e in at.exception]
+
+def _enviar(at, desc, n):
+    # Um aluno da turma selecionada + descrição única; devolve a duração do clique
+    ms = at.multiselect[0]; ms.set_value([ms.options[1 + n % (len(ms.options) - 1)]])
+    at.text_area[0].input(desc)
+    t = time.perf_counter(); _botao(at, "Enviar").click().run()
+    return time.perf_counter() - t
+
+def _paralelo(n, alvo):
+    resultados, erros = [[] for _ in range(n)], []
+    def trabalhar(i):
+        try: resultados[i] = alvo(i)
+        except Exception as e: erros.append(repr(e))
+    ts = [threading.Thread(target=trabalhar, args=(i,)) for i in range(n)]
+    for t in ts: t.start()
+    for t in ts: t.join()
+    return [x for r in resultados for x in r], erros
+
+class _Vigia:
+    # Anota quando cada descrição aparece na planilha falsa (consulta direta, sem cota)
+    def __init__(self, aba):
+        self.aba, self.vistos, self._parar = aba, {}, threading.Event()
+        self._inicio = len(aba.linhas)
+        threading.Thread(target=self._loop, daemon=True).start()
+
+    def _loop(self):
+        while not self._parar.wait(0.05):
+            linhas = self.aba.linhas[self._inicio:]
+            agora = time.perf_counter()
+            for l in linhas:
+                if len(l) > 4: self.vistos.setdefault(l[4], agora)
+
+    def esperar(self, descs, limite):
+        fim = time.time() + limite
+        while time.time() < fim and not all(d in self.vistos for d in descs): time.sleep(0.05)
+        self._parar.set()
+
+def rodada(linhas, sessoes, repeticoes, escala):
+    import planilha_falsa
+    _preparar_sessoes()
+    planilha = planilha_falsa.abrir("Dados_Escolares", linhas=linhas, escala=escala)
+    cenarios, erros = {}, []
+
+    def medir(nome, fn):
+        print(f"  {nome}", file=sys.stderr, flush=True)
+        antes = planilha.estatisticas()
+        tempos = fn()
+        depois = planilha.estatisticas()
+        cenarios[nome] = {"tempos": tempos, **{k: depois[k] - antes[k] for k in ("leituras", "escritas", "recusadas")}}
+
+    def partida():
+        t = time.perf_counter(); g = _gestor(); erros.extend(_erros(g))
+        return [time.perf_counter() - t]
+    medir("partida", partida)
+
+    gestores = [_gestor() for _ in range(sessoes)]
+    def feed():
+        def sessao(i):
+            tempos = []
+            for _ in range(repeticoes):
+                t = time.perf_counter(); gestores[i].run(); tempos.append(time.perf_counter() - t)
+            erros.extend(_erros(gestores[i])); return tempos
+        tempos, e = _paralelo(sessoes, sessao); erros.extend(e); return tempos
+    medir("feed", feed)
+
+    professores = [_professor(f"Prof {i % 12 + 1}") for i in range(sessoes)]
+    vigia = _Vigia(planilha.aba("sheet1")); inicios = {}
+    def envio():
+        def sessao(i):
+            tempos = []
+            for n in range(repeticoes):
+                desc = f"bench envio {i}-{n}"; inicios[desc] = time.perf_counter()
+                tempos.append(_enviar(professores[i], desc, n))
+            erros.extend(_erros(professores[i])); return tempos
+        tempos, e = _paralelo(sessoes, sessao); erros.extend(e); return tempos
+    medir("envio", envio)
+    def gravado():
+        vigia.esperar(list(inicios), 120)
+        return [vigia.vistos[d] - t if d in vigia.vistos else None for d, t in inicios.items()]
+    medir("gravado", gravado)
+
+    g, p = gestores[0], professores[0]
+    def notificacao():
+        tempos = []
+        for n in range(repeticoes):
+            g.run(); marca = g.session_state["marca_notificacoes"]  # avisos anteriores já consumidos
+            t = time.perf_counter(); _enviar(p, f"bench aviso {n}", n); visto = None
+            while time.perf_counter() - t < 60:
+                g.run()
+                if g.session_state["marca_notificacoes"] > marca: visto = time.perf_counter() - t; break
+                time.sleep(0.2)
+            tempos.append(visto)
+        erros.extend(_erros(g)); return tempos
+    medir("notificacao", notificacao)
+
+    nav = lambda rotulo: next(r for r in g.radio if "🖨️ Relatórios" in r.options).set_value(rotulo).run()
+    nav("🖨️ Relatórios")
+    def pdf_aluno():
+        tempos = []
+        turmas = g.selectbox[0].options
+        for n in range(repeticoes):
+            g.selectbox[0].set_value(turmas[n % len(turmas)]).run()
+            t = time.perf_counter(); _botao(g, "Gerar PDF Aluno").click().run(); tempos.append(time.perf_counter() - t)
+        erros.extend(_erros(g)); return tempos
+    medir("pdf_aluno", pdf_aluno)
+    def pdf_turma():
+        tempos = []
+        next(r for r in g.radio if "Por Turma" in r.options).set_value("Por Turma").run()
+        turmas = g.selectbox[0].options
+        for n in range(repeticoes):
+            g.selectbox[0].set_value(turmas[n % len(turmas)]).run()
+            t = time.perf_counter(); _botao(g, "Gerar PDF Turma").click().run(); pronto = None
+            while time.perf_counter() - t < TEMPO_LIMITE:
+                if any(str(b.label).startswith("📥") for b in g.get("download_button")): pronto = time.perf_counter() - t; break
+                time.sleep(0.2); g.run()
+            tempos.append(pronto)
+        erros.extend(_erros(g)); return tempos
+    medir("pdf_turma", pdf_turma)
+
+    return {"linhas": linhas, "sessoes": sessoes, "cenarios": cenarios, "api": planilha.estatisticas(), "erros": erros[:20]}
+
+# --- ORQUESTRAÇÃO ---
+def executar(linhas, sessoes, repeticoes, escala, ia_latencia):
+    # Um processo por combinação, com banco local próprio
+    with tempfile.TemporaryDirectory() as pasta:
+        env = dict(os.environ, EDUGESTOR_PLANILHA="falsa", EDUGESTOR_IA="local", EDUGESTOR_IA_LATENCIA=str(ia_latencia),
+                   EDUGESTOR_DB=os.path.join(pasta, "edugestor.db"))
+        args = [sys.executable, os.path.abspath(__file__), "--rodada", "--linhas", str(linhas), "--sessoes", str(sessoes),
+                "--repeticoes", str(repeticoes), "--escala", str(escala)]
+        saida = subprocess.run(args, env=env, cwd=pasta, stdout=subprocess.PIPE, text=True)  # progresso vai para o stderr
+        ultima = saida.stdout.strip().splitlines()[-1:] if saida.returncode == 0 else []
+        if not ultima: raise RuntimeError(f"rodada {linhas}x{sessoes} falhou (código {saida.returncode})")
+        return json.loads(ultima[0])
+
+def imprimir(resultados):
+    print(f"{'cenário':<12} {'linhas':>7} {'sessões':>7} {'n':>4} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'máx ms':>9} {'leit.':>6} {'escr.':>6} {'429':>5}")
+    for r in resultados:
+        for nome, c in r["cenarios"].items():
+            p = percentis(c["tempos"]); ms = lambda k: f"{p[k] * 1000:9.0f}" if k in p else f"{'-':>9}"
+            falta = sum(t is None for t in c["tempos"])
+            print(f"{nome:<12} {r['linhas']:>7} {r['sessoes']:>7} {p.get('n', 0):>4} {ms('p50')} {ms('p95')} {ms('p99')} {ms('max')} "
+                  f"{c['leituras']:>6} {c['escritas']:>6} {c['recusadas']:>5}" + (f"  ({falta} sem resposta)" if falta else ""))
+        if r["erros"]: print(f"  erros ({r['linhas']}x{r['sessoes']}): {r['erros'][:3]}")
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark offline do EduGestor (planilha falsa + IA local)")
+    ap.add_argument("--linhas", type=int, nargs="+", default=[1000, 10000, 100000])
+    ap.add_argument("--sessoes", type=int, nargs="+", default=[1, 4])
+    ap.add_argument("--repeticoes", type=int, default=10)
+    ap.add_argument("--escala", type=float, default=1.0, help="multiplica a latência simulada (0 = sem espera)")
+    ap.add_argument("--ia-latencia", type=float, default=1.5, help="segundos por chamada da IA local")
+    ap.add_argument("--json", help="grava os tempos brutos neste arquivo")
+    ap.add_argument("--rodada", action="store_true", help=argparse.SUPPRESS)
+    a = ap.parse_args()
+    if a.rodada:
+        logging.disable(logging.WARNING); warnings.filterwarnings("ignore")
+        print(json.dumps(rodada(a.linhas[0], a.sessoes[0], a.repeticoes, a.escala)), flush=True)
+        return
+    resultados = []
+    for linhas in a.linhas:
+        for sessoes in a.sessoes:
+            print(f"... {linhas} linhas, {sessoes} sessão(ões)", file=sys.stderr, flush=True)
+            resultados.append(executar(linhas, sessoes, a.repeticoes, a.escala, a.ia_latencia))
+    imprimir(resultados)
+    if a.json:
+        with open(a.json, "w") as f: json.dump(resultados, f)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+import bisect
+import heapq
+import re
+import threading
+from functools import reduce
+
+import pandas as pd
+
+from esquema import converter_datas
+from indice_alunos import normalizar
+from rastreio import engolida
+
+# --- BUSCA TEXTUAL ---
+# Índice invertido (palavra -> linhas) sobre Descricao, Intervencao e Acao_Sugerida, uma parte
+# por aba (sheet1 e cada partição do arquivo, montada na primeira busca que a cobre). Palavras
+# sem acento e em maiúsculas; cada termo da busca casa como prefixo ("celu" acha "celular") e
+# todos os termos precisam aparecer. Inserções e atualizações da réplica reindexam só as linhas
+# tocadas; exclusões e recargas remontam a parte da aba. Os filtros (turma, aluno, professor,
+# status, período) rodam sobre os metadados guardados no índice, sem tocar nos DataFrames.
+
+CAMPOS_TEXTO = ("Descricao", "Intervencao", "Acao_Sugerida")
+PALAVRAS_VAZIAS = frozenset("A AO AS COM DA DAS DE DO DOS E EM NA NAS NO NOS O OS OU PARA POR QUE SE UM UMA".split())
+
+def palavras(texto):
+    return {p for p in re.findall(r"[A-Z0-9]+", normalizar(texto)) if len(p) > 1 and p not in PALAVRAS_VAZIAS}
+
+class _Parte:
+    # Índice de uma aba: postings, palavras de cada linha (para desfazer) e metadados dos filtros
+    def __init__(self):
+        self.postings = {}
+        self.palavras = {}
+        self.meta = {}  # _linha -> (data, turma, aluno normalizado, professor, status)
+        self.sujo = True
+        self._vocabulario = None
+
+    def vocabulario(self):
+        if self._vocabulario is None: self._vocabulario = sorted(self.postings)
+        return self._vocabulario
+
+    def reconstruir(self, df):
+        self.postings, self.palavras, self.meta, self._vocabulario = {}, {}, {}, None
+        if df.empty: return
+        col = lambda c: df[c].astype(str) if c in df.columns else pd.Series("", index=df.index)
+        texto = reduce(lambda a, b: a + " " + b, [col(c) for c in CAMPOS_TEXTO])
+        # Normalização vetorizada (mesmo resultado de indice_alunos.normalizar)
+        tokens = texto.str.normalize("NFKD").str.encode("ascii", "ignore").str.decode("ascii").str.upper().str.findall(r"[A-Z0-9]+")
+        datas = converter_datas(col("Data")) if "Data" in df.columns else pd.Series(pd.NaT, index=df.index)
+        alunos = col("Aluno").map(normalizar)
+        for i, t, d, turma, aluno, prof, st in zip(df.index, tokens, datas, col("Turma").str.strip().str.upper(), alunos, col("Professor"), col("Status_Gestao")):
+            self._indexar(i, {p for p in t if len(p) > 1 and p not in PALAVRAS_VAZIAS}, (d, turma, aluno, prof, st.strip() or "Pendente"))
+
+    def _indexar(self, i, ps, meta):
+        if i in self.palavras: self.remover(i)
+        self.palavras[i] = ps; self.meta[i] = meta
+        for p in ps:
+            if p not in self.postings: self._vocabulario = None
+            self.postings.setdefault(p, set()).add(i)
+
+    def remover(self, i):
+        for p in self.palavras.pop(i, ()):
+            s = self.postings[p]; s.discard(i)
+            if not s: del self.postings[p]; self._vocabulario = None
+        self.meta.pop(i, None)
+
+    def atualizar(self, i, valores):
+        # valores = a linha inteira ({coluna: texto}), já combinada com o que havia antes
+        try: data = pd.Timestamp(valores.get("Data", ""))
+        except Exception as e: engolida("busca.data", e); data = pd.NaT
+        texto = " ".join(str(valores.get(c, "")) for c in CAMPOS_TEXTO)
+        self._indexar(i, palavras(texto), (data, str(valores.get("Turma", "")).strip().upper(), normalizar(valores.get("Aluno", "")),
+                                            str(valores.get("Professor", "")), str(valores.get("Status_Gestao", "")).strip() or "Pendente"))
+
+    def casar(self, termo):
+        # Linhas com alguma palavra que começa com o termo
+        voc = self.vocabulario(); i = bisect.bisect_left(voc, termo); out = set()
+        while i < len(voc) and voc[i].startswith(termo): out |= self.postings[voc[i]]; i += 1
+        return out
+
+class IndiceBusca:
+    def __init__(self, replica, tipar=None, aba="sheet1", particoes=None):
+        # tipar: conversão das linhas devolvidas; particoes(inicio, fim) -> abas do arquivo no período
+        self.replica = replica
+        self.tipar = tipar
+        self.aba = aba
+        self.particoes = particoes
+        self._trava = threading.Lock()
+        self._partes = {}
+        self._cab = {}
+        self.reconstrucoes = 0
+        self.incrementos = 0
+        replica.assinar(self._evento)
+
+    def _parte(self, aba):
+        with self._trava: p = self._partes.setdefault(aba, _Parte())
+        if p.sujo:
+            versao = self.replica.versao(aba)
+            df = self.replica.ler(aba); cab = self.replica.cabecalho(aba)
+            with self._trava:
+                p.reconstruir(df); self._cab[aba] = cab
+                p.sujo = versao != self.replica.versao(aba)
+                self.reconstrucoes += 1
+        return p
+
+    def _evento(self, aba, evento, dados):
+        p = self._partes.get(aba)
+        if p is None: return
+        with self._trava:
+            if p.sujo: return
+            cab = self._cab.get(aba)
+            if evento == "insercao" and cab:
+                for n, l in enumerate(dados["linhas"]): p.atualizar(dados["primeira"] + n, dict(zip(cab, l)))
+                self.incrementos += 1
+            elif evento == "atualizacao" and dados["linha"] in p.meta:
+                # Só Status_Gestao/Intervencao/Acao_Sugerida costumam mudar: o resto vem da réplica
+                valores = self.replica.ler_linha(aba, dados["linha"]) | dados["valores"]
+                p.atualizar(dados["linha"], valores); self.incrementos += 1
+            else: p.sujo = True
+
+    def buscar(self, texto="", inicio=None, fim=None, turma=None, aluno=None, professor=None, status=None, limite=500, pular=0):
+        # Devolve (DataFrame com as ocorrências mais recentes primeiro, até `limite` (None = todas) depois
+        # das `pular` primeiras; total encontrado)
+        termos = sorted(palavras(texto), key=len, reverse=True)  # termo mais longo primeiro: conjunto menor
+        ini = pd.Timestamp(inicio) if inicio is not None else None
+        fim_ = pd.Timestamp(fim) + pd.Timedelta(days=1) if fim is not None else None
+        aluno = normalizar(aluno) if aluno else None
+        turma = str(turma).strip().upper() if turma else None
+        achados = []
+        for aba in [self.aba] + (self.particoes(inicio, fim) if self.particoes else []):
+            p = self._parte(aba)
+            with self._trava:
+                linhas = None
+                for t in termos:
+                    c = p.casar(t); linhas = c if linhas is None else linhas & c
+                    if not linhas: break
+                for i in (p.meta if linhas is None else linhas):
+                    d, tu, al, pr, st = p.meta[i]
+                    if turma and tu != turma: continue
+                    if aluno and aluno not in al: continue
+                    if professor and pr != professor: continue
+                    if status and st != status: continue
+                    if ini is not None and not d >= ini: continue
+                    if fim_ is not None and not d < fim_: continue
+                    achados.append((pd.Timestamp.min if pd.isna(d) else d, aba, i))
+        por_aba = {}
+        for _, aba, i in (heapq.nlargest(pular + limite, achados)[pular:] if limite else achados): por_aba.setdefault(aba, []).append(i)
+        # Só as linhas que vão para a tela saem da réplica (partições antigas não são carregadas inteiras)
+        partes = [p for p in (self.replica.ler_linhas(aba, linhas) for aba, linhas in por_aba.items()) if not p.empty]
+        if not partes: return pd.DataFrame(), len(achados)
+        out = pd.concat(partes, ignore_index=True)  # a linha só vale dentro da aba; tipar uma vez só
+        if self.tipar: out = self.tipar(out)
+        return out.sort_values("Data", ascending=False, kind="stable", ignore_index=True) if "Data" in out.columns else out, len(achados)
+
+    def estatisticas(self):
+        with self._trava:
+            return {"abas": len(self._partes), "linhas": sum(len(p.meta) for p in self._partes.values()),
+                    "palavras": sum(len(p.postings) for p in self._partes.values())}
@@ -0,0 +1,90 @@
+import threading
+import time
+
+import pandas as pd
+
+from esquema import atribuir, concatenar
+from rastreio import engolida, span
+
+# --- CACHE POR ABA ---
+# Uma entrada por aba (ou visão derivada) com etiquetas de dependência. As escritas do
+# próprio app chegam como eventos da réplica: entradas de aba recebem o remendo no
+# DataFrame em cache; visões derivadas só das etiquetas afetadas são invalidadas.
+
+class CacheTabelas:
+    def __init__(self, replica):
+        self.replica = replica
+        self._defs = {}
+        self._entradas = {}
+        self._trava = threading.RLock()
+        self.contadores = {}
+        replica.assinar(self._evento)
+
+    def registrar(self, nome, ttl, aba=None, carregar=None, tags=(), tipar=None):
+        # aba=...: espelho da aba (remendado nos eventos); carregar=...: visão derivada de `tags`
+        # tipar=...: conversão aplicada à aba inteira na carga e às linhas de cada remendo
+        tags = (aba,) if aba else tuple(tags)
+        if aba and not carregar: carregar = (lambda: tipar(self.replica.ler(aba))) if tipar else (lambda: self.replica.ler(aba))
+        self._defs[nome] = {"ttl": ttl, "aba": aba, "carregar": carregar, "tags": tags, "tipar": tipar}
+        self.contadores.setdefault(nome, {"acertos": 0, "faltas": 0, "remendos": 0, "invalidacoes": 0})
+
+    def _contar(self, nome, chave): self.contadores[nome][chave] += 1
+
+    def obter(self, nome):
+        with span(f"cache.{nome}") as s: return self._obter(nome, s)
+
+    def _obter(self, nome, s):
+        d = self._defs[nome]; e = self._entradas.get(nome)
+        if e and time.time() - e["verificado"] > d["ttl"]:
+            # TTL vencido: só a sincronização incremental; o que chegar vira evento (remendo/invalidação)
+            for aba in d["tags"]:
+                try: self.replica.sincronizar(aba)
+                except Exception as erro: engolida("cache.sincronizar", erro)
+            with self._trava:
+                e = self._entradas.get(nome)
+                if e: e["verificado"] = time.time()
+        if e:
+            self._contar(nome, "acertos"); s["cache"] = "acerto"
+            return e["valor"]
+        self._contar(nome, "faltas"); s["cache"] = "falta"
+        for aba in d["tags"]:
+            try: self.replica.sincronizar(aba)
+            except Exception as erro: engolida("cache.sincronizar", erro)  # sem rede/cota: monta com o que a réplica já tem
+        versoes = {aba: self.replica.versao(aba) for aba in d["tags"]}
+        valor = d["carregar"]()
+        with self._trava:
+            # Só guarda se nada mudou durante a montagem; senão a próxima leitura remonta
+            if versoes == {aba: self.replica.versao(aba) for aba in d["tags"]}:
+                self._entradas[nome] = {"valor": valor, "verificado": time.time()}
+        return valor
+
+    def _evento(self, aba, evento, dados):
+        with self._trava:
+            for nome, d in self._defs.items():
+                if aba not in d["tags"] or nome not in self._entradas: continue
+                e = self._entradas[nome]
+                novo = self._remendar(e["valor"], evento, dados, d["tipar"]) if d["aba"] else None
+                if novo is None: del self._entradas[nome]; self._contar(nome, "invalidacoes")
+                else: e["valor"] = novo; self._contar(nome, "remendos")
+
+    @staticmethod
+    def _remendar(df, evento, dados, tipar=None):
+        # Devolve um novo DataFrame (quem já leu o anterior não é afetado) ou None para invalidar
+        if evento == "insercao":
+            if df.empty and len(df.columns) == 0: return None
+            novo = pd.DataFrame([[*l, sq] for l, sq in zip(dados["linhas"], dados["seqs"])], columns=df.columns,
+                                index=range(dados["primeira"], dados["primeira"] + len(dados["linhas"])))
+            base = df.drop(index=novo.index, errors="ignore")
+            out = concatenar(base, tipar(novo)) if tipar else pd.concat([base, novo])
+            return out if base.empty or novo.index[0] > base.index[-1] else out.sort_index()
+        if evento == "atualizacao":
+            if dados["linha"] not in df.index: return None
+            if tipar: return atribuir(df, dados["linha"], dados["valores"], tipar)
+            out = df.copy()
+            for c, v in dados["valores"].items(): out.loc[dados["linha"], c] = v
+            return out
+        return None
+
+    def estatisticas(self):
+        return pd.DataFrame([{"entrada": n, "etiquetas": ", ".join(self._defs[n]["tags"]), "em_cache": n in self._entradas, **c}
+                             for n, c in self.contadores.items()])
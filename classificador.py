@@ -0,0 +1,130 @@
+import hashlib
+import json
+import re
+import threading
+import time
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+
+import banco_local
+from rastreio import engolida, propagar
+
+# --- CLASSIFICAÇÃO POR IA (ASSÍNCRONA) ---
+# A ocorrência é salva na hora com ACAO_CLASSIFICANDO; um pool pequeno de threads consulta
+# o modelo e preenche Acao_Sugerida/Gravidade depois. Respostas ficam num cache em SQLite
+# pela chave sha256(versão do prompt, turma, descrição).
+
+VERSAO_PROMPT = "conviva179-v1"
+ACAO_CLASSIFICANDO = "⏳ Classificando..."
+CATEGORIAS_SEGURANCA = ["HARM_CATEGORY_HARASSMENT", "HARM_CATEGORY_HATE_SPEECH", "HARM_CATEGORY_SEXUALLY_EXPLICIT", "HARM_CATEGORY_DANGEROUS_CONTENT"]
+
+def montar_prompt(descricao, turma):
+    return f"""Especialista CONVIVA SP (Protocolo 179). Dados: Turma {turma} | Fato: "{descricao}". Classifique GRAVIDADE: ALTA, MÉDIA, BAIXA. Sugira AÇÃO mediação e acolhimento. Responda: GRAVIDADE: [G] AÇÃO: [A]"""
+
+def chave(descricao, turma):
+    return hashlib.sha256(f"{VERSAO_PROMPT}\x1f{str(turma).strip().upper()}\x1f{str(descricao).strip()}".encode("utf-8")).hexdigest()
+
+def normalizar_gravidade(g):
+    base = unicodedata.normalize("NFKD", str(g)).encode("ascii", "ignore").decode().upper()
+    if "ALTA" in base: return "Alta"
+    if "BAIXA" in base: return "Baixa"
+    return "Média"
+
+def interpretar_resposta(texto):
+    g, a = "Média", texto
+    if "GRAVIDADE:" in texto:
+        parts = texto.split("AÇÃO:")
+        g = parts[0].replace("GRAVIDADE:", "").strip()
+        a = parts[1].strip() if len(parts) > 1 else texto
+    return normalizar_gravidade(g), a
+
+# --- CLIENTES ---
+class ClienteGemini:
+    # Modelo e lista de segurança montados uma vez só
+    def __init__(self, nome_modelo):
+        import google.generativeai as genai
+        self.modelo = genai.GenerativeModel(nome_modelo)
+        self.seguranca = [{"category": c, "threshold": "BLOCK_NONE"} for c in CATEGORIAS_SEGURANCA]
+
+    def gerar(self, conteudo):
+        return self.modelo.generate_content(conteudo, safety_settings=self.seguranca).text
+
+class ClienteIALocal:
+    # Substituto offline (testes/benchmark): regras por palavra-chave, mesmo formato de resposta
+    ALTA = ("arma", "faca", "agred", "agress", "bateu", "soco", "sangue", "ameac", "droga", "briga", "brigou")
+    BAIXA = ("celular", "atras", "uniforme", "conversa", "dormiu")
+
+    def __init__(self, latencia=0.0):
+        self.latencia = latencia
+
+    def gerar(self, conteudo):
+        if self.latencia: time.sleep(self.latencia)
+        if not isinstance(conteudo, str) and any(isinstance(c, dict) for c in conteudo):
+            # Áudio: não há transcrição offline, devolve o formato do comando de voz vazio
+            return json.dumps({"texto_completo": "", "turma_detectada": "", "alunos_detectados": []})
+        texto =conteudo if isinstance(conteudo, str) else " ".join(c for c in conteudo if isinstance(c, str))
+        fato = re.search(r'Fato: "(.*)"', texto, re.S)
+        base = unicodedata.normalize("NFKD", fato.group(1) if fato else texto).encode("ascii", "ignore").decode().lower()
+        if any(p in base for p in self.ALTA): g = "ALTA"
+        elif any(p in base for p in self.BAIXA): g = "BAIXA"
+        else: g = "MÉDIA"
+        return f"GRAVIDADE: {g} AÇÃO: Acolher o aluno, registrar o fato e conversar com os envolvidos."
+
+# --- FILA ---
+class ClassificadorIA:
+    def __init__(self, cliente, ao_concluir, caminho=None, trabalhadores=2, tentativas=3):
+        self.cliente = cliente
+        self.ao_concluir = ao_concluir
+        self.caminho = caminho
+        self.tentativas = tentativas
+        self.chamadas = 0
+        self.acertos_cache = 0
+        self.erros = 0
+        self._em_andamento = {}  # chave -> ids aguardando (descrições iguais viram uma chamada só)
+        self._trava = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=trabalhadores, thread_name_prefix="classificador")
+        with closing(banco_local.abrir(self.caminho)) as con:
+            con.execute("""CREATE TABLE IF NOT EXISTS cache_ia (
+                chave TEXT PRIMARY KEY, gravidade TEXT NOT NULL, acao TEXT NOT NULL, criado REAL NOT NULL)""")
+
+    def pendentes(self):
+        with self._trava: return sum(len(v) for v in self._em_andamento.values())
+
+    def _ler_cache(self, ch):
+        with closing(banco_local.abrir(self.caminho)) as con:
+            return con.execute("SELECT gravidade, acao FROM cache_ia WHERE chave = ?", (ch,)).fetchone()
+
+    def _gravar_cache(self, ch, g, a):
+        with closing(banco_local.abrir(self.caminho)) as con:
+            con.execute("INSERT OR REPLACE INTO cache_ia VALUES (?, ?, ?, ?)", (ch, g, a, time.time()))
+
+    def _concluir(self, ids, g, a):
+        for n in range(self.tentativas):
+            try: self.ao_concluir(ids, g, a); return
+            except Exception as e: engolida("classificador.concluir", e); time.sleep(2 ** n)
+        self.erros += 1
+
+    def classificar(self, ids, descricao, turma):
+        ids = list(ids)
+        if not ids: return
+        if self.cliente is None: self._concluir(ids, "Média", "IA Indisponível"); return
+        ch = chave(descricao, turma)
+        em_cache = self._ler_cache(ch)
+        if em_cache:
+            # Acerto: resolve já (as linhas ainda estão no diário, então nem vai à planilha)
+            self.acertos_cache += 1; self._concluir(ids, *em_cache); return
+        with self._trava:
+            if ch in self._em_andamento: self._em_andamento[ch].extend(ids); return
+            self._em_andamento[ch] = ids
+        self._pool.submit(propagar(self._trabalhar), ch, descricao, turma)
+
+    def _trabalhar(self, ch, descricao, turma):
+        try:
+            self.chamadas += 1
+            g, a = interpretar_resposta(self.cliente.gerar(montar_prompt(descricao, turma)))
+            self._gravar_cache(ch, g, a)
+        except Exception as e:
+            engolida("classificador.gerar", e); self.erros += 1; g, a = "Média", "Erro IA"
+        with self._trava: ids = self._em_andamento.pop(ch, [])
+        self._concluir(ids, g, a)
@@ -0,0 +1,157 @@
+import random
+import threading
+import time
+
+from gspread.exceptions import APIError
+
+# --- CLIENTE DA PLANILHA COM COTA ---
+# Fica entre o app e o gspread (todas as sessões usam a mesma instância de conectar()):
+# - leituras idênticas simultâneas viram uma só chamada (as outras esperam o mesmo resultado);
+# - um balde de fichas por tipo (leitura/escrita) mantém o ritmo dentro da cota por minuto;
+# - 429 (e 5xx nas leituras) repetem com espera exponencial aleatória;
+# - as abas abertas ficam guardadas: sheet1/worksheet() buscam os metadados uma vez só.
+# Sem ficha dentro da espera máxima a chamada desiste com SemCota; quem lê (réplica) continua
+# servindo o último dado bom e marca a aba como atrasada.
+
+class SemCota(Exception):
+    pass
+
+def recusa_da_api(e):
+    return isinstance(e, APIError) and e.code == 429
+
+def erro_temporario(e):
+    return isinstance(e, APIError) and (e.code == 429 or e.code >= 500)
+
+class BaldeFichas:
+    def __init__(self, por_minuto, rajada=None):
+        # rajada + ritmo * 60 = cota: nenhuma janela de 60s passa da cota
+        self.capacidade = rajada if rajada is not None else max(1, por_minuto // 4)
+        self.por_segundo = (por_minuto - self.capacidade) / 60
+        self.fichas = float(self.capacidade)
+        self.atualizado = time.monotonic()
+        self._trava = threading.Lock()
+
+    def retirar(self, espera_maxima):
+        # Devolve quanto esperou; SemCota se a ficha não sai dentro de espera_maxima
+        esperou = 0.0
+        while True:
+            with self._trava:
+                agora = time.monotonic()
+                self.fichas = min(self.capacidade, self.fichas + (agora - self.atualizado) * self.por_segundo)
+                self.atualizado = agora
+                if self.fichas >= 1: self.fichas -= 1; return esperou
+                falta = (1 - self.fichas) / self.por_segundo
+            if esperou + falta > espera_maxima: raise SemCota(f"cota local esgotada (próxima ficha em {falta:.1f}s)")
+            time.sleep(falta); esperou += falta
+
+    def esvaziar(self):
+        # A API recusou: ninguém mais tenta antes da próxima ficha
+        with self._trava: self.fichas = min(self.fichas, 0.0); self.atualizado = time.monotonic()
+
+class _Voo:
+    def __init__(self): self.pronto = threading.Event(); self.valor = None; self.erro = None
+
+class AbaProtegida:
+    def __init__(self, planilha, aba): self._planilha, self._aba = planilha, aba
+
+    def __getattr__(self, nome): return getattr(self._aba, nome)
+
+    # --- leitura ---
+    def get_all_values(self, **k):
+        return self._planilha._ler((self._aba.title, "get_all_values", tuple(sorted(k.items()))), lambda: self._aba.get_all_values(**k))
+
+    def get(self, rng, **k):
+        return self._planilha._ler((self._aba.title, "get", rng, tuple(sorted(k.items()))), lambda: self._aba.get(rng, **k))
+
+    # --- escrita (só 429 repete: um 5xx pode ter gravado) ---
+    def append_rows(self, valores, **k): return self._planilha._escrever(lambda: self._aba.append_rows(valores, **k))
+    def append_row(self, valores, **k): return self._planilha._escrever(lambda: self._aba.append_row(valores, **k))
+    def batch_update(self, dados, **k): return self._planilha._escrever(lambda: self._aba.batch_update(dados, **k))
+    def delete_rows(self, inicio, fim=None): return self._planilha._escrever(lambda: self._aba.delete_rows(inicio, fim))
+
+class PlanilhaProtegida:
+    def __init__(self, planilha, cota_leitura=60, cota_escrita=60, espera_maxima=5.0, tentativas=5, base=0.5, teto=16.0, baldes=None):
+        # baldes: os de outra planilha da mesma conta de serviço (a cota do Google é por conta, não por planilha)
+        self._planilha = planilha
+        self.baldes = baldes or {"leitura": BaldeFichas(cota_leitura), "escrita": BaldeFichas(cota_escrita)}
+        self.espera_maxima = espera_maxima
+        self.tentativas = tentativas
+        self.base, self.teto = base, teto
+        self.chamadas = 0
+        self.coalescidas = 0
+        self.recusadas = 0
+        self.desistencias = 0
+        self.espera_total = 0.0
+        self._abas = {}
+        self._geracao = None
+        self._voos = {}
+        self._trava = threading.Lock()
+        self._aleatorio = random.Random()
+
+    def __getattr__(self, nome): return getattr(self._planilha, nome)
+
+    # --- abas (metadados uma vez por processo) ---
+    def _aba_guardada(self, chave, abrir):
+        # Planilha do pool de clientes: cliente novo (token renovado) invalida as abas abertas pelo antigo
+        geracao = getattr(self._planilha, "geracao", None)
+        with self._trava:
+            if geracao != self._geracao: self._abas.clear(); self._geracao = geracao
+            aba = self._abas.get(chave)
+        if aba is None:
+            aba = AbaProtegida(self, self._ler(("metadados", chave), abrir))
+            with self._trava: aba = self._abas.setdefault(chave, aba)
+        return aba
+
+    @property
+    def sheet1(self): return self._aba_guardada("sheet1", lambda: self._planilha.sheet1)
+
+    def worksheet(self, titulo): return self._aba_guardada(titulo, lambda: self._planilha.worksheet(titulo))
+
+    def add_worksheet(self, title, **k):
+        aba = AbaProtegida(self, self._escrever(lambda: self._planilha.add_worksheet(title=title, **k)))
+        with self._trava: return self._abas.setdefault(title, aba)
+
+    def esquecer_abas(self):
+        # Abas renomeadas/apagadas direto na planilha: a próxima chamada busca os metadados de novo
+        with self._trava: self._abas.clear()
+
+    def batch_update(self, corpo): return self._escrever(lambda: self._planilha.batch_update(corpo))
+
+    # --- execução ---
+    def _ler(self, chave, f):
+        # Single-flight: quem chega com a mesma chave enquanto a chamada voa espera o mesmo resultado
+        with self._trava:
+            voo = self._voos.get(chave); lider = voo is None
+            if lider: voo = self._voos[chave] = _Voo()
+            else: self.coalescidas += 1
+        if not lider:
+            voo.pronto.wait()
+            if voo.erro is not None: raise voo.erro
+            return voo.valor
+        try: voo.valor = self._com_cota("leitura", f, erro_temporario)
+        except Exception as e: voo.erro = e; raise
+        finally:
+            with self._trava: del self._voos[chave]
+            voo.pronto.set()
+        return voo.valor
+
+    def _escrever(self, f): return self._com_cota("escrita", f, recusa_da_api)
+
+    def _com_cota(self, tipo, f, repetir):
+        balde, inicio = self.baldes[tipo], time.monotonic()
+        for n in range(self.tentativas):
+            try: self.espera_total += balde.retirar(self.espera_maxima)
+            except SemCota: self.desistencias += 1; raise
+            try:
+                self.chamadas += 1
+                return f()
+            except Exception as e:
+                if not repetir(e) or n == self.tentativas - 1: raise
+                if recusa_da_api(e): self.recusadas += 1; balde.esvaziar()
+                espera = self._aleatorio.uniform(0, min(self.teto, self.base * 2 ** n))  # "full jitter"
+                if time.monotonic() - inicio + espera > self.espera_maxima * 2: raise
+                time.sleep(espera); self.espera_total += espera
+
+    def estatisticas(self):
+        return {"chamadas": self.chamadas, "coalescidas": self.coalescidas, "recusadas": self.recusadas,
+                "desistencias": self.desistencias, "espera": round(self.espera_total, 1), "abas_abertas": len(self._abas)}
@@ -0,0 +1,56 @@
+import pandas as pd
+
+# --- ESQUEMA DAS OCORRÊNCIAS ---
+# A planilha devolve tudo como texto; o cache guarda a aba já tipada uma vez só: Data como
+# datetime, colunas repetitivas como categorias, Encaminhado como bool e o status como um
+# enum (categoria fixa). Linhas novas/alteradas passam pela mesma conversão antes de entrar.
+
+FORMATO_DATA = "%Y-%m-%d %H:%M"
+STATUS_GESTAO = pd.CategoricalDtype(["Pendente", "Arquivado"])  # vazio ou desconhecido = Pendente
+CATEGORICAS = ("Turma", "Professor", "Gravidade")
+
+def converter_datas(s, formato=FORMATO_DATA):
+    # Formato do app primeiro (vetorizado); só o que sobrar passa pelo parser genérico
+    s = s.astype(str)
+    d = pd.to_datetime(s, format=formato, errors="coerce")
+    resto = d.isna() & (s.str.strip() != "")
+    if resto.any(): d[resto] = pd.to_datetime(s[resto], errors="coerce", format="mixed")
+    return d
+
+def formatar_data(v):
+    if isinstance(v, pd.Timestamp): return v.strftime(FORMATO_DATA)
+    return "" if v is None or v is pd.NaT else str(v)
+
+def tipar_ocorrencias(df):
+    # Converte só as colunas presentes (serve para a aba inteira e para linhas avulsas)
+    out = df.copy(deep=False)
+    if "Data" in df.columns: out["Data"] = converter_datas(df["Data"])
+    for c in CATEGORICAS:
+        if c in df.columns: out[c] = df[c].astype(str).astype("category")
+    if "Status_Gestao" in df.columns:
+        s = df["Status_Gestao"].astype(str).str.strip()
+        out["Status_Gestao"] = s.where(s == "Arquivado", "Pendente").astype(STATUS_GESTAO)
+    if "Encaminhado" in df.columns: out["Encaminhado"] = df["Encaminhado"].astype(str).str.strip() == "Sim"
+    if "_seq" in df.columns: out["_seq"] = pd.to_numeric(df["_seq"], errors="coerce").fillna(0).astype("int64")
+    return out
+
+def concatenar(a, b):
+    # concat mantendo as categorias (só acrescenta as novas, sem recodificar a base)
+    a, b = a.copy(deep=False), b.copy(deep=False)
+    for c in a.columns[a.dtypes == "category"]:
+        if c not in b.columns: continue
+        if b[c].dtype != "category": b[c] = b[c].astype("category")
+        a[c] = a[c].cat.add_categories(b[c].cat.categories.difference(a[c].cat.categories))
+        b[c] = b[c].cat.set_categories(a[c].cat.categories)
+    return pd.concat([a, b])
+
+def atribuir(df, linha, valores, tipar):
+    # Atualiza uma linha de um DataFrame tipado (cópia) convertendo os valores antes
+    novos = tipar(pd.DataFrame({c: [v] for c, v in valores.items() if c in df.columns}))
+    out = df.copy()
+    for c in novos.columns:
+        v = novos[c].iloc[0]
+        if out[c].dtype == "category" and v not in out[c].cat.categories:
+            out[c] = out[c].cat.add_categories([v])
+        out.loc[linha, c] = v
+    return out
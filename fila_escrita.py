@@ -0,0 +1,116 @@
+import json
+import threading
+import time
+from contextlib import closing
+
+import banco_local
+from rastreio import propagar
+
+# --- FILA DE ESCRITA (WRITE-BEHIND) ---
+# O envio do formulário só grava no diário local; uma thread agrupa as linhas
+# pendentes de todas as sessões em chamadas append_rows. O que sobrar no diário
+# após um reinício é reenviado na partida.
+
+class FilaEscrita:
+    def __init__(self, planilha, caminho=None, intervalo=2.0, janela=0.5, lote=500, filtrar_reenvio=None, anexar=None):
+        self.planilha = planilha
+        self.caminho = caminho
+        self.intervalo = intervalo
+        self.janela = janela
+        self.lote = lote
+        # anexar(aba, linhas) no lugar do append_rows (ex: ReplicaPlanilha.anexar, que já aplica na réplica)
+        self.anexar = anexar
+        # Na partida e depois de uma falha, linhas que já chegaram à planilha (append aplicado, mas a
+        # resposta se perdeu ou o processo caiu antes de apagar o diário) são descartadas
+        self.filtrar_reenvio = filtrar_reenvio
+        self._conferir = True
+        self.falhas = 0
+        self.ultimo_erro = None
+        self.chamadas = 0
+        self._trava = threading.Lock()
+        self._acordar = threading.Event()
+        self._parar = threading.Event()
+        with closing(banco_local.abrir(self.caminho)) as con:
+            con.execute("""CREATE TABLE IF NOT EXISTS fila_escrita (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, aba TEXT NOT NULL, linha TEXT NOT NULL, criado REAL NOT NULL)""")
+        self._thread = threading.Thread(target=propagar(self._loop), name="fila-escrita", daemon=True)
+        self._thread.start()
+        self._acordar.set()  # reenvia o que ficou pendente
+
+    def enfileirar(self, aba, linhas):
+        if not linhas: return 0
+        agora = time.time()
+        with closing(banco_local.abrir(self.caminho)) as con:
+            con.execute("BEGIN IMMEDIATE")
+            con.executemany("INSERT INTO fila_escrita (aba, linha, criado) VALUES (?, ?, ?)",
+                            [(aba, json.dumps(l, ensure_ascii=False), agora) for l in linhas])
+            con.execute("COMMIT")
+        self._acordar.set()
+        return len(linhas)
+
+    def pendentes(self, aba=None):
+        with closing(banco_local.abrir(self.caminho)) as con:
+            if aba: return con.execute("SELECT COUNT(*) FROM fila_escrita WHERE aba = ?", (aba,)).fetchone()[0]
+            return con.execute("SELECT COUNT(*) FROM fila_escrita").fetchone()[0]
+
+    def linhas_pendentes(self, aba):
+        with closing(banco_local.abrir(self.caminho)) as con:
+            return [json.loads(l) for (l,) in con.execute("SELECT linha FROM fila_escrita WHERE aba = ? ORDER BY id", (aba,))]
+
+    def atualizar_pendentes(self, aba, pos_id, mudancas):
+        # Altera linhas que ainda estão no diário ({id: {posição: valor}}); devolve os IDs que já
+        # foram para a planilha. Usa a trava do envio: nenhuma linha muda de lugar no meio.
+        restantes = set(mudancas)
+        with self._trava, closing(banco_local.abrir(self.caminho)) as con:
+            con.execute("BEGIN IMMEDIATE")
+            for id_, linha in con.execute("SELECT id, linha FROM fila_escrita WHERE aba = ?", (aba,)).fetchall():
+                l = json.loads(linha)
+                if len(l) > pos_id and l[pos_id] in restantes:
+                    for pos, v in mudancas[l[pos_id]].items():
+                        l.extend([""] * (pos + 1 - len(l))); l[pos] = v
+                    con.execute("UPDATE fila_escrita SET linha = ? WHERE id = ?", (json.dumps(l, ensure_ascii=False), id_))
+                    restantes.discard(l[pos_id])
+            con.execute("COMMIT")
+        return restantes
+
+    def _aba(self, nome):
+        return self.planilha.sheet1 if nome == "sheet1" else self.planilha.worksheet(nome)
+
+    def descarregar(self):
+        # Uma chamada append_rows por aba a cada lote; só apaga do diário o que a API confirmou.
+        total = 0
+        filtrar = self.filtrar_reenvio if self._conferir or self.falhas else None
+        with self._trava, closing(banco_local.abrir(self.caminho)) as con:
+            while True:
+                regs = con.execute("SELECT id, aba, linha FROM fila_escrita ORDER BY id LIMIT ?", (self.lote,)).fetchall()
+                if not regs: break
+                por_aba = {}
+                for id_, aba, linha in regs: por_aba.setdefault(aba, []).append((id_, json.loads(linha)))
+                for aba, itens in por_aba.items():
+                    linhas = [l for _, l in itens]
+                    if filtrar: linhas = filtrar(aba, linhas)
+                    if not linhas:
+                        con.executemany("DELETE FROM fila_escrita WHERE id = ?", [(i,) for i, _ in itens]); continue
+                    if self.anexar: self.anexar(aba, linhas)
+                    else: self._aba(aba).append_rows(linhas)
+                    self.chamadas += 1
+                    con.executemany("DELETE FROM fila_escrita WHERE id = ?", [(i,) for i, _ in itens])
+                    total += len(linhas)
+            self._conferir = False
+        return total
+
+    def _loop(self):
+        espera = self.intervalo
+        while not self._parar.is_set():
+            if self.falhas: self._parar.wait(espera)  # em backoff, novos envios não antecipam a tentativa
+            elif self._acordar.wait(espera): time.sleep(self.janela)  # junta envios próximos no mesmo lote
+            self._acordar.clear()
+            try:
+                self.descarregar()
+                self.falhas = 0; espera = self.intervalo
+            except Exception as e:
+                self.falhas += 1; self.ultimo_erro = repr(e)
+                espera = min(60.0, self.intervalo * 2 ** self.falhas)
+
+    def parar(self):
+        self._parar.set(); self._acordar.set()
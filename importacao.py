@@ -0,0 +1,54 @@
+import io
+
+import pandas as pd
+
+from indice_alunos import normalizar, normalizar_turma
+
+# --- IMPORTAÇÃO EM LOTE (CSV) ---
+# Valida o arquivo inteiro localmente antes de qualquer chamada à planilha: colunas
+# obrigatórias, campos vazios, repetidos no próprio arquivo e já cadastrados. Só as linhas
+# válidas seguem, na ordem do cabeçalho da aba, para append_rows em lotes.
+
+CADASTROS = {
+    "Professores": {"colunas": ["Nome", "Codigo", "Turmas"], "obrigatorias": ["Nome", "Codigo"], "chave": ["Nome"]},
+    "Gestores": {"colunas": ["Nome", "Codigo"], "obrigatorias": ["Nome", "Codigo"], "chave": ["Nome"]},
+    "Alunos": {"colunas": ["Nome", "Turma", "Responsavel", "Telefone"], "obrigatorias": ["Nome", "Turma"], "chave": ["Nome", "Turma"]},
+}
+TAMANHO_LOTE = 500
+
+def ler_csv(dados):
+    # Separador detectado (vírgula ou ponto e vírgula, como o Excel salva) e tudo como texto
+    for codificacao in ("utf-8-sig", "latin-1"):
+        try: return pd.read_csv(io.BytesIO(dados), sep=None, engine="python", dtype=str, keep_default_na=False, encoding=codificacao)
+        except UnicodeDecodeError: continue
+
+def _chave(df, colunas):
+    partes = [df[c].map(normalizar_turma) if c == "Turma" else df[c].map(normalizar) for c in colunas]
+    return pd.Series(list(zip(*partes)), index=df.index) if partes else pd.Series(dtype=object)
+
+def validar(aba, dados, existentes, cabecalho=None):
+    # Devolve (linhas prontas para append_rows, DataFrame de erros com a linha do CSV e o motivo)
+    cfg = CADASTROS[aba]
+    df = ler_csv(dados)
+    nomes = {normalizar(c): c for c in df.columns}
+    faltando = [c for c in cfg["obrigatorias"] if normalizar(c) not in nomes]
+    if faltando: return [], pd.DataFrame([{"linha": 1, "motivo": f"Coluna obrigatória ausente: {', '.join(faltando)}"}])
+    df = df.rename(columns={nomes[normalizar(c)]: c for c in cfg["colunas"] if normalizar(c) in nomes})
+    for c in cfg["colunas"]: df[c] = df[c].str.strip() if c in df.columns else ""
+    df.index = df.index + 2  # linha no arquivo (cabeçalho = 1)
+    df = df[(df[cfg["colunas"]] != "").any(axis=1)]  # linhas em branco não contam
+
+    erros = []
+    for c in cfg["obrigatorias"]:
+        erros += [{"linha": i, "motivo": f"{c} vazio"} for i in df.index[df[c] == ""]]
+    if "Turma" in df.columns: df["Turma"] = df["Turma"].map(normalizar_turma)
+    if "Turmas" in df.columns: df["Turmas"] = df["Turmas"].map(lambda t: ",".join(normalizar_turma(x) for x in t.split(",") if x.strip()))
+    chave = _chave(df, cfg["chave"])
+    erros += [{"linha": i, "motivo": "Repetido no arquivo"} for i in df.index[chave.duplicated()]]
+    if not existentes.empty and set(cfg["chave"]) <= set(existentes.columns):
+        ja = set(_chave(existentes.astype(str), cfg["chave"]))
+        erros += [{"linha": i, "motivo": "Já cadastrado"} for i in df.index[chave.isin(ja)]]
+    erros = pd.DataFrame(erros, columns=["linha", "motivo"]).sort_values("linha", kind="stable")
+    validas = df.drop(index=erros["linha"].unique())
+    cab = cabecalho or cfg["colunas"]
+    return [[r.get(c, "") for c in cab] for r in validas.to_dict("records")], erros.reset_index(drop=True)
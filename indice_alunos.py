@@ -0,0 +1,50 @@
+import difflib
+import unicodedata
+from types import MappingProxyType
+
+# --- ÍNDICE DE ALUNOS ---
+# Construído uma vez por versão da aba Alunos (entrada derivada do cache) e nunca alterado:
+# turma normalizada -> nomes ordenados, e por turma os nomes sem acento/caixa para casar os
+# nomes falados no comando de voz sem tocar no DataFrame.
+
+def normalizar(t):
+    return " ".join(unicodedata.normalize("NFKD", str(t)).encode("ascii", "ignore").decode().upper().split())
+
+def normalizar_turma(t): return str(t).strip().upper()
+
+class IndiceAlunos:
+    def __init__(self, df):
+        grupos = {}
+        if not df.empty and {"Nome", "Turma"} <= set(df.columns):
+            for nome, turma in zip(df["Nome"].astype(str).str.strip(), df["Turma"].map(normalizar_turma)):
+                if nome: grupos.setdefault(turma, set()).add(nome)
+        self._por_turma = MappingProxyType({t: tuple(sorted(n)) for t, n in grupos.items()})
+        nomes, primeiros = {}, {}
+        for t, lista in self._por_turma.items():
+            por_nome = nomes[t] = {}; por_primeiro = {}
+            for n in lista:
+                k = normalizar(n); por_nome.setdefault(k, n)
+                por_primeiro.setdefault(k.split(" ")[0], []).append(n)
+            primeiros[t] = {p: v[0] for p, v in por_primeiro.items() if len(v) == 1}  # só primeiros nomes únicos na turma
+        self._nomes = MappingProxyType(nomes)
+        self._primeiros = MappingProxyType(primeiros)
+
+    def turmas(self): return tuple(sorted(self._por_turma))
+
+    def alunos(self, turma):
+        return self._por_turma.get(normalizar_turma(turma), ())
+
+    def resolver(self, detectados, turma, corte=0.75):
+        # Nome falado -> nome do cadastro na turma: exato sem acento/caixa, primeiro nome único, aproximado
+        t = normalizar_turma(turma)
+        por_nome, por_primeiro = self._nomes.get(t, {}), self._primeiros.get(t, {})
+        saida = []
+        for d in detectados or []:
+            k = normalizar(d)
+            if not k: continue
+            achado = por_nome.get(k) or (por_primeiro.get(k) if " " not in k else None)
+            if not achado:
+                perto = difflib.get_close_matches(k, por_nome.keys(), n=1, cutoff=corte)
+                achado = por_nome[perto[0]] if perto else None
+            if achado and achado not in saida: saida.append(achado)
+        return saida
@@ -0,0 +1,95 @@
+import os
+import threading
+import time
+from collections import namedtuple
+
+import banco_local
+
+# --- ESCOLAS (MULTI-INQUILINO) ---
+# Cada escola tem a sua planilha; um processo atende várias. Os clientes autorizados ficam num
+# pool limitado (um por credencial: escolas da mesma conta de serviço dividem o cliente): o menos
+# usado sai quando o pool enche, clientes parados há muito tempo são descartados e, antes do
+# token expirar, o cliente é autorizado de novo. A planilha de uma escola é aberta pelo cliente
+# atual do pool; se ele mudou, reabre sozinha.
+# Réplica, fila, caches, monitor e índices são separados por escola (banco SQLite próprio).
+
+Escola = namedtuple("Escola", "id nome planilha turmas credencial")
+
+ESCOLA_PADRAO = "padrao"
+PLANILHA_PADRAO = "Dados_Escolares"
+CREDENCIAL_PADRAO = "service_account_info"
+
+def ler_escolas(config=None):
+    # config: {id: {nome, planilha, turmas, credencial}} (secrets [escolas.<id>] ou JSON); vazio = só a escola padrão
+    escolas = {}
+    for id_, c in (config or {}).items():
+        c = dict(c)
+        escolas[str(id_)] = Escola(str(id_), c.get("nome", str(id_)), c.get("planilha", PLANILHA_PADRAO),
+                                   tuple(str(t).strip().upper() for t in c.get("turmas", ()) if str(t).strip()), c.get("credencial", CREDENCIAL_PADRAO))
+    return escolas or {ESCOLA_PADRAO: Escola(ESCOLA_PADRAO, "EduGestor", PLANILHA_PADRAO, (), CREDENCIAL_PADRAO)}
+
+def caminho_banco(escola):
+    # A escola padrão continua no banco de sempre (instalações com uma escola não mudam nada)
+    if escola == ESCOLA_PADRAO: return banco_local.CAMINHO_PADRAO
+    base, ext = os.path.splitext(banco_local.CAMINHO_PADRAO)
+    return f"{base}_{escola}{ext or '.db'}"
+
+class PoolClientes:
+    def __init__(self, autorizar, maximo=8, ocioso=1800, validade=3000):
+        # autorizar(chave) -> cliente gspread; validade < 3600s (vida do token do Google)
+        self.autorizar = autorizar
+        self.maximo = maximo
+        self.ocioso = ocioso
+        self.validade = validade
+        self.autorizacoes = 0
+        self.renovacoes = 0
+        self.despejos = 0
+        self._entradas = {}  # chave -> {"cliente", "criado", "usado"}
+        self._trava = threading.Lock()
+
+    def cliente(self, chave):
+        agora = time.monotonic()
+        with self._trava:
+            for k, e in list(self._entradas.items()):
+                if k != chave and agora - e["usado"] > self.ocioso: del self._entradas[k]; self.despejos += 1
+            e = self._entradas.get(chave)
+            if e and agora - e["criado"] > self.validade: del self._entradas[chave]; e = None; self.renovacoes += 1
+            if e: e["usado"] = agora; return e["cliente"]
+        # Autoriza fora da trava: uma credencial autorizando não segura as outras
+        novo = {"cliente": self.autorizar(chave), "criado": agora, "usado": agora}
+        with self._trava:
+            e = self._entradas.setdefault(chave, novo)
+            if e is novo:
+                self.autorizacoes += 1
+                while len(self._entradas) > self.maximo:
+                    k = min((k for k in self._entradas if k != chave), key=lambda k: self._entradas[k]["usado"])
+                    del self._entradas[k]; self.despejos += 1
+            return e["cliente"]
+
+    def estatisticas(self):
+        with self._trava:
+            return {"ativos": len(self._entradas), "maximo": self.maximo, "autorizacoes": self.autorizacoes,
+                    "renovacoes": self.renovacoes, "despejos": self.despejos}
+
+class PlanilhaDoPool:
+    # A planilha de uma escola vista pelo cliente atual do pool (chave = credencial da escola).
+    # `geracao` muda quando o cliente foi trocado (renovado ou despejado e autorizado de novo):
+    # quem guarda abas abertas descarta as antigas.
+    def __init__(self, pool, chave, titulo):
+        self.pool, self.chave, self.titulo = pool, chave, titulo
+        self._cliente = self._planilha = None
+        self._geracao = 0
+        self._trava = threading.Lock()
+
+    def _atual(self):
+        c = self.pool.cliente(self.chave)
+        with self._trava:
+            if c is not self._cliente:
+                self._planilha = c.open(self.titulo); self._cliente = c; self._geracao += 1
+            return self._planilha
+
+    @property
+    def geracao(self):
+        self._atual(); return self._geracao
+
+    def __getattr__(self, nome): return getattr(self._atual(), nome)
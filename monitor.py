@@ -0,0 +1,69 @@
+import threading
+import time
+from collections import namedtuple
+
+from rastreio import propagar
+
+# --- MONITOR COMPARTILHADO ---
+# Uma única thread por processo sincroniza Alertas e Ocorrências a cada intervalo e publica
+# instantâneos versionados; as sessões do painel só leem o instantâneo mais recente. Com várias
+# escolas há um monitor por escola: o de uma escola sem ninguém olhando há `ocioso` segundos
+# para de consultar a planilha e volta na primeira leitura.
+
+Instantaneo = namedtuple("Instantaneo", "versao criado seq ocorrencias alertas")
+
+class MonitorPlanilha:
+    def __init__(self, replica, ler, abas=("sheet1", "Alertas"), intervalo=15, ocioso=300):
+        self.replica = replica
+        self.ler = ler
+        self.abas = tuple(abas)
+        self.intervalo = intervalo
+        self.ocioso = ocioso
+        self.lido = time.monotonic()
+        self.versao = 0
+        self.ciclos = 0
+        self.ultimo_erro = None
+        self._fonte = None
+        self._instantaneo = None
+        self._trava = threading.Lock()
+        self._acordar = threading.Event()
+        replica.assinar(self._evento)
+        self._sincronizar()  # o primeiro instantâneo já parte da réplica sincronizada (seq correto)
+        self._publicar()
+        self._thread = threading.Thread(target=propagar(self._loop), name="monitor-planilha", daemon=True)
+        self._thread.start()
+
+    def atual(self):
+        if time.monotonic() - self.lido > self.ocioso: self._acordar.set()  # estava parado: sincroniza já
+        self.lido = time.monotonic()
+        return self._instantaneo
+
+    def _evento(self, aba, evento, dados):
+        # Escritas do próprio app entram no próximo instantâneo sem esperar o intervalo
+        if aba in self.abas: self._acordar.set()
+
+    def _sincronizar(self):
+        for aba in self.abas:
+            try: self.replica.sincronizar(aba)
+            except Exception as e: self.ultimo_erro = repr(e)
+        self.ciclos += 1
+
+    def _publicar(self):
+        with self._trava:
+            fonte = tuple(self.replica.versao(a) for a in self.abas)
+            if fonte == self._fonte and self._instantaneo is not None: return False
+            seq = self.replica.seq_atual()  # lido antes: linhas que cheguem durante a leitura ficam acima da marca
+            dados = self.ler()
+            self.versao += 1; self._fonte = fonte
+            self._instantaneo = Instantaneo(self.versao, time.time(), seq, **dados)
+            return True
+
+    def _loop(self):
+        atrasado = False
+        while True:
+            acordou = self._acordar.wait(self.intervalo)
+            self._acordar.clear()
+            if time.monotonic() - self.lido > self.ocioso: atrasado = True; continue
+            if not acordou or atrasado: self._sincronizar(); atrasado = False
+            try: self._publicar()
+            except Exception as e: self.ultimo_erro = repr(e)
@@ -0,0 +1,224 @@
+import random
+import re
+import threading
+import time
+from collections import Counter, deque
+
+from gspread.exceptions import APIError, WorksheetNotFound
+
+from replica import letra_coluna, novo_id
+
+# --- PLANILHA FALSA (TESTES E BENCHMARK) ---
+# Substitui o gspread sem rede nem credenciais: as mesmas chamadas que o app usa, com os dados
+# em memória. Cada chamada espera uma latência parecida com a da API (base + por célula, com
+# variação) e entra na cota por minuto (leituras e escritas separadas, como na API); acima da
+# cota responde 429. Abrir a planilha, sheet1 e worksheet() também contam: no gspread cada um
+# busca os metadados da planilha. EDUGESTOR_PLANILHA=falsa faz o app usar esta planilha.
+
+ABAS_PADRAO = {
+    "sheet1": ["Data", "Aluno", "Turma", "Professor", "Descricao", "Acao_Sugerida", "Intervencao", "Status_Gestao", "Encaminhado", "ID", "Gravidade"],
+    "Alertas": ["Data", "Turma", "Professor", "Status", "ID"],
+    "Professores": ["Nome", "Codigo", "Turmas"],
+    "Gestores": ["Nome", "Codigo"],
+    "Alunos": ["Nome", "Turma", "Responsavel", "Telefone"],
+}
+TITULO_SHEET1 = "Página1"
+
+class _Resposta:
+    # O mínimo que APIError lê de uma resposta HTTP
+    def __init__(self, codigo, status, mensagem): self.status_code, self.text = codigo, mensagem; self._erro = {"code": codigo, "status": status, "message": mensagem}
+    def json(self): return {"error": self._erro}
+
+def _coluna(letras):
+    col = 0
+    for ch in letras: col = col * 26 + ord(ch) - 64
+    return col
+
+def _intervalo(rng):
+    # "A2:C" -> (linha inicial, coluna inicial, linha final, coluna final); None = até o fim
+    m = re.fullmatch(r"(?:.*!)?([A-Z]+)(\d*)(?::([A-Z]+)(\d*))?", rng.replace("$", ""))
+    linha, col = int(m.group(2) or 1), _coluna(m.group(1))
+    if not m.group(3): return linha, col, linha, col  # uma célula
+    return linha, col, int(m.group(4)) if m.group(4) else None, _coluna(m.group(3))
+
+def _celula(rng): return _intervalo(rng)[:2]
+
+class AbaFalsa:
+    def __init__(self, planilha, titulo, id_, linhas=None):
+        self.planilha = planilha
+        self.title = titulo
+        self.id = id_
+        self.linhas = [list(l) for l in linhas or []]
+
+    def _celulas(self, linhas): return sum(len(l) for l in linhas)
+
+    # --- leitura ---
+    def get_all_values(self, **k):
+        self.planilha._chamar("leitura", "get_all_values", self.title, self._celulas(self.linhas))
+        with self.planilha._trava:
+            largura = max((len(l) for l in self.linhas), default=0)
+            return [l + [""] * (largura - len(l)) for l in self.linhas]
+
+    def get(self, rng, **k):
+        # Como a API: vazios no fim de cada linha e linhas vazias no fim não voltam
+        inicio, c1, fim, c2 = _intervalo(rng)
+        with self.planilha._trava: linhas = [list(l[c1 - 1:c2]) for l in self.linhas[inicio - 1:fim]]
+        self.planilha._chamar("leitura", "get", self.title, self._celulas(linhas))
+        for l in linhas:
+            while l and l[-1] == "": l.pop()
+        while linhas and not linhas[-1]: linhas.pop()
+        return linhas
+
+    # --- escrita ---
+    def append_rows(self, valores, **k):
+        novas = [["" if v is None else str(v) for v in l] for l in valores]
+        self.planilha._chamar("escrita", "append_rows", self.title, self._celulas(novas))
+        with self.planilha._trava:
+            while self.linhas and not any(self.linhas[-1]): self.linhas.pop()
+            primeira = len(self.linhas) + 1
+            self.linhas += novas
+        ultima = primeira + len(novas) - 1
+        largura = max((len(l) for l in novas), default=1)
+        return {"updates": {"updatedRange": f"'{self.title}'!A{primeira}:{letra_coluna(largura)}{ultima}", "updatedRows": len(novas)}}
+
+    def append_row(self, valores, **k): return self.append_rows([valores], **k)
+
+    def batch_update(self, dados, **k):
+        self.planilha._chamar("escrita", "batch_update", self.title, sum(self._celulas(d["values"]) for d in dados))
+        with self.planilha._trava:
+            for d in dados:
+                linha, col = _celula(d["range"])
+                for i, valores in enumerate(d["values"]):
+                    while len(self.linhas) < linha + i: self.linhas.append([])
+                    l = self.linhas[linha + i - 1]
+                    l.extend([""] * (col - 1 + len(valores) - len(l)))
+                    l[col - 1:col - 1 + len(valores)] = ["" if v is None else str(v) for v in valores]
+        return {"totalUpdatedCells": sum(self._celulas(d["values"]) for d in dados)}
+
+    def delete_rows(self, inicio, fim=None):
+        self.planilha._chamar("escrita", "delete_rows", self.title)
+        with self.planilha._trava: del self.linhas[inicio - 1:(fim or inicio)]
+
+class PlanilhaFalsa:
+    def __init__(self, titulo="Dados_Escolares", abas=None, latencia=0.15, por_celula=2e-6, escala=1.0,
+                 cota_leitura=60, cota_escrita=60, semente=None):
+        # latencia/por_celula em segundos; escala multiplica as esperas (0 = sem espera, só contagem)
+        self.title = titulo
+        self.latencia = latencia
+        self.por_celula = por_celula
+        self.escala = escala
+        self.cotas = {"leitura": cota_leitura, "escrita": cota_escrita}
+        self.chamadas = Counter()  # (tipo, método, aba) -> n
+        self.recusadas = Counter()  # tipo -> respostas 429
+        self.espera_total = 0.0
+        self._trava = threading.RLock()
+        self._janelas = {"leitura": deque(), "escrita": deque()}
+        self._aleatorio = random.Random(semente)
+        self._abas = {}
+        for nome, cab in (ABAS_PADRAO if abas is None else abas).items():
+            self._abas[nome] = AbaFalsa(self, TITULO_SHEET1 if nome == "sheet1" else nome, len(self._abas), [cab] if cab else [])
+
+    def _chamar(self, tipo, metodo, aba, celulas=0):
+        agora = time.monotonic()
+        with self._trava:
+            janela = self._janelas[tipo]
+            while janela and agora - janela[0] >= 60: janela.popleft()
+            recusada = self.cotas[tipo] is not None and len(janela) >= self.cotas[tipo]
+            if recusada: self.recusadas[tipo] += 1
+            else: janela.append(agora); self.chamadas[(tipo, metodo, aba)] += 1
+            espera = (self.latencia + (0 if recusada else celulas * self.por_celula)) * self._aleatorio.uniform(0.7, 1.6) * self.escala
+            self.espera_total += espera
+        if espera: time.sleep(espera)
+        if recusada:
+            raise APIError(_Resposta(429, "RESOURCE_EXHAUSTED", f"Quota exceeded for quota metric '{'Read' if tipo == 'leitura' else 'Write'} requests' (falsa)"))
+
+    # --- como gspread.Spreadsheet ---
+    @property
+    def sheet1(self):
+        self._chamar("leitura", "metadados", TITULO_SHEET1)
+        return self._abas["sheet1"]
+
+    def worksheet(self, titulo):
+        self._chamar("leitura", "metadados", titulo)
+        with self._trava:
+            for nome, aba in self._abas.items():
+                if titulo in (nome, aba.title): return aba
+        raise WorksheetNotFound(titulo)
+
+    def worksheets(self):
+        self._chamar("leitura", "metadados", "*")
+        with self._trava: return list(self._abas.values())
+
+    def add_worksheet(self, title, rows=1000, cols=26, **k):
+        self._chamar("escrita", "add_worksheet", title)
+        with self._trava:
+            if any(title in (n, a.title) for n, a in self._abas.items()):
+                raise APIError(_Resposta(400, "INVALID_ARGUMENT", f'A sheet with the name "{title}" already exists.'))
+            aba = self._abas[title] = AbaFalsa(self, title, len(self._abas))
+        return aba
+
+    def batch_update(self, corpo):
+        # Só os pedidos que o app usa: deleteDimension de linhas
+        self._chamar("escrita", "batch_update", "*")
+        with self._trava:
+            por_id = {a.id: a for a in self._abas.values()}
+            for p in corpo["requests"]:
+                r = p["deleteDimension"]["range"]
+                del por_id[r["sheetId"]].linhas[r["startIndex"]:r["endIndex"]]
+        return {"replies": [{} for _ in corpo["requests"]]}
+
+    # --- para o benchmark ---
+    def aba(self, nome): return self._abas[nome]  # sem latência nem cota
+
+    def estatisticas(self):
+        with self._trava:
+            por_tipo = Counter()
+            for (tipo, _, _), n in self.chamadas.items(): por_tipo[tipo] += n
+            return {"leituras": por_tipo["leitura"], "escritas": por_tipo["escrita"], "recusadas": sum(self.recusadas.values()),
+                    "espera": round(self.espera_total, 3), "por_metodo": {f"{t}:{m}:{a}": n for (t, m, a), n in sorted(self.chamadas.items())}}
+
+# --- DADOS SINTÉTICOS ---
+TURMAS = ["6A", "6B", "7A", "7B", "8A", "8B", "9A", "9B"]
+NOMES = ["Ana", "Bruno", "Carla", "Diego", "Eduarda", "Felipe", "Gabriela", "Heitor", "Isabela", "João", "Larissa", "Miguel",
+         "Natália", "Otávio", "Paula", "Rafael", "Sofia", "Thiago", "Valentina", "Vinícius"]
+SOBRENOMES = ["Silva", "Souza", "Oliveira", "Santos", "Lima", "Pereira", "Costa", "Rodrigues", "Almeida", "Ferreira"]
+DESCRICOES = ["Conversa durante a explicação", "Uso de celular em sala", "Chegou atrasado", "Brigou com o colega no intervalo",
+              "Sem uniforme", "Desrespeitou o professor", "Não fez a atividade", "Ameaçou um colega", "Dormiu em sala", "Saiu sem autorização"]
+
+def semear(planilha, linhas=0, turmas=TURMAS, alunos_por_turma=30, professores=12, dias=365, semente=0, agora=None):
+    # Cadastros + `linhas` ocorrências espalhadas nos últimos `dias` (a maioria já arquivada).
+    # Escreve direto nas abas: não gasta latência nem cota.
+    rnd = random.Random(semente)
+    agora = agora or time.time()
+    nomes_prof = [f"Prof {i + 1}" for i in range(professores)]
+    planilha.aba("Professores").linhas[1:] = [[p, str(1000 + i), ",".join(rnd.sample(turmas, min(3, len(turmas))))] for i, p in enumerate(nomes_prof)]
+    planilha.aba("Gestores").linhas[1:] = [["Gestor", "999"]]
+    alunos = [(f"{rnd.choice(NOMES)} {rnd.choice(SOBRENOMES)} {n + 1}", t) for t in turmas for n in range(alunos_por_turma)]
+    planilha.aba("Alunos").linhas[1:] = [[a, t, f"Resp. {a}", f"119{rnd.randrange(10**7, 10**8)}"] for a, t in alunos]
+    oc = []
+    for d in sorted(agora - rnd.random() * dias * 86400 for _ in range(linhas)):
+        aluno, turma = rnd.choice(alunos)
+        grav = rnd.choices(["Baixa", "Média", "Alta"], [5, 4, 1])[0]
+        status = "Pendente" if agora - d < 3 * 86400 and rnd.random() < 0.5 else "Arquivado"
+        oc.append([time.strftime("%Y-%m-%d %H:%M", time.localtime(d)), aluno, turma, rnd.choice(nomes_prof), rnd.choice(DESCRICOES),
+                   f"Acolher o aluno e registrar ({grav}).", "Conversa com o aluno" if status == "Arquivado" else "",
+                   status, "Sim" if rnd.random() < 0.1 else "Não", novo_id(), grav])
+    planilha.aba("sheet1").linhas[1:] = oc
+    return planilha
+
+_abertas = {}
+_trava_abertas = threading.Lock()
+
+def abrir(titulo="Dados_Escolares", linhas=0, **opcoes):
+    # Uma planilha por título e processo (como a planilha real é uma só para todas as sessões)
+    with _trava_abertas:
+        if titulo not in _abertas: _abertas[titulo] = semear(PlanilhaFalsa(titulo, **opcoes), linhas)
+        p = _abertas[titulo]
+    p._chamar("leitura", "metadados", "*")  # client.open
+    return p
+
+class ClienteFalso:
+    # O que o app usa do gspread.Client: open(titulo) (uma planilha falsa por escola)
+    def __init__(self, linhas=0, **opcoes): self.linhas, self.opcoes = linhas, opcoes
+
+    def open(self, titulo): return abrir(titulo, linhas=self.linhas, **self.opcoes)
@@ -0,0 +1,236 @@
+import functools
+import json
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+
+import pandas as pd
+
+# --- RASTREIO (DIAGNÓSTICO) ---
+# Spans por execução da página: nome, duração, chamadas remotas (planilha/IA), linhas
+# transferidas e acerto/falta de cache. A pilha de spans é por thread: a execução do Streamlit
+# abre uma raiz e tudo que roda dentro dela soma na raiz (um st.rerun interrompe a execução
+# sem fechar a raiz; a próxima execução da mesma thread fecha a anterior como interrompida);
+# threads de fundo (fila, monitor, classificador, relatórios) gravam spans soltos. Cada nome guarda as últimas N durações (histograma
+# móvel); opcionalmente cada span de topo vira uma linha num arquivo JSONL. Exceções engolidas
+# pelo app são contadas por local e tipo em vez de sumirem. Cada escola tem o seu rastreador: a
+# thread marca a escola em que trabalha (escopo) e as threads de fundo herdam a de quem as criou.
+
+RAIZ = "execucao"
+RESTO = "execucao.render"  # tempo da raiz fora dos spans filhos (widgets, pandas na página)
+
+class Rastreador:
+    def __init__(self, janela=500, arquivo=None, execucoes=50, escola=None):
+        self.janela = janela
+        self.arquivo = arquivo
+        self.escola = escola
+        self._local = threading.local()
+        self._trava = threading.Lock()
+        self._historico = {}  # nome -> deque de (duracao, chamadas, linhas, cache, erro)
+        self._execucoes = deque(maxlen=execucoes)
+        self.remotas = Counter()  # tipo -> chamadas (todas as threads)
+        self.engolidas = Counter()  # (onde, tipo da exceção) -> n
+        self.ultima_engolida = {}  # onde -> repr da última
+
+    def _pilha(self):
+        if not hasattr(self._local, "pilha"): self._local.pilha = []
+        return self._local.pilha
+
+    # --- spans ---
+    def abrir(self, nome, **campos):
+        s = {"nome": nome, "inicio": time.time(), "t0": time.perf_counter(), "chamadas": 0, "linhas": 0, "cache": None, "erros": 0, "filhos": [], **campos}
+        self._pilha().append(s)
+        return s
+
+    def fechar(self, s, erro=None):
+        pilha = self._pilha()
+        while pilha and pilha[-1] is not s: self.fechar(pilha[-1])  # filhos interrompidos (st.rerun) fecham junto
+        if pilha: pilha.pop()
+        s["duracao"] = time.perf_counter() - s.pop("t0")
+        if erro is not None: s["erros"] += 1
+        pai = pilha[-1] if pilha else None
+        if pai is not None:
+            pai["chamadas"] += s["chamadas"]; pai["linhas"] += s["linhas"]; pai["erros"] += s["erros"]
+            pai["filhos"].append({k: s[k] for k in ("nome", "duracao", "chamadas", "linhas", "cache", "erros")})
+        with self._trava:
+            self._guardar(s["nome"], s)
+            if s["nome"] == RAIZ:
+                proprio = s["duracao"] - sum(f["duracao"] for f in s["filhos"])
+                self._guardar(RESTO, {"duracao": proprio, "chamadas": 0, "linhas": 0, "cache": None, "erros": 0})
+                self._execucoes.append(s)
+        if pai is None and self.arquivo: self._exportar(s)
+        return s
+
+    def _guardar(self, nome, s):
+        h = self._historico.setdefault(nome, deque(maxlen=self.janela))
+        h.append((s["duracao"], s["chamadas"], s["linhas"], s["cache"], s["erros"]))
+
+    def _exportar(self, s):
+        linha = json.dumps({k: v for k, v in s.items() if k != "filhos" or v} | ({"escola": self.escola} if self.escola else {}), ensure_ascii=False, default=str)
+        try:
+            with _trava_arquivo, open(self.arquivo, "a", encoding="utf-8") as f: f.write(linha + "\n")
+        except OSError as e: self.engolida("rastreio.exportar", e)
+
+    @contextmanager
+    def span(self, nome, **campos):
+        s = self.abrir(nome, **campos)
+        try: yield s
+        except BaseException as e:
+            self.fechar(s, e if isinstance(e, Exception) else None); raise
+        else: self.fechar(s)
+
+    def iniciar_execucao(self, rotulo=""):
+        # Raiz da execução da página; o que sobrou aberto de uma execução interrompida fecha antes
+        pilha = self._pilha()
+        if pilha: pilha[0]["interrompida"] = True; self.fechar(pilha[0])
+        return self.abrir(RAIZ, rotulo=rotulo)
+
+    def encerrar_execucao(self):
+        pilha = self._pilha()
+        if pilha: self.fechar(pilha[0])
+
+    # --- anotações no span atual ---
+    def remota(self, tipo, linhas=0):
+        with self._trava: self.remotas[tipo] += 1
+        pilha = self._pilha()
+        if pilha: pilha[-1]["chamadas"] += 1; pilha[-1]["linhas"] += linhas
+
+    def anotar(self, **campos):
+        pilha = self._pilha()
+        if pilha: pilha[-1].update(campos)
+
+    def engolida(self, onde, e):
+        with self._trava:
+            self.engolidas[(onde, type(e).__name__)] += 1
+            self.ultima_engolida[onde] = repr(e)[:300]
+        pilha = self._pilha()
+        if pilha: pilha[-1]["erros"] += 1
+
+    # --- leitura (painel) ---
+    def resumo(self):
+        with self._trava: hist = {n: list(h) for n, h in self._historico.items()}
+        linhas = []
+        for nome, h in sorted(hist.items()):
+            d = pd.DataFrame(h, columns=["duracao", "chamadas", "linhas", "cache", "erros"])
+            ms = d["duracao"] * 1000
+            linhas.append({"span": nome, "n": len(d), "p50_ms": ms.quantile(0.5), "p95_ms": ms.quantile(0.95), "max_ms": ms.max(),
+                           "chamadas_media": d["chamadas"].mean(), "linhas_media": d["linhas"].mean(),
+                           "acertos": int((d["cache"] == "acerto").sum()), "faltas": int((d["cache"] == "falta").sum()), "erros": int(d["erros"].sum())})
+        return pd.DataFrame(linhas)
+
+    def duracoes(self, nome):
+        with self._trava: return [h[0] * 1000 for h in self._historico.get(nome, ())]
+
+    def execucoes(self, n=20):
+        with self._trava: ex = list(self._execucoes)[-n:]
+        return pd.DataFrame([{"quando": time.strftime("%H:%M:%S", time.localtime(e["inicio"])), "pagina": e.get("rotulo", ""),
+                              "ms": e["duracao"] * 1000, "chamadas": e["chamadas"], "linhas": e["linhas"], "erros": e["erros"], "interrompida": e.get("interrompida", False),
+                              "mais_lentos": ", ".join(f"{f['nome']} {f['duracao'] * 1000:.0f}ms" for f in sorted(e["filhos"], key=lambda f: -f["duracao"])[:3])}
+                             for e in reversed(ex)])
+
+    def excecoes(self):
+        with self._trava:
+            return pd.DataFrame([{"onde": o, "tipo": t, "n": n, "ultima": self.ultima_engolida.get(o, "")}
+                                 for (o, t), n in self.engolidas.most_common()])
+
+# Um rastreador por escola, mais um do processo para o que roda fora de qualquer escola; as
+# funções abaixo usam o da escola da thread atual
+RASTREADOR = Rastreador()
+_POR_ESCOLA = {}
+_trava_escolas = threading.Lock()
+_trava_arquivo = threading.Lock()  # o arquivo JSONL é um só para todos
+_local = threading.local()
+
+def rastreador(escola=None):
+    if escola is None: return RASTREADOR
+    r = _POR_ESCOLA.get(escola)
+    if r is None:
+        with _trava_escolas: r = _POR_ESCOLA.setdefault(escola, Rastreador(escola=escola))
+    return r
+
+def escola_atual(): return getattr(_local, "escola", None)
+def atual(): return rastreador(escola_atual())
+def definir_escola(escola): _local.escola = escola
+
+@contextmanager
+def escopo(escola):
+    anterior = escola_atual(); definir_escola(escola)
+    try: yield
+    finally: definir_escola(anterior)
+
+def propagar(f):
+    # Para threads de fundo: f roda com a escola de quem a criou
+    escola = escola_atual()
+    @functools.wraps(f)
+    def envolvida(*a, **k):
+        with escopo(escola): return f(*a, **k)
+    return envolvida
+
+def span(nome, **campos): return atual().span(nome, **campos)
+def remota(tipo, linhas=0): atual().remota(tipo, linhas)
+def anotar(**campos): atual().anotar(**campos)
+def engolida(onde, e): atual().engolida(onde, e)
+def iniciar_execucao(rotulo=""): return atual().iniciar_execucao(rotulo)
+def encerrar_execucao(): atual().encerrar_execucao()
+
+def rastreado(nome=None):
+    # Decorador: a chamada inteira vira um span (nome padrão = nome da função)
+    def decorar(f):
+        @functools.wraps(f)
+        def envolvida(*a, **k):
+            with span(nome or f.__name__): return f(*a, **k)
+        return envolvida
+    return decorar
+
+# --- CLIENTES REMOTOS RASTREADOS ---
+def _linhas(v):
+    return len(v) if isinstance(v, list) else 0
+
+class AbaRastreada:
+    # Cada método da aba que vai à API vira um span "planilha.<método>" com as linhas trafegadas
+    LEITURAS = ("get_all_values", "get_all_records", "get")
+    ESCRITAS = {"append_rows": lambda a, k: _linhas(a[0]), "append_row": lambda a, k: 1,
+                "batch_update": lambda a, k: _linhas(a[0]), "delete_rows": lambda a, k: 1}
+
+    def __init__(self, aba): self._aba = aba
+
+    def __getattr__(self, nome):
+        alvo = getattr(self._aba, nome)
+        if nome not in self.LEITURAS and nome not in self.ESCRITAS: return alvo
+        def chamar(*a, **k):
+            with span(f"planilha.{nome}", aba=self._aba.title):
+                r = alvo(*a, **k)
+                remota("planilha", _linhas(r) if nome in self.LEITURAS else self.ESCRITAS[nome](a, k))
+                return r
+        return chamar
+
+class PlanilhaRastreada:
+    # Mesma interface da gspread.Spreadsheet; abas devolvidas já vêm rastreadas
+    def __init__(self, planilha): self._planilha = planilha
+
+    def __getattr__(self, nome): return getattr(self._planilha, nome)
+
+    def _metadados(self, f, *a, **k):
+        with span("planilha.metadados"):
+            r = f(*a, **k); remota("planilha"); return r
+
+    @property
+    def sheet1(self): return AbaRastreada(self._metadados(lambda: self._planilha.sheet1))
+
+    def worksheet(self, titulo): return AbaRastreada(self._metadados(self._planilha.worksheet, titulo))
+
+    def add_worksheet(self, *a, **k): return AbaRastreada(self._metadados(self._planilha.add_worksheet, *a, **k))
+
+    def batch_update(self, corpo):
+        with span("planilha.batch_update"):
+            r = self._planilha.batch_update(corpo); remota("planilha", len(corpo.get("requests", ()))); return r
+
+class ClienteIARastreado:
+    def __init__(self, cliente): self._cliente = cliente
+
+    def __getattr__(self, nome): return getattr(self._cliente, nome)
+
+    def gerar(self, conteudo):
+        with span("ia.gerar"):
+            r = self._cliente.gerar(conteudo); remota("ia"); return r
@@ -0,0 +1,240 @@
+import hashlib
+import io
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import closing
+from multiprocessing import spawn
+
+from fpdf import FPDF
+from pypdf import PdfReader, PdfWriter
+
+import banco_local
+from esquema import FORMATO_DATA, formatar_data
+from rastreio import engolida, propagar, span
+
+# --- PDF ---
+class PDF(FPDF):
+    def header(self):
+        self.set_font('Arial', 'B', 16); self.cell(0, 10, 'RELATÓRIO ESCOLAR - CONVIVA', 0, 1, 'C'); self.ln(5); self.line(10, 25, 200, 25); self.ln(10)
+    def footer(self):
+        self.set_y(-15); self.set_font('Arial', 'I', 8); self.cell(0, 10, f'Página {self.page_no()}', 0, 0, 'C')
+
+def limpa(t): return str(t).encode('latin-1', 'replace').decode('latin-1')
+
+def imprimir_bloco(pdf, dados):
+    if pdf.get_y() > 230: pdf.add_page()
+    pdf.set_fill_color(245, 245, 245); pdf.set_font("Arial", 'B', 11)
+    pdf.cell(0, 8, limpa(f"DATA: {formatar_data(dados['Data'])} | PROF: {dados['Professor']}"), 0, 1, 'L', True)
+    pdf.set_font("Arial", '', 10); pdf.multi_cell(0, 6, limpa(f"FATO: {dados['Descricao']}"))
+    pdf.set_font("Arial", 'I', 10); pdf.multi_cell(0, 6, limpa(f"INTERVENÇÃO: {dados.get('Intervencao', 'S/ Registro')}"))
+    pdf.ln(2); pdf.line(10, pdf.get_y(), 200, pdf.get_y()); pdf.ln(5)
+
+def imprimir_assinaturas(pdf):
+    if pdf.get_y() > 240: pdf.add_page()
+    pdf.ln(10); y = pdf.get_y(); pdf.set_font("Arial", '', 9)
+    pdf.line(20, y, 80, y); pdf.text(35, y+5, "Aluno")
+    pdf.line(120, y, 180, y); pdf.text(135, y+5, "Responsável")
+    pdf.ln(20); pdf.line(70, pdf.get_y(), 140, pdf.get_y()); pdf.text(90, pdf.get_y()+5, "Gestão")
+
+def gerar_pdf_continuo(df_dados, titulo=""):
+    pdf = PDF(); pdf.add_page();
+    pdf.set_font("Arial", 'B', 12); pdf.cell(0, 10, limpa(titulo), 0, 1); pdf.ln(5)
+    for _, row in df_dados.iterrows(): imprimir_bloco(pdf, row.to_dict())
+    imprimir_assinaturas(pdf)
+    return pdf.output(dest='S').encode('latin-1')
+
+# --- SEÇÕES POR ALUNO ---
+# Cada aluno vira um PDF próprio (sem numeração de páginas) renderizado num processo do pool e
+# guardado em cache pelo hash das suas ocorrências: só alunos novos ou alterados são renderizados
+# de novo. Os documentos finais (aluno no ZIP, turma, escola) juntam as seções com o pypdf e
+# carimbam a numeração das páginas em sequência.
+
+VERSAO_LAYOUT = "secao-v2"
+CAMPOS = ("Data", "Professor", "Descricao", "Intervencao")
+
+class SecaoPDF(PDF):
+    def footer(self): pass  # a numeração entra ao juntar (contínua no documento inteiro)
+
+class Numeracao(FPDF):
+    footer = PDF.footer  # páginas em branco só com o rodapé, carimbadas sobre as seções
+
+def chave_secao(turma, aluno, linhas):
+    h = hashlib.sha256(f"{VERSAO_LAYOUT}\x1f{turma}\x1f{aluno}".encode("utf-8"))
+    for l in linhas: h.update(("\x1e" + "\x1f".join(str(l.get(c, "")) for c in CAMPOS)).encode("utf-8"))
+    return h.hexdigest()
+
+def renderizar_secao(turma, aluno, linhas):
+    pdf = SecaoPDF()
+    pdf.add_page(); pdf.set_font("Arial", 'B', 14); pdf.cell(0, 10, limpa(f"ALUNO: {aluno} - {turma}"), 0, 1, 'L'); pdf.line(10, pdf.get_y(), 200, pdf.get_y()); pdf.ln(5)
+    for dados in linhas: imprimir_bloco(pdf, dados)
+    imprimir_assinaturas(pdf)
+    return pdf.output(dest='S').encode('latin-1')
+
+def juntar(secoes):
+    # [bytes do PDF de cada seção] -> um documento com as páginas numeradas de 1 a N
+    doc = PdfWriter()
+    for s in secoes: doc.append(PdfReader(io.BytesIO(s)))
+    if not doc.pages: return FPDF().output(dest='S').encode('latin-1')
+    numeros = Numeracao()
+    for _ in doc.pages: numeros.add_page()
+    for pagina, carimbo in zip(doc.pages, PdfReader(io.BytesIO(numeros.output(dest='S').encode('latin-1'))).pages): pagina.merge_page(carimbo)
+    saida = io.BytesIO(); doc.write(saida)
+    return saida.getvalue()
+
+def agrupar(df):
+    # Um único groupby para o documento inteiro; linhas já como dicts prontos para o worker
+    d = df[[c for c in CAMPOS if c in df.columns] + ["Turma", "Aluno"]].copy()
+    if "Data" in d.columns and d["Data"].dtype.kind == "M": d["Data"] = d["Data"].dt.strftime(FORMATO_DATA).fillna("")
+    colunas = [c for c in CAMPOS if c in d.columns]
+    return [(str(t), str(a), g[colunas].astype(str).to_dict("records")) for (t, a), g in d.groupby(["Turma", "Aluno"], sort=True, observed=True)]
+
+# --- MOTOR ---
+class Trabalho:
+    def __init__(self, id_, total, caminho):
+        self.id, self.total, self.caminho = id_, total, caminho
+        self.feitos = 0
+        self.renderizados = 0
+        self.pronto = False
+        self.erro = None
+        self.criado = time.time()
+
+_spawn = multiprocessing.get_context("spawn")
+_trava_partida = threading.Lock()
+
+class ProcessoRelatorio(_spawn.Process):
+    # Sob o Streamlit, __main__ é o app.py e o spawn o reexecutaria inteiro em cada processo novo do
+    # pool. Só enquanto um processo do pool nasce, a preparação enviada a ele deixa o __main__ de fora
+    # (o worker só precisa deste módulo, que o pickle das tarefas importa); qualquer outro processo
+    # criado nesse instante recebe a preparação de sempre.
+    def start(self):
+        with _trava_partida:
+            original = spawn.get_preparation_data
+            def preparacao(nome):
+                dados = original(nome)
+                if nome == self.name: dados.pop("init_main_from_path", None); dados.pop("init_main_from_name", None)
+                return dados
+            spawn.get_preparation_data = preparacao
+            try: super().start()
+            finally: spawn.get_preparation_data = original
+
+class ContextoRelatorios(type(_spawn)):
+    Process = ProcessoRelatorio
+
+# Um pool de processos por servidor, dividido pelos motores das escolas (cada um com seu banco)
+_pool = None
+_trava_pool = threading.Lock()
+
+def _executor(processos):
+    # spawn: o processo do Streamlit tem várias threads, fork não é seguro aqui
+    global _pool
+    with _trava_pool:
+        if _pool is None: _pool = ProcessPoolExecutor(processos, mp_context=ContextoRelatorios())
+        return _pool
+
+def _descartar_pool():
+    global _pool
+    with _trava_pool: _pool = None
+
+class MotorRelatorios:
+    def __init__(self, caminho=None, processos=None, pasta=None):
+        self.caminho = caminho
+        self.pasta = pasta or os.path.join(tempfile.gettempdir(), "edugestor_relatorios")
+        os.makedirs(self.pasta, exist_ok=True)
+        self.processos = processos or min(4, os.cpu_count() or 1)
+        self._trabalhos = {}
+        self._trava = threading.Lock()
+        self.acertos_cache = 0
+        self.renderizados = 0
+        with closing(banco_local.abrir(self.caminho)) as con:
+            con.execute("""CREATE TABLE IF NOT EXISTS cache_secoes (
+                chave TEXT PRIMARY KEY, pdf BLOB NOT NULL, criado REAL NOT NULL)""")
+            con.execute("DELETE FROM cache_secoes WHERE criado < ?", (time.time() - 90 * 86400,))
+
+    def trabalho(self, id_):
+        return self._trabalhos.get(id_)
+
+    def solicitar(self, df, formato="pdf", nome="relatorio"):
+        # Roda fora da thread da requisição; a página acompanha pelo id devolvido
+        self._limpar_antigos()
+        grupos = agrupar(df)
+        id_ = f"{int(time.time() * 1000)}_{os.getpid()}_{len(self._trabalhos)}"
+        t = Trabalho(id_, len(grupos), os.path.join(self.pasta, f"{nome}_{id_}.{formato}"))
+        with self._trava: self._trabalhos[id_] = t
+        threading.Thread(target=propagar(self._executar), args=(t, grupos, formato), daemon=True, name="relatorio").start()
+        return id_
+
+    def gerar(self, df):
+        # Versão síncrona (mesmo cache e mesmo pool) para quem precisa dos bytes na hora
+        secoes = {}
+        self._resolver(agrupar(df), secoes.__setitem__)
+        return self._juntar([secoes[i] for i in sorted(secoes)])
+
+    def _juntar(self, secoes):
+        # O documento único também é montado num processo do pool (não prende a thread do servidor)
+        try: futuro = _executor(self.processos).submit(juntar, secoes)
+        except Exception as e:
+            engolida("relatorios.pool", e); return juntar(secoes)
+        return futuro.result()
+
+    def _resolver(self, grupos, ao_pronto, trabalho=None):
+        chaves = [chave_secao(*g) for g in grupos]
+        with closing(banco_local.abrir(self.caminho)) as con:
+            achados = {}
+            for i in range(0, len(chaves), 500):
+                lote = chaves[i:i + 500]
+                achados.update(con.execute(f"SELECT chave, pdf FROM cache_secoes WHERE chave IN ({','.join('?' * len(lote))})", lote).fetchall())
+            con.executemany("UPDATE cache_secoes SET criado = ? WHERE chave = ?", [(time.time(), c) for c in achados])
+        faltam = []
+        for i, (g, ch) in enumerate(zip(grupos, chaves)):
+            if ch in achados:
+                self.acertos_cache += 1; ao_pronto(i, bytes(achados[ch]))
+                if trabalho: trabalho.feitos += 1
+            else: faltam.append(i)
+        if not faltam: return
+        try:
+            ex = _executor(self.processos)
+            futuros = {ex.submit(renderizar_secao, *grupos[i]): i for i in faltam}
+            prontos = ((futuros[f], f.result()) for f in as_completed(futuros))
+        except Exception as e:
+            # Sem processos disponíveis (ambiente restrito): renderiza aqui mesmo
+            engolida("relatorios.pool", e)
+            prontos = ((i, renderizar_secao(*grupos[i])) for i in faltam)
+        for i, pdf in prontos:
+            with closing(banco_local.abrir(self.caminho)) as con:
+                con.execute("INSERT OR REPLACE INTO cache_secoes VALUES (?, ?, ?)", (chaves[i], pdf, time.time()))
+            self.renderizados += 1; ao_pronto(i, pdf)
+            if trabalho: trabalho.feitos += 1; trabalho.renderizados += 1
+
+    def _executar(self, t, grupos, formato):
+        with span(f"relatorio.{formato}", alunos=len(grupos)): self._gerar(t, grupos, formato)
+
+    def _gerar(self, t, grupos, formato):
+        try:
+            temporario = t.caminho + ".parcial"
+            if formato == "zip":
+                # Cada aluno entra no ZIP assim que fica pronto (nada acumula em memória)
+                with zipfile.ZipFile(temporario, "w", zipfile.ZIP_DEFLATED) as z:
+                    self._resolver(grupos, lambda i, pdf: z.writestr(f"{grupos[i][0]}/{grupos[i][1]}.pdf", juntar([pdf])), t)
+            else:
+                secoes = [None] * len(grupos)
+                self._resolver(grupos, secoes.__setitem__, t)
+                with open(temporario, "wb") as f: f.write(self._juntar(secoes))
+            os.replace(temporario, t.caminho)
+            t.pronto = True
+        except Exception as e:
+            if isinstance(e, BrokenProcessPool): _descartar_pool()
+            t.erro = str(e)
+
+    def _limpar_antigos(self, idade=3600):
+        with self._trava:
+            for id_, t in list(self._trabalhos.items()):
+                if time.time() - t.criado > idade and (t.pronto or t.erro):
+                    try: os.remove(t.caminho)
+                    except OSError: pass
+                    del self._trabalhos[id_]
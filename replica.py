@@ -0,0 +1,379 @@
+import json
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import closing
+
+import pandas as pd
+
+import banco_local
+from rastreio import engolida
+
+# --- RÉPLICA LOCAL DA PLANILHA ---
+# Cada aba vira uma tabela SQLite "r_<aba>" com a linha da planilha em _linha (cabeçalho = 1).
+# A sincronização normal só busca as linhas depois da última conhecida; a completa
+# (periódica) corrige edições feitas direto na planilha e exclusões de outros processos.
+# Toda linha nova recebe um _seq crescente (contador global da réplica), preservado nas
+# recargas completas; é a marca d'água usada pelas notificações.
+
+COLUNA_ID = "ID"
+
+def novo_id(): return uuid.uuid4().hex[:12]
+
+def letra_coluna(n):
+    s = ""
+    while n: n, r = divmod(n - 1, 26); s = chr(65 + r) + s
+    return s
+
+def _primeira_linha(resp):
+    # append_row(s) devolve o intervalo gravado, ex: "'Página1'!A12:I13"
+    try:
+        m = re.search(r"![A-Z]+(\d+)", resp["updates"]["updatedRange"])
+        return int(m.group(1))
+    except Exception as e: engolida("replica.primeira_linha", e); return None
+
+class ReplicaPlanilha:
+    def __init__(self, planilha, caminho=None, intervalo_completo=600, abas_com_id=()):
+        self.planilha = planilha
+        self.abas_com_id = tuple(abas_com_id)
+        self.caminho = caminho
+        self.intervalo_completo = intervalo_completo
+        self.versoes = {}
+        self.ouvintes = []
+        self.chamadas = 0
+        self.atrasos = {}  # aba -> {"desde", "erro"} enquanto a sincronização falhar (dado servido é o último bom)
+        self._travas = {}
+        self._trava_geral = threading.Lock()
+        with closing(self._abrir()) as con:
+            con.execute("""CREATE TABLE IF NOT EXISTS replica_meta (
+                aba TEXT PRIMARY KEY, cabecalho TEXT NOT NULL, ultima INTEGER NOT NULL,
+                completo REAL NOT NULL, incremental REAL NOT NULL)""")
+            con.execute("CREATE TABLE IF NOT EXISTS replica_seq (id INTEGER PRIMARY KEY CHECK (id = 1), valor INTEGER NOT NULL)")
+            con.execute("INSERT OR IGNORE INTO replica_seq VALUES (1, 0)")
+
+    def _abrir(self): return banco_local.abrir(self.caminho)
+
+    def _trava(self, aba):
+        with self._trava_geral: return self._travas.setdefault(aba, threading.RLock())
+
+    def _aba(self, nome):
+        return self.planilha.sheet1 if nome == "sheet1" else self.planilha.worksheet(nome)
+
+    @staticmethod
+    def _tabela(aba): return f'"r_{aba}"'
+
+    def _meta(self, con, aba):
+        r = con.execute("SELECT cabecalho, ultima, completo, incremental FROM replica_meta WHERE aba = ?", (aba,)).fetchone()
+        return None if r is None else {"cabecalho": json.loads(r[0]), "ultima": r[1], "completo": r[2], "incremental": r[3]}
+
+    # Eventos: "recarga" (aba inteira mudou), "insercao" (primeira, linhas, seqs), "atualizacao" (linha, valores)
+    def assinar(self, ouvinte): self.ouvintes.append(ouvinte)
+
+    def _tocar(self, aba, evento="recarga", **dados):
+        self.versoes[aba] = self.versoes.get(aba, 0) + 1
+        for ouvinte in list(self.ouvintes):
+            try: ouvinte(aba, evento, dados)
+            except Exception as e: engolida("replica.ouvinte", e)
+
+    def versao(self, aba): return self.versoes.get(aba, 0)
+
+    def seq_atual(self):
+        with closing(self._abrir()) as con:
+            return con.execute("SELECT valor FROM replica_seq").fetchone()[0]
+
+    @staticmethod
+    def _reservar(con, n):
+        inicio = con.execute("SELECT valor FROM replica_seq").fetchone()[0] + 1
+        con.execute("UPDATE replica_seq SET valor = valor + ?", (n,))
+        return inicio
+
+    def cabecalho(self, aba):
+        with closing(self._abrir()) as con:
+            m = self._meta(con, aba)
+        return m["cabecalho"] if m else []
+
+    # --- SINCRONIZAÇÃO ---
+    def sincronizar(self, aba, idade_maxima=0, completo=False):
+        with self._trava(aba), closing(self._abrir()) as con:
+            m = self._meta(con, aba); agora = time.time()
+            if m and not completo and agora - m["incremental"] < idade_maxima: return False
+            try:
+                if completo or m is None or agora - m["completo"] > self.intervalo_completo:
+                    mudou = self._sincronizar_completo(con, aba)
+                else: mudou = self._sincronizar_incremental(con, aba, m)
+            except Exception as e:
+                if con.in_transaction: con.execute("ROLLBACK")
+                self.atrasos.setdefault(aba, {"desde": agora})["erro"] = repr(e)
+                raise
+            self.atrasos.pop(aba, None)
+            if mudou and aba in self.abas_com_id: self.garantir_ids(aba)  # linhas digitadas direto na planilha
+            return mudou
+
+    def atraso(self, *abas):
+        # Última sincronização boa das abas que estão falhando (None = tudo em dia)
+        falhas = [a for a in abas if a in self.atrasos]
+        if not falhas: return None
+        with closing(self._abrir()) as con:
+            ok = [m["incremental"] for m in (self._meta(con, a) for a in falhas) if m]
+        return {"abas": falhas, "ultima_sincronizacao": min(ok) if ok else None, "erro": self.atrasos[falhas[0]].get("erro")}
+
+    def _sincronizar_completo(self, con, aba):
+        valores = self._aba(aba).get_all_values(); self.chamadas += 1
+        cab = list(valores[0]) if valores else []
+        while cab and not cab[-1]: cab.pop()
+        linhas = [(i + 2, *self._ajustar(l, len(cab))) for i, l in enumerate(valores[1:])]
+        agora = time.time(); t = self._tabela(aba)
+        con.execute("BEGIN IMMEDIATE")
+        # _seq já conhecidos: pelo ID ou, para linhas sem ID, pela posição
+        por_id, por_linha = {}, {}
+        try:
+            m = self._meta(con, aba); cab_antigo = m["cabecalho"] if m else []
+            col_id = f', "{COLUNA_ID}"' if COLUNA_ID in cab_antigo else ""
+            for r in con.execute(f"SELECT _linha, _seq{col_id} FROM {t}"):
+                if col_id and r[2]: por_id[r[2]] = r[1]
+                else: por_linha[r[0]] = r[1]
+        except sqlite3.OperationalError: pass
+        pos_id = cab.index(COLUNA_ID) + 1 if COLUNA_ID in cab else None
+        seqs = [por_id.get(l[pos_id]) if pos_id and l[pos_id] in por_id else por_linha.get(l[0]) for l in linhas]
+        proximo = self._reservar(con, seqs.count(None))
+        for i, sq in enumerate(seqs):
+            if sq is None: seqs[i] = proximo; proximo += 1
+        con.execute(f"DROP TABLE IF EXISTS {t}")
+        colunas = "".join(f', "{c}" TEXT' for c in cab)
+        con.execute(f"CREATE TABLE {t} (_linha INTEGER PRIMARY KEY{colunas}, _seq INTEGER NOT NULL)")
+        if cab: con.executemany(f"INSERT INTO {t} VALUES ({', '.join('?' * (len(cab) + 2))})", [(*l, sq) for l, sq in zip(linhas, seqs)])
+        if COLUNA_ID in cab: con.execute(f'CREATE INDEX "ix_r_{aba}_id" ON {t} ("{COLUNA_ID}")')
+        con.execute("INSERT OR REPLACE INTO replica_meta VALUES (?, ?, ?, ?, ?)",
+                    (aba, json.dumps(cab, ensure_ascii=False), len(valores), agora, agora))
+        con.execute("COMMIT")
+        self._tocar(aba)
+        return True
+
+    def _sincronizar_incremental(self, con, aba, m):
+        cab = m["cabecalho"]
+        if not cab: return self._sincronizar_completo(con, aba)
+        # A busca começa na última linha conhecida: se ela não estiver mais lá, linhas foram apagadas
+        # direto na planilha (a marca ficou alta demais e pularia o que for anexado) -> recarga completa
+        ancora = m["ultima"] if m["ultima"] > 1 else None
+        inicio = ancora or m["ultima"] + 1
+        novos = self._aba(aba).get(f"A{inicio}:{letra_coluna(len(cab))}"); self.chamadas += 1
+        novos = [self._ajustar(l, len(cab)) for l in (novos or [])]
+        if ancora:
+            r = con.execute(f"SELECT * FROM {self._tabela(aba)} WHERE _linha = ?", (ancora,)).fetchone()
+            if r is None or (novos[0] if novos else [""] * len(cab)) != list(r[1:1 + len(cab)]):
+                return self._sincronizar_completo(con, aba)
+            novos = novos[1:]; inicio += 1
+        con.execute("BEGIN IMMEDIATE")
+        seqs = self._inserir(con, aba, cab, inicio, novos) if novos else []
+        con.execute("UPDATE replica_meta SET ultima = ?, incremental = ? WHERE aba = ?",
+                    (m["ultima"] + len(novos), time.time(), aba))
+        con.execute("COMMIT")
+        if novos: self._tocar(aba, "insercao", primeira=inicio, linhas=novos, seqs=seqs)
+        return bool(novos)
+
+    @staticmethod
+    def _ajustar(linha, n): return [str(v) for v in linha[:n]] + [""] * (n - len(linha[:n]))
+
+    def _inserir(self, con, aba, cab, primeira, linhas):
+        # Linhas já presentes (ex: as nossas, buscadas de novo) mantêm o _seq; as novas recebem o próximo
+        t = self._tabela(aba)
+        existentes = dict(con.execute(f"SELECT _linha, _seq FROM {t} WHERE _linha BETWEEN ? AND ?", (primeira, primeira + len(linhas) - 1)))
+        proximo = self._reservar(con, sum(1 for i in range(len(linhas)) if primeira + i not in existentes))
+        seqs = []
+        for i in range(len(linhas)):
+            if primeira + i in existentes: seqs.append(existentes[primeira + i])
+            else: seqs.append(proximo); proximo += 1
+        con.executemany(f"INSERT OR REPLACE INTO {t} VALUES ({', '.join('?' * (len(cab) + 2))})",
+                        [(primeira + i, *self._ajustar(l, len(cab)), sq) for i, (l, sq) in enumerate(zip(linhas, seqs))])
+        return seqs
+
+    # --- LEITURA ---
+    def ler(self, aba):
+        with closing(self._abrir()) as con:
+            m = self._meta(con, aba)
+            if not m or not m["cabecalho"]: return pd.DataFrame()
+            df = pd.read_sql_query(f"SELECT * FROM {self._tabela(aba)} ORDER BY _linha", con)
+        # O índice do DataFrame é a linha na planilha (usado para aplicar eventos no cache)
+        df = df.set_index("_linha"); df.index.name = None
+        return df
+
+    # --- ÍNDICE ID -> LINHA ---
+    # Como a réplica desloca _linha a cada exclusão, a busca por ID sempre devolve a linha atual.
+    def linha_por_id(self, aba, id_):
+        with closing(self._abrir()) as con:
+            m = self._meta(con, aba)
+            if not m or COLUNA_ID not in m["cabecalho"]: return None
+            r = con.execute(f'SELECT _linha FROM {self._tabela(aba)} WHERE "{COLUNA_ID}" = ?', (str(id_),)).fetchone()
+        return r[0] if r else None
+
+    def ler_linha(self, aba, linha):
+        # {coluna: valor} de uma linha da réplica ({} se não existir)
+        with closing(self._abrir()) as con:
+            m = self._meta(con, aba)
+            if not m or not m["cabecalho"]: return {}
+            r = con.execute(f"SELECT * FROM {self._tabela(aba)} WHERE _linha = ?", (linha,)).fetchone()
+        return dict(zip(m["cabecalho"], r[1:])) if r else {}
+
+    def ler_linhas(self, aba, linhas):
+        # Só as linhas pedidas (mesmo formato de ler), sem carregar a aba inteira
+        linhas = sorted(set(linhas))
+        with closing(self._abrir()) as con:
+            m = self._meta(con, aba)
+            if not m or not m["cabecalho"] or not linhas: return pd.DataFrame()
+            partes = [pd.read_sql_query(f"SELECT * FROM {self._tabela(aba)} WHERE _linha IN ({','.join('?' * len(lote))}) ORDER BY _linha", con, params=lote)
+                      for lote in (linhas[i:i + 500] for i in range(0, len(linhas), 500))]
+        df = pd.concat(partes).set_index("_linha"); df.index.name = None
+        return df
+
+    def ids_existentes(self, aba, ids):
+        ids = [str(i) for i in ids if i]
+        if not ids: return set()
+        with closing(self._abrir()) as con:
+            m = self._meta(con, aba)
+            if not m or COLUNA_ID not in m["cabecalho"]: return set()
+            return {i for (i,) in con.execute(f'SELECT "{COLUNA_ID}" FROM {self._tabela(aba)} WHERE "{COLUNA_ID}" IN ({",".join("?" * len(ids))})', ids)}
+
+    def garantir_colunas(self, aba, colunas):
+        # Acrescenta ao fim do cabeçalho as colunas que faltarem (planilhas criadas antes delas)
+        with self._trava(aba):
+            if not self.cabecalho(aba): self.sincronizar(aba)
+            cab = self.cabecalho(aba)
+            faltando = [c for c in colunas if c not in cab]
+            if not cab or not faltando: return []
+            ini = len(cab) + 1
+            self._aba(aba).batch_update([{"range": f"{letra_coluna(ini)}1:{letra_coluna(ini + len(faltando) - 1)}1", "values": [faltando]}])
+            self.chamadas += 1
+            self.sincronizar(aba, completo=True)
+            return faltando
+
+    def _conferir_ids(self, aba, linhas):
+        # linhas = {id: linha na réplica}. Uma leitura só da coluna ID (da menor à maior linha) confirma
+        # que a planilha ainda tem cada ID onde a réplica acha que está: uma exclusão feita direto na
+        # planilha desloca as linhas até a próxima sincronização completa.
+        cab = self.cabecalho(aba); letra = letra_coluna(cab.index(COLUNA_ID) + 1)
+        a, b = min(linhas.values()), max(linhas.values())
+        valores = self._aba(aba).get(f"{letra}{a}:{letra}{b}"); self.chamadas += 1
+        na_planilha = {a + n: (l[0] if l else "") for n, l in enumerate(valores or [])}
+        return all(na_planilha.get(l) == i for i, l in linhas.items())
+
+    def atualizar_por_ids(self, aba, mudancas):
+        # mudancas = {id: {coluna: valor}} -> um único batch_update na planilha, depois aplicado localmente.
+        # A trava da aba impede que uma exclusão desloque as linhas entre a busca e a escrita.
+        with self._trava(aba):
+            mudancas = {str(i): v for i, v in mudancas.items()}
+            linhas = {i: self.linha_por_id(aba, i) for i in mudancas}
+            if None in linhas.values():
+                self.sincronizar(aba); linhas = {i: self.linha_por_id(aba, i) for i in mudancas}
+            linhas = {i: l for i, l in linhas.items() if l is not None}
+            if linhas and not self._conferir_ids(aba, linhas):
+                self.sincronizar(aba, completo=True)
+                linhas = {i: l for i, l in ((i, self.linha_por_id(aba, i)) for i in mudancas) if l is not None}
+            if not linhas: return set()
+            cab = self.cabecalho(aba)
+            dados = [{"range": f"{letra_coluna(cab.index(c) + 1)}{l}", "values": [[v]]}
+                     for i, l in linhas.items() for c, v in mudancas[i].items()]
+            self._aba(aba).batch_update(dados); self.chamadas += 1
+            for i, l in linhas.items(): self.aplicar_atualizacao(aba, l, mudancas[i])
+            return set(linhas)
+
+    def garantir_ids(self, aba):
+        # Cria a coluna ID (se faltar) e preenche as linhas sem ID, tudo num único batch_update.
+        with self._trava(aba), closing(self._abrir()) as con:
+            m = self._meta(con, aba)
+            if not m or not m["cabecalho"]: return 0
+            cab = m["cabecalho"]; dados = []
+            if COLUNA_ID in cab: letra = letra_coluna(cab.index(COLUNA_ID) + 1)
+            else:
+                letra = letra_coluna(len(cab) + 1); dados.append({"range": f"{letra}1", "values": [[COLUNA_ID]]})
+            filtro = f"WHERE \"{COLUNA_ID}\" = ''" if COLUNA_ID in cab else ""
+            faltando = [r[0] for r in con.execute(f"SELECT * FROM {self._tabela(aba)} {filtro} ORDER BY _linha")
+                        if any(v for c, v in zip(cab, r[1:]) if c != COLUNA_ID)]  # ignora linhas em branco
+            if not faltando and not dados: return 0
+            dados += [{"range": f"{letra}{l}", "values": [[novo_id()]]} for l in faltando]
+            self._aba(aba).batch_update(dados); self.chamadas += 1
+            if COLUNA_ID not in cab: self._sincronizar_completo(con, aba)
+            else:
+                con.execute("BEGIN IMMEDIATE")
+                con.executemany(f'UPDATE {self._tabela(aba)} SET "{COLUNA_ID}" = ? WHERE _linha = ?',
+                                [(d["values"][0][0], int(d["range"][len(letra):])) for d in dados])
+                con.execute("COMMIT")
+                self._tocar(aba)
+        return len(faltando)
+
+    def excluir_por_ids(self, aba, ids):
+        # Remove várias linhas numa única chamada (deleteDimension por trecho contíguo, de baixo
+        # para cima) e renumera a réplica localmente. Devolve quantas linhas saíram.
+        with self._trava(aba), closing(self._abrir()) as con:
+            m = self._meta(con, aba); ids = [str(i) for i in ids if i]
+            if not m or COLUNA_ID not in m["cabecalho"] or not ids: return 0
+            t = self._tabela(aba)
+            def localizar():
+                achadas = {}
+                for i in range(0, len(ids), 500):
+                    lote = ids[i:i + 500]
+                    achadas.update(con.execute(f'SELECT "{COLUNA_ID}", _linha FROM {t} WHERE "{COLUNA_ID}" IN ({",".join("?" * len(lote))})', lote))
+                return achadas
+            achadas = localizar()
+            if achadas and not self._conferir_ids(aba, achadas):
+                self._sincronizar_completo(con, aba); m = self._meta(con, aba); achadas = localizar()
+            if not achadas: return 0
+            linhas = sorted(achadas.values()); trechos = []
+            for l in linhas:
+                if trechos and trechos[-1][1] == l - 1: trechos[-1][1] = l
+                else: trechos.append([l, l])
+            ws = self._aba(aba)
+            self.planilha.batch_update({"requests": [{"deleteDimension": {"range": {"sheetId": ws.id, "dimension": "ROWS", "startIndex": a - 1, "endIndex": b}}}
+                                                     for a, b in reversed(trechos)]})
+            self.chamadas += 1
+            removidas = set(linhas)
+            restantes = [r[0] for r in con.execute(f"SELECT _linha FROM {t} ORDER BY _linha")]
+            mapa, n = [], 0
+            for l in restantes:
+                if l in removidas: n += 1
+                elif n: mapa.append((-(l - n), l))
+            con.execute("BEGIN IMMEDIATE")
+            con.executemany(f"DELETE FROM {t} WHERE _linha = ?", [(l,) for l in linhas])
+            con.executemany(f"UPDATE {t} SET _linha = ? WHERE _linha = ?", mapa)
+            con.execute(f"UPDATE {t} SET _linha = -_linha WHERE _linha < 0")
+            con.execute("UPDATE replica_meta SET ultima = ultima - ? WHERE aba = ?", (sum(1 for l in linhas if l <= m["ultima"]), aba))
+            con.execute("COMMIT")
+            self._tocar(aba)
+        return len(linhas)
+
+    # --- ESCRITAS DO PRÓPRIO APP (aplicadas sem ir à planilha) ---
+    def anexar(self, aba, linhas):
+        # append_rows e o remendo local sob a trava da aba: nenhuma exclusão renumera as linhas entre
+        # o envio e a aplicação, então o intervalo devolvido pela API continua sendo o das nossas linhas
+        with self._trava(aba):
+            resp = self._aba(aba).append_rows(linhas); self.chamadas += 1
+            try: self.aplicar_insercao(aba, linhas, resp)
+            except Exception as e: engolida("replica.anexar", e)  # já está na planilha: a próxima sincronização traz
+            return resp
+
+    def aplicar_insercao(self, aba, linhas, resp=None):
+        primeira = _primeira_linha(resp) if resp else None
+        with self._trava(aba), closing(self._abrir()) as con:
+            m = self._meta(con, aba)
+            if not m or not m["cabecalho"] or primeira is None: return False  # a próxima sincronização traz as linhas
+            con.execute("BEGIN IMMEDIATE")
+            seqs = self._inserir(con, aba, m["cabecalho"], primeira, linhas)
+            linhas = [self._ajustar(l, len(m["cabecalho"])) for l in linhas]
+            # Se houve linhas de outro processo antes das nossas, a marca fica onde está e a
+            # sincronização incremental busca o intervalo (as nossas são sobrescritas sem duplicar).
+            if primeira == m["ultima"] + 1:
+                con.execute("UPDATE replica_meta SET ultima = ? WHERE aba = ?", (primeira + len(linhas) - 1, aba))
+            con.execute("COMMIT")
+            self._tocar(aba, "insercao", primeira=primeira, linhas=linhas, seqs=seqs)
+        return True
+
+    def aplicar_atualizacao(self, aba, linha, valores):
+        with self._trava(aba), closing(self._abrir()) as con:
+            m = self._meta(con, aba)
+            cols = [c for c in valores if m and c in m["cabecalho"]]
+            if not cols: return False
+            campos = ", ".join(f'"{c}" = ?' for c in cols)
+            con.execute(f"UPDATE {self._tabela(aba)} SET {campos} WHERE _linha = ?", [str(valores[c]) for c in cols] + [linha])
+            self._tocar(aba, "atualizacao", linha=linha, valores={c: str(valores[c]) for c in cols})
+        return True
@@ -0,0 +1,30 @@
+import time
+
+from fila_escrita import FilaEscrita
+from planilha_falsa import PlanilhaFalsa
+
+def test_reenvio_apos_resposta_perdida_nao_duplica(tmp_path):
+    planilha = PlanilhaFalsa(abas={"sheet1": ["Texto", "ID"]}, escala=0, cota_leitura=None, cota_escrita=None)
+    aba = planilha.aba("sheet1"); perdidas = []
+
+    def anexar(nome, linhas):
+        resp = aba.append_rows(linhas)
+        if linhas[0][0] == "two" and not perdidas: perdidas.append(linhas); raise ConnectionResetError("resposta perdida")
+        return resp
+
+    def filtrar_reenvio(nome, linhas):
+        ja = {l[1] for l in aba.linhas[1:]}
+        return [l for l in linhas if l[1] not in ja]
+
+    fila = FilaEscrita(planilha, caminho=str(tmp_path / "fila.db"), intervalo=0.01, janela=0, anexar=anexar, filtrar_reenvio=filtrar_reenvio)
+    try:
+        fila.enfileirar("sheet1", [["one", "1"]])
+        for _ in range(500):
+            if not fila.pendentes(): break
+            time.sleep(0.01)
+        fila.enfileirar("sheet1", [["two", "2"]])
+        for _ in range(500):
+            if not fila.pendentes(): break
+            time.sleep(0.01)
+    finally: fila.parar()
+    assert perdidas and [l[0] for l in aba.linhas[1:]] == ["one", "two"]
@@ -0,0 +1,55 @@
+import pytest
+
+from planilha_falsa import PlanilhaFalsa, semear
+from replica import COLUNA_ID, ReplicaPlanilha
+
+@pytest.fixture
+def planilha():
+    return semear(PlanilhaFalsa(escala=0, cota_leitura=None, cota_escrita=None), linhas=20)
+
+@pytest.fixture
+def replica(planilha, tmp_path):
+    r = ReplicaPlanilha(planilha, caminho=str(tmp_path / "replica.db"), abas_com_id=("sheet1",))
+    r.sincronizar("sheet1")
+    return r
+
+def _ids(planilha):
+    linhas = planilha.aba("sheet1").linhas
+    pos = linhas[0].index(COLUNA_ID)
+    return [l[pos] for l in linhas[1:]]
+
+def _linha_na_planilha(planilha, id_):
+    return _ids(planilha).index(id_) + 2
+
+def test_exclusao_renumera_o_indice(planilha, replica):
+    ids = _ids(planilha)
+    assert replica.excluir_por_ids("sheet1", [ids[1], ids[2], ids[7]]) == 3
+    assert _ids(planilha) == [i for n, i in enumerate(ids) if n not in (1, 2, 7)]
+    for id_ in _ids(planilha):
+        assert replica.linha_por_id("sheet1", id_) == _linha_na_planilha(planilha, id_)
+    assert replica.linha_por_id("sheet1", ids[1]) is None
+
+def test_atualizacao_confere_id_apos_exclusao_direta(planilha, replica):
+    ids = _ids(planilha); alvo = ids[5]
+    planilha.aba("sheet1").delete_rows(3)  # direto na planilha: a réplica ainda não sabe
+    assert replica.atualizar_por_ids("sheet1", {alvo: {"Status_Gestao": "Resolvido"}}) == {alvo}
+    linhas = planilha.aba("sheet1").linhas; cab = linhas[0]
+    alteradas = [l[cab.index(COLUNA_ID)] for l in linhas[1:] if l[cab.index("Status_Gestao")] == "Resolvido"]
+    assert alteradas == [alvo]
+    assert replica.linha_por_id("sheet1", alvo) == _linha_na_planilha(planilha, alvo)
+
+def test_exclusao_confere_id_apos_exclusao_direta(planilha, replica):
+    ids = _ids(planilha); alvo = ids[5]
+    planilha.aba("sheet1").delete_rows(3)
+    assert replica.excluir_por_ids("sheet1", [alvo]) == 1
+    assert _ids(planilha) == [i for n, i in enumerate(ids) if n not in (1, 5)]
+    for id_ in _ids(planilha):
+        assert replica.linha_por_id("sheet1", id_) == _linha_na_planilha(planilha, id_)
+
+def test_sincronizacao_incremental_percebe_exclusao_direta(planilha, replica):
+    aba = planilha.aba("sheet1"); cab = aba.linhas[0]
+    aba.delete_rows(3)
+    aba.append_rows([["externo" if c == COLUNA_ID else "x" for c in cab]])  # anexada por outro processo
+    assert replica.sincronizar("sheet1")
+    assert replica.linha_por_id("sheet1", "externo") == _linha_na_planilha(planilha, "externo")
+    assert sorted(replica.ler("sheet1")[COLUNA_ID]) == sorted(_ids(planilha))
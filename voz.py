@@ -0,0 +1,97 @@
+import hashlib
+import io
+import json
+import threading
+import time
+import wave
+from contextlib import closing
+
+import numpy as np
+
+import banco_local
+from indice_alunos import normalizar
+from rastreio import engolida
+
+# --- COMANDO DE VOZ ---
+# Uma chamada ao modelo por gravação: o áudio é reduzido (mono, 16 kHz) antes do envio e o
+# resultado (transcrição, turma, alunos) fica em cache pelo hash do áudio original e das turmas
+# enviadas no prompt (turmas diferentes = outra resposta possível).
+
+VERSAO_PROMPT_VOZ = "voz-v1"
+TAXA_ALVO = 16000
+
+def reduzir_audio(dados):
+    # WAV do st.audio_input -> WAV mono 16 bits a 16 kHz; outros formatos seguem como vieram
+    if dados[:4] != b"RIFF": return dados, "audio/mp3"
+    try:
+        with wave.open(io.BytesIO(dados)) as w:
+            canais, largura, taxa, n = w.getnchannels(), w.getsampwidth(), w.getframerate(), w.getnframes()
+            bruto = w.readframes(n)
+        if largura == 1: x = (np.frombuffer(bruto, np.uint8).astype(np.float32) - 128) / 128
+        elif largura == 2: x = np.frombuffer(bruto, "<i2").astype(np.float32) / 32768
+        elif largura == 4: x = np.frombuffer(bruto, "<i4").astype(np.float32) / 2147483648
+        else: return dados, "audio/wav"
+        x = x.reshape(-1, canais).mean(axis=1)
+        if taxa > TAXA_ALVO:
+            m = int(len(x) * TAXA_ALVO / taxa)
+            x = np.interp(np.linspace(0, len(x) - 1, m), np.arange(len(x)), x); taxa = TAXA_ALVO
+        saida = io.BytesIO()
+        with wave.open(saida, "wb") as w:
+            w.setnchannels(1); w.setsampwidth(2); w.setframerate(taxa)
+            w.writeframes((np.clip(x, -1, 1) * 32767).astype("<i2").tobytes())
+        reduzido = saida.getvalue()
+        return (reduzido if len(reduzido) < len(dados) else dados), "audio/wav"
+    except Exception as e: engolida("voz.reduzir_audio", e); return dados, "audio/wav"
+
+def montar_prompt_voz(turmas):
+    return ("Analise o áudio de um professor relatando uma ocorrência escolar. Responda só JSON: "
+            '{"texto_completo": "transcrição fiel", "turma_detectada": "ex: 6A", "alunos_detectados": ["nome"]}. '
+            f"Turmas possíveis: {', '.join(turmas)}.")
+
+def casar_turma(detectada, turmas):
+    def so_letras(t): return "".join(ch for ch in normalizar(t) if ch.isalnum())
+    alvo = so_letras(str(detectada).translate({0xBA: None, 0xAA: None, 0xB0: None})).replace("ANO", "").replace("SERIE", "")
+    return next((t for t in turmas if so_letras(t) == alvo), None)
+
+def _ler_json(texto):
+    return json.loads(texto.strip().replace("```json", "").replace("```", ""))
+
+class PipelineVoz:
+    def __init__(self, cliente, caminho=None):
+        self.cliente = cliente
+        self.caminho = caminho
+        self.chamadas = 0
+        self.acertos_cache = 0
+        self.bytes_enviados = 0
+        self._trava = threading.Lock()
+        self._em_andamento = {}
+        with closing(banco_local.abrir(self.caminho)) as con:
+            con.execute("""CREATE TABLE IF NOT EXISTS cache_voz (
+                chave TEXT PRIMARY KEY, resultado TEXT NOT NULL, criado REAL NOT NULL)""")
+
+    def _ler_cache(self, ch):
+        with closing(banco_local.abrir(self.caminho)) as con:
+            r = con.execute("SELECT resultado FROM cache_voz WHERE chave = ?", (ch,)).fetchone()
+        return json.loads(r[0]) if r else None
+
+    def analisar(self, audio, hash_audio, turmas):
+        if self.cliente is None: return None
+        ch = f"{VERSAO_PROMPT_VOZ}:{hash_audio}:{hashlib.sha256(chr(31).join(turmas).encode('utf-8')).hexdigest()[:16]}"
+        r = self._ler_cache(ch)
+        if r is not None: self.acertos_cache += 1; return r
+        # A mesma gravação chegando de dois reruns ao mesmo tempo espera a primeira chamada
+        with self._trava:
+            evento = self._em_andamento.get(ch); dono = evento is None
+            if dono: evento = self._em_andamento[ch] = threading.Event()
+        if not dono:
+            evento.wait(60); return self._ler_cache(ch)
+        try:
+            reduzido, mime = reduzir_audio(audio)
+            self.chamadas += 1; self.bytes_enviados += len(reduzido)
+            resultado = _ler_json(self.cliente.gerar([montar_prompt_voz(turmas), {"mime_type": mime, "data": reduzido}]))
+            with closing(banco_local.abrir(self.caminho)) as con:
+                con.execute("INSERT OR REPLACE INTO cache_voz VALUES (?, ?, ?)", (ch, json.dumps(resultado, ensure_ascii=False), time.time()))
+            return resultado
+        finally:  # erros sobem para quem chamou (o app conta em "voz.analisar")
+            with self._trava: self._em_andamento.pop(ch, None)
+            evento.set()